@@ -46,6 +46,7 @@ const SeriesViewer = memo(({ series }: { series: string }) => {
   };
   const goto = (newIndex: number) => setIndex(newIndex == length - 1 ? -1 : newIndex);
   const imgSrc = img ? `${API_BASEURL}/project/${projectId}/image/${img.id}` : null;
+  const thumbnailSrc = imgSrc ? `${imgSrc}?thumbnail=900` : null;
   return (
     <Card bodyStyle={{ position: "relative" }}>
       <Space vertical>
@@ -64,7 +65,7 @@ const SeriesViewer = memo(({ series }: { series: string }) => {
           <a href={imgSrc!} target="_blank" style={{ display: "block", position: "relative" }}>
             <img
               style={{ display: "block", objectFit: "contain", width: "450px", height: "300px" }}
-              src={imgSrc!}
+              src={thumbnailSrc!}
             />
           </a>
         ) : data && !data.length ? (
@@ -67,6 +67,9 @@ export const ProgressViewer = memo(({ series }: { series: string }) => {
         step {lastProgressData.step}/{lastProgressData.total == null ? "unknown" : lastProgressData.total}
       </Typography.Text>
       <Typography.Text>launched at {lastProgressData.timestamp}</Typography.Text>
+      {lastProgressData.eta >= 0 && (
+        <Typography.Text>about {formatSeconds(lastProgressData.eta)} left</Typography.Text>
+      )}
       <Progress
         percent={percentage}
         showInfo={true}
@@ -76,3 +79,9 @@ export const ProgressViewer = memo(({ series }: { series: string }) => {
     </Card>
   );
 });
+
+function formatSeconds(seconds: number) {
+  seconds = Math.round(seconds);
+  const [h, m, s] = [Math.floor(seconds / 3600), Math.floor((seconds % 3600) / 60), seconds % 60];
+  return h ? `${h}h ${m}m` : m ? `${m}m ${s}s` : `${s}s`;
+}
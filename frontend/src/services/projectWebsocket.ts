@@ -69,21 +69,7 @@ export class WsClient {
     this.ws.onmessage = (e) => {
       const json = JSON.parse(e.data) as WsMsg;
       // console.debug("ws receive", json);
-      const eventId = json.eventId;
-      const eventType = json.eventType;
-      if (this.callbacks.has(eventId)) {
-        this.callbacks.get(eventId)!(json);
-        this.callbacks.delete(eventId);
-      } else {
-        if (eventType === "log") {
-          this.project.handleLog({
-            timestamp: json.timestamp,
-            ...(json.payload as any),
-          });
-        }
-        // console.warn("ws unhandled message", json);
-        this.wsListeners.forEach((x) => x(json));
-      }
+      this.handleMessage(json);
     };
     this.ws.onclose = (e) => {
       this.isReady.value = false;
@@ -99,6 +85,27 @@ export class WsClient {
     };
   }
 
+  handleMessage(json: WsMsg) {
+    const eventId = json.eventId;
+    const eventType = json.eventType;
+    if (eventType === "batch") {
+      // server packs events into one frame, payload is the list of events
+      (json.payload as unknown as WsMsg[]).forEach((x) => this.handleMessage(x));
+    } else if (this.callbacks.has(eventId)) {
+      this.callbacks.get(eventId)!(json);
+      this.callbacks.delete(eventId);
+    } else {
+      if (eventType === "log") {
+        this.project.handleLog({
+          timestamp: json.timestamp,
+          ...(json.payload as any),
+        });
+      }
+      // console.warn("ws unhandled message", json);
+      this.wsListeners.forEach((x) => x(json));
+    }
+  }
+
   send(msg: Partial<WsMsg>, onReply?: (msg: WsMsg) => void) {
     const eventId = this.nextId++;
     const json = {
@@ -5,11 +5,13 @@
 # Date:   20231201
 
 import json
+import numbers
+import struct
 from dataclasses import dataclass
 from datetime import datetime as dt
 from enum import Enum
 from importlib.metadata import version
-from typing import Any, Union
+from typing import Any, List, Union
 
 VERSION = version("neetbox")
 
@@ -104,6 +106,43 @@ class EventMsg:
             id=src.get(ID_KEY, None),
         )
 
+    @classmethod
+    def pack(cls, messages: List["EventMsg"]) -> "EventMsg":
+        """pack event messages of the same project and run into a single batch envelope
+
+        Args:
+            messages (List[EventMsg]): messages to pack, should not be empty
+
+        Returns:
+            EventMsg: the batch envelope, whose payload is a list of message jsons
+        """
+        head = messages[0]
+        return EventMsg(
+            project_id=head.project_id,
+            run_id=head.run_id,
+            event_type=EVENT_TYPE_NAME_BATCH,
+            who=head.who,
+            payload=[message.json for message in messages],
+            timestamp=head.timestamp,
+        )
+
+    def unpack(self) -> List["EventMsg"]:
+        """unpack a batch envelope into event messages. returns a list containing only itself if not a batch
+
+        Returns:
+            List[EventMsg]: the unpacked messages
+        """
+        if self.event_type != EVENT_TYPE_NAME_BATCH:
+            return [self]
+        messages = []
+        for src in self.payload or []:
+            message = EventMsg.loads(src)
+            message.project_id = message.project_id or self.project_id
+            message.run_id = message.run_id or self.run_id
+            message.who = message.who or self.who
+            messages.append(message)
+        return messages
+
     @classmethod
     def merge(cls, x: Union["EventMsg", dict], y: Union["EventMsg", dict]):
         _x = x if isinstance(x, dict) else x.json
@@ -128,6 +167,248 @@ EVENT_TYPE_NAME_HPARAMS = "hyperparameters"
 EVENT_TYPE_NAME_STATUS = "status"
 EVENT_TYPE_NAME_HARDWARE = "hardware"
 EVENT_TYPE_NAME_PROGRESS = "progress"
+EVENT_TYPE_NAME_SCALAR_CHUNK = "scalarChunk"  # columnar scalars of one series, saved as scalars
+EVENT_TYPE_NAME_BATCH = "batch"  # envelope event, payload is a list of event jsons
+
+# ===================== WIRE FORMAT things =====================
+
+WIRE_FORMAT_KEY = "wireFormat"
+WIRE_FORMAT_JSON = "json"
+WIRE_FORMAT_COMPACT = "compact"
+
+
+class CompactCodec:
+    """Compact binary encoding of EventMsg, negotiated per websocket connection in handshake.
+
+    A frame is a magic header followed by length-prefixed records. Strings(event type, project id, run id, series, who and payload keys) are sent once in a DEFINE record and referenced by a 2-byte id afterwards, so each side should keep one codec for the whole connection. Payloads made of numbers only(for example scalars) or of columns each holding only int64 or only float(for example scalar chunks) are packed natively, other payloads are sent as json bytes.
+
+    frame  := b"NB" u8(version) record*
+    record := u32(length of tag and body) u8(tag) body
+    DEFINE := u16(ref) utf-8 bytes
+    EVENT  := ref(event type) ref(project id) ref(run id) ref(series) ref(who) i64(event id) i32(history len) u8(length) timestamp payload
+    ref    := u16(ref) | u16(REF_NONE) | u16(REF_INLINE) u16(length) utf-8 bytes
+    """
+
+    MAGIC = b"NB"
+    VERSION = 1
+    TAG_DEFINE = 1
+    TAG_EVENT = 2
+    PAYLOAD_NONE = 0
+    PAYLOAD_NUMERIC = 1
+    PAYLOAD_JSON = 2
+    PAYLOAD_COLUMNS = 3
+    REF_NONE = 0xFFFF
+    REF_INLINE = 0xFFFE  # string table is full, string follows inline
+    MAX_REFS = 0xFFFE
+
+    _u8 = struct.Struct("<B")
+    _u16 = struct.Struct("<H")
+    _u32 = struct.Struct("<I")
+    _record_head = struct.Struct("<IB")
+    _event_head = struct.Struct("<qiB")
+    _numbers = {
+        b"?"[0]: struct.Struct("<?"),
+        b"q"[0]: struct.Struct("<q"),
+        b"d"[0]: struct.Struct("<d"),
+    }
+
+    def __init__(self) -> None:
+        self._str2ref = {}  # encoding side string table
+        self._ref2str = {}  # decoding side string table
+
+    # === encoding ===
+
+    def _dump_str(self, string, records: list, body: bytearray):
+        if string is None:
+            body += self._u16.pack(self.REF_NONE)
+            return
+        ref = self._str2ref.get(string)
+        if ref is None:
+            encoded = (string if isinstance(string, str) else str(string)).encode("utf-8")
+            if len(self._str2ref) >= self.MAX_REFS:  # table full, write inline
+                body += self._u16.pack(self.REF_INLINE) + self._u16.pack(len(encoded)) + encoded
+                return
+            ref = self._str2ref[string] = len(self._str2ref)
+            define = self._u16.pack(ref) + encoded
+            records.append(self._record_head.pack(len(define) + 1, self.TAG_DEFINE) + define)
+        body += self._u16.pack(ref)
+
+    @staticmethod
+    def _number_code(value):
+        if isinstance(value, bool):
+            return b"?"[0]
+        if isinstance(value, numbers.Integral) and -(2**63) <= value < 2**63:
+            return b"q"[0]
+        if isinstance(value, numbers.Real):
+            return b"d"[0]
+        return None
+
+    @staticmethod
+    def _column_code(values: list):
+        """code of a column whose values are all int64(not bool) or all float, None for other lists since they do not come back the same"""
+        if all(type(v) is int and -(2**63) <= v < 2**63 for v in values):
+            return b"q"[0]
+        if all(type(v) is float for v in values):
+            return b"d"[0]
+        return None
+
+    def _pack_columns(self, payload: dict):
+        columns = []
+        for k, v in payload.items():
+            if not isinstance(k, str) or not isinstance(v, list):
+                return None
+            code = self._column_code(v)
+            if code is None:
+                return None
+            columns.append((k, code, len(v), struct.pack(f"<{len(v)}{chr(code)}", *v)))
+        return columns
+
+    def _dump_payload(self, payload, records: list, body: bytearray):
+        if payload is None:
+            body.append(self.PAYLOAD_NONE)
+            return
+        if isinstance(payload, dict) and 0 < len(payload) < 0x100:
+            columns = self._pack_columns(payload)
+            if columns is not None:  # number columns, pack natively
+                body.append(self.PAYLOAD_COLUMNS)
+                body.append(len(columns))
+                for k, code, n, packed in columns:
+                    body.append(code)
+                    self._dump_str(k, records, body)
+                    body += self._u32.pack(n) + packed
+                return
+            codes = [
+                self._number_code(v) if isinstance(k, str) else None for k, v in payload.items()
+            ]
+            if None not in codes:  # numbers only, pack natively
+                body.append(self.PAYLOAD_NUMERIC)
+                body.append(len(codes))
+                for code, (k, v) in zip(codes, payload.items()):
+                    body.append(code)
+                    self._dump_str(k, records, body)
+                    body += self._numbers[code].pack(v)
+                return
+        encoded = json.dumps(payload, default=str).encode("utf-8")
+        body.append(self.PAYLOAD_JSON)
+        body += self._u32.pack(len(encoded)) + encoded
+
+    def dumps(self, messages: List[EventMsg]) -> bytes:
+        """encode messages into one binary frame
+
+        Args:
+            messages (List[EventMsg]): messages to encode
+
+        Returns:
+            bytes: the frame
+        """
+        records = [self.MAGIC + self._u8.pack(self.VERSION)]
+        for message in messages:
+            body = bytearray()
+            for string in (
+                message.event_type,
+                message.project_id,
+                message.run_id,
+                message.series,
+                message.who,
+            ):
+                self._dump_str(string, records, body)
+            timestamp = (message.timestamp or "").encode("utf-8")
+            body += self._event_head.pack(message.event_id, message.history_len, len(timestamp))
+            body += timestamp
+            self._dump_payload(message.payload, records, body)
+            records.append(self._record_head.pack(len(body) + 1, self.TAG_EVENT) + body)
+        return b"".join(records)
+
+    # === decoding ===
+
+    def _load_str(self, data: bytes, offset: int):
+        (ref,) = self._u16.unpack_from(data, offset)
+        offset += 2
+        if ref == self.REF_NONE:
+            return None, offset
+        if ref == self.REF_INLINE:
+            (length,) = self._u16.unpack_from(data, offset)
+            offset += 2
+            return data[offset : offset + length].decode("utf-8"), offset + length
+        return self._ref2str[ref], offset
+
+    def _load_payload(self, data: bytes, offset: int):
+        kind = data[offset]
+        offset += 1
+        if kind == self.PAYLOAD_NONE:
+            return None, offset
+        if kind == self.PAYLOAD_NUMERIC:
+            payload = {}
+            count = data[offset]
+            offset += 1
+            for _ in range(count):
+                number = self._numbers[data[offset]]
+                key, offset = self._load_str(data, offset + 1)
+                (payload[key],) = number.unpack_from(data, offset)
+                offset += number.size
+            return payload, offset
+        if kind == self.PAYLOAD_COLUMNS:
+            payload = {}
+            count = data[offset]
+            offset += 1
+            for _ in range(count):
+                code = chr(data[offset])
+                key, offset = self._load_str(data, offset + 1)
+                (n,) = self._u32.unpack_from(data, offset)
+                offset += 4
+                payload[key] = list(struct.unpack_from(f"<{n}{code}", data, offset))
+                offset += n * struct.calcsize(code)
+            return payload, offset
+        (length,) = self._u32.unpack_from(data, offset)
+        offset += 4
+        return json.loads(data[offset : offset + length].decode("utf-8")), offset + length
+
+    def loads(self, data: bytes) -> List[EventMsg]:
+        """decode messages from a binary frame
+
+        Args:
+            data (bytes): the frame
+
+        Returns:
+            List[EventMsg]: decoded messages
+        """
+        data = bytes(data)
+        if data[:2] != self.MAGIC or data[2] != self.VERSION:
+            raise ValueError(f"not a compact frame of version {self.VERSION}")
+        messages = []
+        offset = 3
+        while offset < len(data):
+            length, tag = self._record_head.unpack_from(data, offset)
+            body, end = offset + self._record_head.size, offset + 4 + length
+            if tag == self.TAG_DEFINE:
+                (ref,) = self._u16.unpack_from(data, body)
+                self._ref2str[ref] = data[body + 2 : end].decode("utf-8")
+            elif tag == self.TAG_EVENT:
+                event_type, body = self._load_str(data, body)
+                project_id, body = self._load_str(data, body)
+                run_id, body = self._load_str(data, body)
+                series, body = self._load_str(data, body)
+                who, body = self._load_str(data, body)
+                event_id, history_len, ts_len = self._event_head.unpack_from(data, body)
+                body += self._event_head.size
+                timestamp = data[body : body + ts_len].decode("utf-8") or get_timestamp()
+                payload, _ = self._load_payload(data, body + ts_len)
+                messages.append(
+                    EventMsg(
+                        project_id=project_id,
+                        run_id=run_id,
+                        event_type=event_type,
+                        series=series,
+                        payload=payload,
+                        event_id=event_id,
+                        who=who,
+                        timestamp=timestamp,
+                        history_len=history_len,
+                    )
+                )
+            offset = end  # skip unknown records
+        return messages
+
 
 # ===================== HTTP things =====================
 
@@ -143,6 +424,9 @@ NAME_COLUMN_NAME = SERIES_COLUMN_NAME = SERIES_KEY
 RUN_ID_COLUMN_NAME = RUN_ID_KEY
 JSON_COLUMN_NAME = METADATA_COLUMN_NAME = METADATA_KEY
 BLOB_COLUMN_NAME = "data"
+BLOB_ID_COLUMN_NAME = "blobId"
+BLOB_HASH_COLUMN_NAME = "hash"
+BLOB_REF_COUNT_COLUMN_NAME = "refCount"
 
 # === TABLE NAMES ===
 PROJECT_ID_TABLE_NAME = PROJECT_ID_KEY
@@ -151,5 +435,8 @@ RUN_IDS_TABLE_NAME = RUN_ID_KEY
 STATUS_TABLE_NAME = EVENT_TYPE_NAME_STATUS
 LOG_TABLE_NAME = "log"
 IMAGE_TABLE_NAME = "image"
+BLOB_TABLE_NAME = "blobStore"
+LOG_SEARCH_TABLE_NAME = "logSearch"  # full text index of logs
+LOG_SEARCH_CONTENT_NAME = "logSearchContent"  # view of log text indexed by LOG_SEARCH_TABLE_NAME
 
 NEETBOX_VERSION = version("neetbox")
@@ -7,6 +7,7 @@
 from ._client import connection
 from ._signal_and_slot import listen, watch
 from .apis._action import actionManager
+from .apis._downsample import ScalarPolicy
 from .apis._image import add_figure, add_image
 from .apis._progress import Progress as progress
 from .apis._scalar import add_hyperparams, add_scalar
@@ -17,6 +18,7 @@ action = actionManager.register
 __all__ = [
     "add_image",
     "add_scalar",
+    "ScalarPolicy",
     "add_figure",
     "add_hyperparams",
     "ws_subscribe",
@@ -7,10 +7,12 @@
 import functools
 import json
 import logging
+import os
 import subprocess
+import sys
 import time
-from collections import defaultdict
-from threading import Lock, Thread
+from collections import defaultdict, deque
+from threading import Event, Lock, Thread
 from typing import Callable
 
 import httpx
@@ -23,6 +25,8 @@ from neetbox.utils import DaemonableProcess, Registry
 from neetbox.utils.massive import is_loopback
 from neetbox.utils.mvc import Singleton
 
+from ._fork import ForkMultiplexer, send_frame
+
 logging.getLogger("httpx").setLevel(logging.ERROR)
 logger = Logger(name_alias="CLIENT", skip_writers_names=["ws"])
 
@@ -73,8 +77,19 @@ class NeetboxClient(metaclass=Singleton):  # singleton
     _is_initialized: bool = False
     _thread_safe_lock = Lock()
     is_ws_connected: bool = False
-    ws_message_query = []  # websocket message query
+    ws_message_query = deque()  # websocket message query, drained by the sender thread
+    _ws_message_ready = Event()  # set when there are messages waiting in query
+    _ws_query_drained = Event()  # set when the sender thread finds the query empty
+    _ws_flush_interval: float = 0.02  # seconds to wait for more messages before sending
+    _ws_flush_size: int = 256  # max number of messages packed into one frame
+    _ws_wire_format: str = WIRE_FORMAT_JSON  # wire format requested in handshake
+    _ws_codec: CompactCodec = None  # set if server accepted compact wire format
+    _ws_codec_lock = Lock()  # guards replacing _ws_codec
     ws_subscribers = defaultdict(list)  # default to no subscribers
+    _fork_mux: ForkMultiplexer = None  # takes messages of forked children
+    _fork_upstream = None  # socket to the parent, set in forked children
+    _flush_on_multiprocessing_exit_registered: bool = False
+    _child_exit_callbacks = []  # run before a multiprocessing child exits, see on_child_exit
 
     @online_only
     def post_check_online(self, api: str, root: str = None, *args, **kwargs):
@@ -235,8 +250,123 @@ class NeetboxClient(metaclass=Singleton):  # singleton
             target=self.wsApp.run_forever, kwargs={"reconnect": 1}, daemon=True
         ).start()  # initialize and start ws thread
 
+        self._ws_flush_interval = config["flushInterval"]
+        self._ws_flush_size = config["flushSize"]
+        self._ws_wire_format = config["wireFormat"]
+        Thread(target=self._ws_sender_loop, daemon=True).start()  # start ws sender thread
+        self._fork_mux = ForkMultiplexer(self._on_child_frames)
+
         self._is_initialized = True
 
+    def _ws_sender_loop(self):
+        """drain the message query in background. messages queued within one flush window are packed into a single batch frame."""
+        while True:
+            self._ws_message_ready.wait()
+            upstream = self._fork_upstream
+            if upstream is None and not self.is_ws_connected:  # wait for (re)connection
+                time.sleep(self._ws_flush_interval)
+                continue
+            if upstream is None and len(self.ws_message_query) < self._ws_flush_size:
+                time.sleep(self._ws_flush_interval)  # wait for more messages to coalesce
+            self._ws_message_ready.clear()
+            while self.ws_message_query:
+                batch = []
+                while self.ws_message_query and len(batch) < self._ws_flush_size:
+                    batch.append(self.ws_message_query.popleft())
+                codec = self._ws_codec
+                if upstream is not None:  # forked child, the parent sends for us
+                    try:
+                        frame = json.dumps([message.json for message in batch], default=str)
+                        send_frame(upstream, frame.encode("utf-8"))
+                    except OSError:  # parent is gone, nobody to send to
+                        pass
+                    continue
+                try:
+                    if codec is not None:  # compact binary frame
+                        self.wsApp.send(codec.dumps(batch), opcode=websocket.ABNF.OPCODE_BINARY)
+                    else:  # json frame
+                        frame = batch[0] if len(batch) == 1 else EventMsg.pack(batch)
+                        self.wsApp.send(frame.dumps())
+                except Exception as e:
+                    self.ws_message_query.extendleft(reversed(batch))  # put back and retry later
+                    # string table may be out of sync, send json until the next handshake installs a new codec. the codec may have been replaced by a reconnection meanwhile, which is kept
+                    with self._ws_codec_lock:
+                        if codec is not None and self._ws_codec is codec:
+                            self._ws_codec = None
+                    self._ws_message_ready.set()
+                    time.sleep(self._ws_flush_interval)
+                    break
+            else:
+                self._ws_query_drained.set()
+
+    def flush(self, timeout: float = 1.0):
+        """wait until queued websocket messages are sent or timeout
+
+        Args:
+            timeout (float, optional): max seconds to wait. Defaults to 1.0.
+
+        Returns:
+            bool: whether the message query is drained
+        """
+        if not self.ws_message_query:
+            return True
+        self._ws_query_drained.clear()
+        self._ws_message_ready.set()
+        return self._ws_query_drained.wait(timeout=timeout)
+
+    def _on_child_frames(self, frames):
+        """messages of forked children join the query, sent in the same batches as ours"""
+        for frame in frames:
+            self.ws_message_query.extend(EventMsg.loads(src) for src in json.loads(frame))
+        self._ws_message_ready.set()
+
+    def _before_fork(self):
+        if self._fork_mux is None:  # not online, children connect on their own if they need
+            return
+        self._fork_mux.before_fork()
+        if "multiprocessing" in sys.modules and not self._flush_on_multiprocessing_exit_registered:
+            from multiprocessing import util
+
+            # multiprocessing children exit by os._exit, which skips atexit
+            util.register_after_fork(self, NeetboxClient._flush_on_multiprocessing_exit)
+            self._flush_on_multiprocessing_exit_registered = True
+
+    def _after_fork_in_parent(self):
+        if self._fork_mux is not None:
+            self._fork_mux.after_fork_in_parent()
+
+    def _after_fork_in_child(self):
+        """threads of the parent are gone in the child and its sockets are shared with the parent, send through the parent instead"""
+        if self._fork_mux is None:
+            return
+        self._fork_upstream = self._fork_mux.after_fork_in_child()
+        self.wsApp = None
+        self.is_ws_connected = False
+        self._ws_codec_lock = Lock()  # may have been held by a thread of the parent
+        self._ws_codec = None
+        self.httpxClient = httpx.Client(proxies={"http://": None, "https://": None})
+        self._thread_safe_lock = Lock()
+        self.ws_message_query = deque()  # messages queued before fork are sent by the parent
+        self._ws_message_ready = Event()
+        self._ws_query_drained = Event()
+        Thread(target=self._ws_sender_loop, daemon=True).start()
+
+    def on_child_exit(self, func: Callable):
+        """register a function to run before a forked multiprocessing child exits, where atexit functions are skipped. for buffers to send what is left."""
+        self._child_exit_callbacks.append(func)
+        return func
+
+    @staticmethod
+    def _flush_on_multiprocessing_exit(client: "NeetboxClient"):
+        from multiprocessing import util
+
+        def _flush():
+            for func in client._child_exit_callbacks:
+                func()
+            client.flush()
+
+        util.Finalize(client, _flush, exitpriority=10)
+
     def on_ws_open(self, ws: websocket.WebSocketApp):
         project_id = get_project_id()
         logger.ok(f"client websocket connected. sending handshake as '{project_id}'...")
@@ -246,6 +376,7 @@ class NeetboxClient(metaclass=Singleton):  # singleton
             event_type=EVENT_TYPE_NAME_HANDSHAKE,
             who=IdentityType.CLI,
             event_id=0,
+            payload={WIRE_FORMAT_KEY: self._ws_wire_format},
         ).dumps()
         ws.send(handshake_msg)
 
@@ -257,12 +388,17 @@ class NeetboxClient(metaclass=Singleton):  # singleton
             f"client websocket closed: status code: {close_status_code}, message: {close_msg}"
         )
         self.is_ws_connected = False
+        with self._ws_codec_lock:
+            self._ws_codec = None
 
     def on_ws_message(self, ws: websocket.WebSocketApp, message):
         message = EventMsg.loads(message)  # message should be json
         if message.event_type == EVENT_TYPE_NAME_HANDSHAKE:
             assert message.payload["result"] == 200
             logger.ok(f"neetbox handshake succeed.")
+            if message.payload.get(WIRE_FORMAT_KEY) == WIRE_FORMAT_COMPACT:
+                with self._ws_codec_lock:
+                    self._ws_codec = CompactCodec()  # new string table for new connection
             ws.send(  # send immediately without querying
                 EventMsg(
                     project_id=get_project_id(),
@@ -310,14 +446,7 @@ class NeetboxClient(metaclass=Singleton):  # singleton
             history_len=_history_len,
         )
         self.ws_message_query.append(message)
-        if self.is_ws_connected:  # if ws client exist
-            try:
-                while len(self.ws_message_query):
-                    self.wsApp.send(self.ws_message_query[0].dumps())
-                    self.ws_message_query.pop(0)
-                return
-            except Exception as e:
-                pass
+        self._ws_message_ready.set()  # wake up sender thread
 
 
 # singleton
@@ -343,9 +472,19 @@ def log_writer_ws(log: RawLog):
 def _clean_websocket_on_exit():
     # clean websocket connection
     if connection.wsApp is not None:
+        connection.flush()  # send what is left in query before closing
         connection.wsApp.close()
+    elif connection._fork_upstream is not None:
+        connection.flush()  # forked child, hand what is left to the parent
 
 
 import atexit
 
 atexit.register(_clean_websocket_on_exit)
+
+if hasattr(os, "register_at_fork"):  # not on windows
+    os.register_at_fork(
+        before=connection._before_fork,
+        after_in_parent=connection._after_fork_in_parent,
+        after_in_child=connection._after_fork_in_child,
+    )
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+#
+# Author: GavinGong aka VisualDust
+# Github: github.com/visualDust
+# Date:   20240120
+
+import selectors
+import socket
+import struct
+from collections import deque
+from threading import Lock, Thread, local
+from typing import Callable, List, Optional
+
+_FRAME_HEAD = struct.Struct("<I")  # length of frame body
+
+
+def send_frame(sock: socket.socket, data: bytes):
+    """send a length prefixed frame, see ForkMultiplexer"""
+    sock.sendall(_FRAME_HEAD.pack(len(data)) + data)
+
+
+class ForkMultiplexer:
+    """Carry data from forked children back to this process. Before each fork a unix socket pair is made, the child keeps one end as its upstream, and a thread in this process reads length prefixed frames(see send_frame) from the other ends of all children and passes them to on_frames in batches.
+
+    Call before_fork, after_fork_in_parent and after_fork_in_child from os.register_at_fork handlers.
+
+    Args:
+        on_frames (Callable[[List[bytes]], None]): called in the reader thread with frames read in one round
+    """
+
+    THREAD_NAME = "neetbox-fork-multiplexer"
+
+    def __init__(self, on_frames: Callable[[List[bytes]], None]) -> None:
+        self.on_frames = on_frames
+        self._reset()
+
+    def _reset(self):
+        self._lock = Lock()
+        self._forking = local()  # socket pair made for the fork in this thread
+        self._added = deque()  # parent ends waiting to be watched by the reader thread
+        self._selector = None
+        self._waker = None  # (reader end, writer end), wakes the reader thread for new children
+        self._buffers = {}  # parent end : bytes read but not framed yet
+
+    def before_fork(self):
+        self._forking.pair = socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+
+    def after_fork_in_parent(self):
+        pair = getattr(self._forking, "pair", None)
+        if pair is None:
+            return
+        self._forking.pair = None
+        parent_end, child_end = pair
+        child_end.close()
+        with self._lock:
+            if self._selector is None:  # start reader thread on the first fork
+                self._selector = selectors.DefaultSelector()
+                self._waker = socket.socketpair()
+                self._selector.register(self._waker[0], selectors.EVENT_READ)
+                Thread(target=self._read_loop, name=self.THREAD_NAME, daemon=True).start()
+            self._added.append(parent_end)
+            self._waker[1].send(b"\0")
+
+    def after_fork_in_child(self) -> Optional[socket.socket]:
+        """forget children of the parent and return the upstream socket of this child
+
+        Returns:
+            Optional[socket.socket]: the upstream, None if the fork was not prepared by before_fork
+        """
+        pair = getattr(self._forking, "pair", None)
+        # close ends inherited from the parent, the parent tells a child exited by the end closed
+        inherited = list(self._buffers) + list(self._added) + list(self._waker or [])
+        if self._selector is not None:
+            self._selector.close()
+        for sock in inherited:
+            sock.close()
+        self._reset()
+        if pair is None:
+            return None
+        parent_end, child_end = pair
+        parent_end.close()
+        return child_end
+
+    def _read_loop(self):
+        selector, waker = self._selector, self._waker[0]
+        while True:
+            frames = []
+            for key, _ in selector.select():
+                sock = key.fileobj
+                if sock is waker:
+                    waker.recv(4096)
+                    while self._added:
+                        sock = self._added.popleft()
+                        self._buffers[sock] = b""
+                        selector.register(sock, selectors.EVENT_READ)
+                    continue
+                try:
+                    data = sock.recv(1 << 16)
+                except OSError:
+                    data = b""
+                if not data:  # child exited
+                    selector.unregister(sock)
+                    self._buffers.pop(sock, None)
+                    sock.close()
+                    continue
+                buffer = self._buffers[sock] + data
+                while len(buffer) >= _FRAME_HEAD.size:
+                    (length,) = _FRAME_HEAD.unpack_from(buffer)
+                    if len(buffer) < _FRAME_HEAD.size + length:
+                        break
+                    frames.append(buffer[_FRAME_HEAD.size : _FRAME_HEAD.size + length])
+                    buffer = buffer[_FRAME_HEAD.size + length :]
+                self._buffers[sock] = buffer
+            if frames:
+                try:
+                    self.on_frames(frames)
+                except Exception as e:
+                    print(f"failed to handle data from forked children: {e}")
@@ -85,8 +85,9 @@ def __update_and_get(name: str, *args, **kwargs):
         _update_interval = _cfg.interval
         expected_time_limit = _update_interval * __TIME_UNIT_SEC
         if delta_t > expected_time_limit:
-            logger.warn(
-                f"Watched value {_name} takes longer time({delta_t:.8f}s) to update than it was expected    ({expected_time_limit}s)."
+            logger.warn(  # format string with args, so that repeats are limited as one message
+                "Watched value %s takes longer time(%.8fs) to update than it was expected    (%ss).",
+                args=(_name, delta_t, expected_time_limit),
             )
 
     Thread(target=__call_listeners, args=(name, _the_value, _watch_config), daemon=True).start()
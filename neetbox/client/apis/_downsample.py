@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+#
+# Author: GavinGong aka VisualDust
+# Github: github.com/visualDust
+# Date:   20240120
+
+from dataclasses import dataclass
+from fnmatch import fnmatchcase
+from typing import Optional, Union
+
+import numpy as np
+
+# ===================== REDUCING things ===================== #
+
+
+def _reduce_groups(xs, ys, ts, by: str):
+    """reduce each row of 2D arrays into one point"""
+    if by == "mean":
+        return xs[:, -1], ys.mean(axis=1), ts[:, -1]
+    if by == "last":
+        return xs[:, -1], ys[:, -1], ts[:, -1]
+    index = ys.argmin(axis=1) if by == "min" else ys.argmax(axis=1)
+    rows = np.arange(len(index))
+    return xs[rows, index], ys[rows, index], ts[rows, index]
+
+
+def reduce_every(xs, ys, ts, k: int, by: str = "last"):
+    """reduce every k points into one point. for 'mean' and 'last' the reduced point takes x of the last point in group, for 'min' and 'max' it takes x of the picked point.
+
+    Args:
+        xs (np.ndarray): x of points
+        ys (np.ndarray): y of points
+        ts (np.ndarray): timestamp of points
+        k (int): number of points in a group, the last group may have less points
+        by (str, optional): one of 'mean', 'min', 'max' and 'last'. Defaults to "last".
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray]: reduced xs, ys and ts
+    """
+    n_full = len(xs) // k * k
+    reduced = _reduce_groups(
+        xs[:n_full].reshape(-1, k), ys[:n_full].reshape(-1, k), ts[:n_full].reshape(-1, k), by
+    )
+    if n_full == len(xs):
+        return reduced
+    rest = _reduce_groups(xs[None, n_full:], ys[None, n_full:], ts[None, n_full:], by)
+    return tuple(np.concatenate(pair) for pair in zip(reduced, rest))
+
+
+def limit_rate(ts, max_rate: float, last_bucket: int = None):
+    """keep the last point of each 1/max_rate seconds time bucket
+
+    Args:
+        ts (np.ndarray): timestamp of points in seconds
+        max_rate (float): max points per second
+        last_bucket (int, optional): last bucket already sent, points in it or earlier buckets are dropped. Defaults to None.
+
+    Returns:
+        Tuple[np.ndarray, int]: mask of points to keep, and the last bucket kept
+    """
+    buckets = np.floor(ts * max_rate).astype(np.int64)
+    keep = np.empty(len(buckets), dtype=bool)
+    keep[:-1] = buckets[1:] != buckets[:-1]
+    keep[-1:] = True
+    if last_bucket is not None:
+        keep &= buckets > last_bucket
+    kept = buckets[keep]
+    return keep, (int(kept[-1]) if len(kept) else last_bucket)
+
+
+def lttb(xs, ys, n_out: int):
+    """pick n_out points with Largest-Triangle-Three-Buckets, which keeps the visual shape of the line
+
+    Args:
+        xs (np.ndarray): x of points, should be ascending
+        ys (np.ndarray): y of points
+        n_out (int): number of points to keep, at least 3
+
+    Returns:
+        np.ndarray: indices of picked points
+    """
+    n = len(xs)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    picked = np.empty(n_out, dtype=np.int64)
+    picked[0], picked[-1] = 0, n - 1
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)  # n_out - 2 buckets between the ends
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        next_x = xs[end:next_end].mean() if next_end > end else xs[-1]
+        next_y = ys[end:next_end].mean() if next_end > end else ys[-1]
+        # twice the area of triangles formed by the last picked point, each candidate and the next bucket average
+        areas = np.abs(
+            (xs[a] - next_x) * (ys[start:end] - ys[a]) - (xs[a] - xs[start:end]) * (next_y - ys[a])
+        )
+        a = picked[i + 1] = start + int(areas.argmax())
+    return picked
+
+
+# ===================== POLICY things ===================== #
+
+
+@dataclass
+class ScalarPolicy:
+    """How points of a scalar series are reduced on client side before sending. Steps are applied in order: reduce every k points, limit rate, then LTTB.
+
+    Args:
+        max_rate (float, optional): max points per second to send. Defaults to None(no limit).
+        reduce_every (int, optional): reduce every k points into one. Defaults to None(no reduce).
+        reduce_by (str, optional): how to reduce, one of 'mean', 'min', 'max' and 'last'. Defaults to "last".
+        lttb (int, optional): max points to keep of each sent chunk, picked by LTTB. Defaults to None(keep all).
+    """
+
+    max_rate: Optional[float] = None
+    reduce_every: Optional[int] = None
+    reduce_by: str = "last"
+    lttb: Optional[int] = None
+
+    REDUCERS = ("mean", "min", "max", "last")
+
+    def __post_init__(self):
+        if self.reduce_by not in self.REDUCERS:
+            raise ValueError(
+                f"reduce_by should be one of {self.REDUCERS} but got '{self.reduce_by}'"
+            )
+
+    @classmethod
+    def from_json(cls, src: Union[dict, "ScalarPolicy", None]) -> "ScalarPolicy":
+        if src is None:
+            return ScalarPolicy()
+        if isinstance(src, ScalarPolicy):
+            return src
+        return ScalarPolicy(
+            max_rate=src.get("maxRate"),
+            reduce_every=src.get("reduceEvery"),
+            reduce_by=src.get("reduceBy", "last"),
+            lttb=src.get("lttb"),
+        )
+
+    @classmethod
+    def of_series(cls, name: str, policies: dict) -> "ScalarPolicy":
+        """find policy of series from config. exact names go first, then glob patterns like 'train/*' in order.
+
+        Args:
+            name (str): series name
+            policies (dict): policies in config, {name or pattern : policy json}
+
+        Returns:
+            ScalarPolicy: the policy
+        """
+        if name in policies:
+            return cls.from_json(policies[name])
+        for pattern, policy in policies.items():
+            if fnmatchcase(name, pattern):
+                return cls.from_json(policy)
+        return ScalarPolicy()
@@ -4,7 +4,12 @@
 # Github: github.com/visualDust
 # Date:   20231211
 
+import atexit
+import functools
 import io
+import os
+from collections import deque
+from threading import Condition, Thread
 from typing import Optional
 
 import cv2
@@ -12,8 +17,9 @@ import numpy as np
 from PIL import Image
 
 from neetbox._protocol import *
-from neetbox.config import get_project_id, get_run_id
+from neetbox.config import get_module_level_config, get_project_id, get_run_id
 from neetbox.logging import logger
+from neetbox.utils.mvc import Singleton
 from neetbox.utils.x2numpy import *
 
 from .._client import connection
@@ -61,30 +67,24 @@ def figure_to_image(figures, close=True):
 
 
 def make_grid(I, ncols=8):
-    # I: N1HW or N3HW
+    # I: N1HW, N3HW or N4HW
     import numpy as np
 
     assert isinstance(I, np.ndarray), "plugin error, should pass numpy array here"
-    if I.shape[1] == 1:
-        I = np.concatenate([I, I, I], 1)
-    assert I.ndim == 4 and I.shape[1] == 3 or I.shape[1] == 4
-    nimg = I.shape[0]
-    H = I.shape[2]
-    W = I.shape[3]
+    assert I.ndim == 4 and I.shape[1] in (1, 3, 4)
+    nimg, C, H, W = I.shape
     ncols = min(nimg, ncols)
     nrows = int(np.ceil(float(nimg) / ncols))
-    canvas = np.zeros((I.shape[1], H * nrows, W * ncols), dtype=I.dtype)
-    i = 0
-    for y in range(nrows):
-        for x in range(ncols):
-            if i >= nimg:
-                break
-            canvas[:, y * H : (y + 1) * H, x * W : (x + 1) * W] = I[i]
-            i = i + 1
-    return canvas
+    if nrows * ncols > nimg:  # pad blank images to fill the last row
+        I = np.concatenate([I, np.zeros((nrows * ncols - nimg, C, H, W), dtype=I.dtype)], 0)
+    # (nrows, ncols, C, H, W) -> (C, nrows, H, ncols, W)
+    return (
+        I.reshape(nrows, ncols, C, H, W).transpose(2, 0, 3, 1, 4).reshape(C, nrows * H, ncols * W)
+    )
 
 
 def convert_to_HWC(tensor, input_format):  # tensor: numpy array
+    """single channel images are kept as HW1, so that they are encoded as grayscale"""
     assert len(set(input_format)) == len(
         input_format
     ), "You an not use the same dimension shorthand twice. input_format: {}".format(input_format)
@@ -97,17 +97,12 @@ def convert_to_HWC(tensor, input_format):  # tensor: numpy array
 
     if len(input_format) == 2:
         index = [input_format.find(c) for c in "HW"]
-        tensor = tensor.transpose(index)
-        tensor = np.stack([tensor, tensor, tensor], 2)
-        return tensor
+        return tensor.transpose(index)[:, :, None]
 
     if len(input_format) == 3:
         if "N" not in input_format:
             index = [input_format.find(c) for c in "HWC"]
-            tensor_HWC = tensor.transpose(index)
-            if tensor_HWC.shape[2] == 1:
-                tensor_HWC = np.concatenate([tensor_HWC, tensor_HWC, tensor_HWC], 2)
-            return tensor_HWC
+            return tensor.transpose(index)
         else:
             index = [input_format.find(c) for c in "NHW"]
             tensor = tensor.transpose(index)[:, None, :, :]
@@ -120,32 +115,73 @@ def convert_to_HWC(tensor, input_format):  # tensor: numpy array
         return tensor_CHW.transpose(1, 2, 0)
 
 
-def add_image(name: str, image, dataformats: str = None):
-    """send an image to frontend display
+IMAGE_FORMATS = ("png", "jpeg", "webp")
+
+
+def _fit_max_edge(image: np.ndarray, max_edge: int) -> np.ndarray:
+    """downscale HWC image so that its longer edge is no larger than max_edge"""
+    H, W = image.shape[:2]
+    if not max_edge or max(H, W) <= max_edge:
+        return image
+    scale = max_edge / max(H, W)
+    size = (max(1, round(W * scale)), max(1, round(H * scale)))
+    return cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+
+
+def _encode_image(
+    image,
+    dataformats: str = None,
+    format: str = "png",
+    quality: int = 90,
+    png_compression: int = 3,
+    max_edge: int = 0,
+) -> bytes:
+    """encode image into bytes
 
     Args:
-        image (Union[np.array, Image.Image, Tensor]): image from cv2 and PIL.Image as well as tensors are supported
-        name (str): name of the image, used in frontend display
-        dataformats (str): if you are passing a tensor as image, please indicate how to understand the tensor. For example, dataformats="NCWH" means the first axis of the tensor is Number of batches, the second axis is Channel, and the third axis is Width, and the fourth axis is Height.
+        image (Union[np.ndarray, Image.Image]): the image
+        dataformats (str, optional): how to understand the array. Defaults to None("CHW").
+        format (str, optional): one of 'png', 'jpeg' and 'webp'. Defaults to "png".
+        quality (int, optional): 0-100, quality of 'jpeg' and 'webp'. Defaults to 90.
+        png_compression (int, optional): 0-9, compression level of 'png'. Defaults to 3.
+        max_edge (int, optional): downscale if the longer edge is larger than this, 0 for no limit. Defaults to 0.
 
+    Returns:
+        bytes: encoded image
     """
     if isinstance(image, Image.Image):  # is PIL Image
+        if max_edge:
+            image.thumbnail((max_edge, max_edge))  # in place, image is a snapshot
+        if format == "jpeg" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")  # jpeg has no alpha
         with io.BytesIO() as image_bytes_stream:
             # convert PIL Image to bytes
-            image.save(image_bytes_stream, format="PNG")
-            image_bytes = image_bytes_stream.getvalue()
-    else:  # try convert numpy
-        dataformats = dataformats or "CHW"
-        image = make_np(image)
-        image = convert_to_HWC(image, dataformats)
-        if image.dtype != np.uint8:
-            image = (image * 255.0).astype(np.uint8)
-
-        if isinstance(image, np.ndarray):  # convert ndarray to bytes
-            _, im_buf_arr = cv2.imencode(".png", image)
-            image_bytes = im_buf_arr.tobytes()
-
-    # send bytes
+            if format == "png":
+                image.save(image_bytes_stream, format="PNG", compress_level=png_compression)
+            else:
+                image.save(image_bytes_stream, format=format.upper(), quality=quality)
+            return image_bytes_stream.getvalue()
+    # try convert numpy
+    dataformats = dataformats or "CHW"
+    image = convert_to_HWC(image, dataformats)
+    if image.dtype != np.uint8:
+        image = (image * 255.0).astype(np.uint8)
+    if format == "jpeg" and image.shape[2] == 4:
+        image = image[:, :, :3]  # jpeg has no alpha
+    image = _fit_max_edge(image, max_edge)
+    if format == "png":
+        ext, params = ".png", [cv2.IMWRITE_PNG_COMPRESSION, png_compression]
+    elif format == "jpeg":
+        ext, params = ".jpg", [cv2.IMWRITE_JPEG_QUALITY, quality]
+    else:
+        ext, params = ".webp", [cv2.IMWRITE_WEBP_QUALITY, quality]
+    ok, im_buf_arr = cv2.imencode(ext, image, params)  # convert ndarray to bytes
+    if not ok:
+        raise RuntimeError(f"failed to encode image as {format}")
+    return im_buf_arr.tobytes()
+
+
+def _upload_image(name: str, image_bytes: bytes, timestamp: str, format: str = "png"):
     project_id = get_project_id()
     run_id = get_run_id()
     try:
@@ -155,6 +191,8 @@ def add_image(name: str, image, dataformats: str = None):
             who=IdentityType.CLI,
             series=name,
             event_type=EVENT_TYPE_NAME_IMAGE,
+            timestamp=timestamp,
+            payload={"format": format},  # server serves image by format
         )
         result = connection.post_check_online(
             api=f"{FRONTEND_API_ROOT}/project/{project_id}/image",
@@ -169,6 +207,157 @@ def add_image(name: str, image, dataformats: str = None):
         logger.warn(f"unable to upload image: {e}")
 
 
+class ImageUploader(metaclass=Singleton):
+    """Encode and upload images in worker threads. Images wait in a bounded queue, what happens when the queue is full depends on the overflow policy:
+    - block: caller waits until there is room in queue
+    - drop-oldest: the oldest image in queue is dropped
+    - drop-newest: the incoming image is dropped
+    """
+
+    OVERFLOW_POLICIES = ("block", "drop-oldest", "drop-newest")
+
+    def __init__(self) -> None:
+        self._query = deque()  # (name, image, dataformats, options, timestamp)
+        self._cond = Condition()
+        self._num_pending = 0  # images in query or being uploaded
+        self._num_dropped = 0
+        self._queue_size = None
+        self._overflow = None
+        self._options = None  # default encoding options
+
+    @property
+    def num_dropped(self):
+        return self._num_dropped
+
+    def _initialize(self):
+        """check image config and start workers. nothing is set if config is invalid, so that the next put checks again"""
+        config = get_module_level_config()["image"]
+        if config["overflow"] not in self.OVERFLOW_POLICIES:
+            raise ValueError(
+                f"image overflow policy should be one of {self.OVERFLOW_POLICIES} but got '{config['overflow']}'"
+            )
+        if config["format"] not in IMAGE_FORMATS:
+            raise ValueError(
+                f"image format should be one of {IMAGE_FORMATS} but got '{config['format']}'"
+            )
+        if not isinstance(config["queueSize"], int) or config["queueSize"] < 1:
+            raise ValueError(
+                f"image queue size should be a positive int but got {config['queueSize']}"
+            )
+        if not isinstance(config["workers"], int) or config["workers"] < 1:
+            raise ValueError(f"image workers should be a positive int but got {config['workers']}")
+        self._options = {
+            "format": config["format"],
+            "quality": config["quality"],
+            "png_compression": config["pngCompression"],
+            "max_edge": config["maxEdge"],
+        }
+        self._overflow = config["overflow"]
+        for _ in range(config["workers"]):
+            Thread(target=self._work_loop, daemon=True).start()
+        self._queue_size = config["queueSize"]  # set last, put checks it to see if initialized
+
+    def _after_fork_in_child(self):
+        """images queued before fork are uploaded by the parent, and the worker threads are gone"""
+        self.__init__()
+
+    def _work_loop(self):
+        while True:
+            with self._cond:
+                while not self._query:
+                    self._cond.wait()
+                name, image, dataformats, options, timestamp = self._query.popleft()
+                self._cond.notify_all()  # wake up blocked callers
+            try:
+                image_bytes = _encode_image(image, dataformats, **options)
+                _upload_image(name, image_bytes, timestamp, format=options["format"])
+            except Exception as e:
+                logger.warn(f"unable to encode image {name}: {e}")
+            finally:
+                with self._cond:
+                    self._num_pending -= 1
+                    self._cond.notify_all()
+
+    def put(self, name: str, image, dataformats: str = None, **options):
+        """queue an image to upload
+
+        Args:
+            name (str): series name of the image
+            image (Union[np.ndarray, Image.Image]): the image, should not be changed after put
+            dataformats (str, optional): how to understand the array. Defaults to None.
+            options: encoding options overriding config, see _encode_image. None values are ignored.
+        """
+        with self._cond:
+            if self._queue_size is None:
+                self._initialize()
+            options = {
+                k: (options[k] if options.get(k) is not None else v)
+                for k, v in self._options.items()
+            }
+            if options["format"] not in IMAGE_FORMATS:
+                raise ValueError(
+                    f"image format should be one of {IMAGE_FORMATS} but got '{options['format']}'"
+                )
+            if len(self._query) >= self._queue_size:
+                if self._overflow == "drop-newest":
+                    self._num_dropped += 1
+                    return
+                if self._overflow == "drop-oldest":
+                    self._query.popleft()
+                    self._num_pending -= 1
+                    self._num_dropped += 1
+                else:  # block
+                    self._cond.wait_for(lambda: len(self._query) < self._queue_size)
+            self._query.append((name, image, dataformats, options, get_timestamp()))
+            self._num_pending += 1
+            self._cond.notify_all()
+
+    def flush(self, timeout: float = None):
+        """wait until all the queued images are uploaded
+
+        Args:
+            timeout (float, optional): max seconds to wait. Defaults to None(wait forever).
+
+        Returns:
+            bool: whether all the images are uploaded
+        """
+        with self._cond:
+            return self._cond.wait_for(lambda: self._num_pending == 0, timeout=timeout)
+
+
+imageUploader = ImageUploader()
+atexit.register(imageUploader.flush, timeout=10)
+connection.on_child_exit(functools.partial(imageUploader.flush, timeout=10))
+if hasattr(os, "register_at_fork"):  # not on windows
+    os.register_at_fork(after_in_child=imageUploader._after_fork_in_child)
+
+
+def add_image(
+    name: str,
+    image,
+    dataformats: str = None,
+    format: str = None,
+    quality: int = None,
+    max_edge: int = None,
+):
+    """send an image to frontend display. images are encoded and uploaded in background, see 'image' in client config.
+
+    Args:
+        image (Union[np.array, Image.Image, Tensor]): image from cv2 and PIL.Image as well as tensors are supported
+        name (str): name of the image, used in frontend display
+        dataformats (str): if you are passing a tensor as image, please indicate how to understand the tensor. For example, dataformats="NCWH" means the first axis of the tensor is Number of batches, the second axis is Channel, and the third axis is Width, and the fourth axis is Height.
+        format (str, optional): 'png', 'jpeg' or 'webp'. Defaults to None(use config).
+        quality (int, optional): 0-100, quality of 'jpeg' and 'webp'. Defaults to None(use config).
+        max_edge (int, optional): downscale if the longer edge is larger than this, 0 for no limit. Defaults to None(use config).
+
+    """
+    if isinstance(image, Image.Image):  # snapshot, caller may change the image after
+        image = image.copy()
+    else:
+        image = np.array(make_np(image))  # copy to host memory
+    imageUploader.put(name, image, dataformats, format=format, quality=quality, max_edge=max_edge)
+
+
 # ===================== MATPLOTLIB things ===================== #
 
 
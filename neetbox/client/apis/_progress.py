@@ -4,10 +4,11 @@
 # Github: github.com/visualDust
 # Date:   20231217
 
-from time import time
+from time import monotonic
 from uuid import uuid4
 
 from neetbox._protocol import *
+from neetbox.config import get_module_level_config
 from neetbox.utils.framing import get_caller_identity_traceback
 from neetbox.utils.massive import describe_object
 
@@ -20,11 +21,21 @@ class Progress:
     iterator: enumerate
     timestamp: str
 
-    def __init__(self, input: Union[int, enumerate, any], *, name=None):
-        """Decorate an iterable object, returning an iterator. Neetbox will send progress to frontend while you are iterating through it.
+    def __init__(
+        self,
+        input: Union[int, enumerate, any],
+        *,
+        name=None,
+        max_rate: float = None,
+        traceback: bool = True,
+    ):
+        """Decorate an iterable object, returning an iterator. Neetbox will send progress to frontend while you are iterating through it. Updates are throttled, the last state is always sent when the iteration ends.
 
         Args:
             input (Union[int, enumerate, any]): Something to iterate or something to create enumeratable object.
+            name (str, optional): name of the progress. Defaults to None(name of the caller).
+            max_rate (float, optional): max updates sent per second, 0 for no limit. Defaults to None(use 'progress' in client config).
+            traceback (bool, optional): whether to find out the caller by walking the stack. if False, progresses are told apart by name only. Defaults to True.
         """
         self.name = name
         if isinstance(input, int):
@@ -36,45 +47,95 @@ class Progress:
         else:
             self.total = len(input)
             self.iterator = iter(input)
-        self.caller_identity = get_caller_identity_traceback(stack_offset=2)
+        if traceback:
+            self.caller_identity = get_caller_identity_traceback(stack_offset=2)
+            self.series = self.caller_identity.strid + (name or "")
+            self.display_name = name or self.caller_identity.last_describable
+        else:
+            self.caller_identity = None
+            self.series = self.display_name = name or "progress"
+
+        config = get_module_level_config(__name__)["progress"]
+        max_rate = config["maxRate"] if max_rate is None else max_rate
+        self._interval = 1.0 / max_rate if max_rate > 0 else 0
+        self._smoothing = config["smoothing"]
 
         self.done = 0
-        self.start_time = time()  # Track the start time
+        self.start_time = monotonic()  # Track the start time
         self.timestamp = get_timestamp()
+        self._current = None  # latest item
+        self._next_update_time = self.start_time  # first iteration is sent at once
+        self._last_update_time = self.start_time
+        self._last_update_done = 0
+        self._rate = None  # EMA smoothed iterations per second
+        self._finished = False
+
+    @property
+    def rate(self):
+        return self._rate
+
+    @property
+    def eta(self):
+        """estimated seconds left, None if unknown"""
+        if self.total is None or not self._rate:
+            return None
+        return max(self.total - self.done, 0) / self._rate
+
+    def _update(self, now: float):
+        elapsed = now - self._last_update_time
+        if elapsed > 0 and self.done > self._last_update_done:
+            rate = (self.done - self._last_update_done) / elapsed
+            self._rate = (
+                rate
+                if self._rate is None
+                else self._smoothing * rate + (1 - self._smoothing) * self._rate
+            )
+        self._last_update_time, self._last_update_done = now, self.done
+        self._next_update_time = now + self._interval
+        eta = self.eta
+        connection.ws_send(
+            event_type=EVENT_TYPE_NAME_PROGRESS,
+            series=self.series,
+            payload={
+                NAME_KEY: self.display_name,
+                "step": self.done,
+                "current": describe_object(self._current, length_limit=16),
+                "total": self.total,
+                "rate": self._rate if self._rate is not None else -1.0,
+                "eta": eta if eta is not None else -1.0,
+            },
+            timestamp=self.timestamp,
+            _history_len=1,
+        )
+
+    def _finish(self):
+        if self._finished:
+            return
+        self._finished = True
+        if self.done and self.done != self._last_update_done:  # send the final state
+            self._update(monotonic())
 
     def __enter__(self):
-        # print(f"entering {self.caller_identity}")
         return self
 
     def __exit__(self, type, value, traceback):
-        # print(f"leaving {self.caller_identity}")
+        self._finish()
         return
 
     def __iter__(self):
         return self
 
     def __next__(self):
-        if self.total and self.done > self.total:
-            raise StopIteration
+        try:
+            self._current = next(self.iterator)
+        except StopIteration:
+            self._finish()
+            raise
         self.done += 1
-        elapsed_time = time() - self.start_time
-        rate = self.done / elapsed_time if elapsed_time > 0 else 0  # Calculate the iteration rate
-        iter_next = next(self.iterator)
-
-        connection.ws_send(
-            event_type=EVENT_TYPE_NAME_PROGRESS,
-            series=self.caller_identity.strid + (self.name or ""),
-            payload={
-                NAME_KEY: self.name or self.caller_identity.last_describable,
-                "step": self.done,
-                "current": describe_object(iter_next, length_limit=16),
-                "total": self.total,
-                "rate": rate if self.done > 1 else -1.0,
-            },
-            timestamp=self.timestamp,
-            _history_len=1,
-        )
-        return iter_next
+        now = monotonic()
+        if now >= self._next_update_time:
+            self._update(now)
+        return self._current
 
     def __len__(self):
         if self.total is None:
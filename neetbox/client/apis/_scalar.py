@@ -4,24 +4,188 @@
 # Github: github.com/visualDust
 # Date:   20231211
 
+import atexit
+import functools
+import numbers
+import os
+import time
+from threading import Lock, Thread
+
 from neetbox._protocol import *
+from neetbox.config import get_module_level_config
+from neetbox.utils.mvc import Singleton
 from neetbox.utils.x2numpy import *
 
 from .._client import connection
+from ._downsample import ScalarPolicy, limit_rate, lttb, reduce_every
 
 # ===================== PLOTTING things ===================== #
 
 
-def add_scalar(name: str, x: Union[int, float], y: Union[int, float]):
-    """send a scalar to frontend display
+class _ScalarSeriesBuffer:
+    def __init__(self, capacity: int, policy: ScalarPolicy):
+        capacity = max(capacity, policy.reduce_every or 0)  # hold at least one reduce group
+        self.xs = np.empty(capacity, dtype=np.int64)  # float64 after a non-integer x comes
+        self.ys = np.empty(capacity, dtype=np.float64)
+        self.timestamps = np.empty(capacity, dtype=np.float64)
+        self.size = 0
+        self.int_x = True  # x are kept and sent as int if all the x are int
+        self.policy = policy
+        self.policy_src = None  # what user passed in as policy
+        self.last_bucket = None  # last time bucket sent when rate limited
+
+    def accepts_int_x(self, x) -> bool:
+        """whether x can be kept in the int x array, otherwise xs should be converted to float by float_x"""
+        return isinstance(x, numbers.Integral) and -(2**63) <= x < 2**63
+
+    def float_x(self):
+        if self.int_x:
+            self.xs = self.xs.astype(np.float64)
+            self.int_x = False
+
+    @property
+    def is_full(self):
+        return self.size == len(self.xs)
+
+    def take(self, final=False):
+        """take buffered points out as a columnar chunk and reset the buffer, points are reduced by policy
+
+        Args:
+            final (bool, optional): whether to reduce the incomplete group as well. Defaults to False.
+
+        Returns:
+            Optional[dict]: the chunk, or None if there is nothing to send
+        """
+        n = self.size
+        policy = self.policy
+        k = policy.reduce_every
+        n_take = n if final or not k else n // k * k  # keep incomplete group in buffer
+        xs, ys, ts = self.xs[:n_take], self.ys[:n_take], self.timestamps[:n_take]
+        if n_take and k:
+            xs, ys, ts = reduce_every(xs, ys, ts, k=k, by=policy.reduce_by)
+        if len(ts) and policy.max_rate:
+            keep, self.last_bucket = limit_rate(ts, policy.max_rate, self.last_bucket)
+            xs, ys, ts = xs[keep], ys[keep], ts[keep]
+        if policy.lttb and len(xs) > policy.lttb:
+            picked = lttb(xs, ys, policy.lttb)
+            xs, ys, ts = xs[picked], ys[picked], ts[picked]
+        chunk = None
+        if len(xs):
+            chunk = {
+                "x": xs.tolist(),
+                "y": ys.tolist(),
+                TIMESTAMP_KEY: ts.tolist(),
+            }
+        rest = n - n_take
+        for array in (self.xs, self.ys, self.timestamps):  # move incomplete group to front
+            array[:rest] = array[n_take:n]
+        self.size = rest
+        if not rest and not self.int_x:
+            self.xs = np.empty(len(self.xs), dtype=np.int64)
+            self.int_x = True
+        return chunk
+
+
+class ScalarBuffer(metaclass=Singleton):
+    """Buffer scalars of each series in preallocated arrays, send them as one columnar chunk when a series is full or every flush interval. Points are reduced by the policy of the series before sending."""
+
+    def __init__(self) -> None:
+        self._series = {}  # series name -> _ScalarSeriesBuffer
+        self._lock = Lock()
+        self._flush_size = None
+        self._flush_interval = None
+        self._policies = {}  # policies from config
+
+    def _initialize(self):
+        config = get_module_level_config()["scalar"]
+        self._flush_size = config["flushSize"]
+        self._flush_interval = config["flushInterval"]
+        self._policies = config.get("policy", {})
+        Thread(target=self._flush_loop, daemon=True).start()
+
+    def _after_fork_in_child(self):
+        """points buffered before fork are sent by the parent, and the flush thread is gone"""
+        self.__init__()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self._flush_interval)
+            self.flush()
+
+    def _send(self, name: str, chunk: dict):
+        if chunk:
+            connection.ws_send(event_type=EVENT_TYPE_NAME_SCALAR_CHUNK, series=name, payload=chunk)
+
+    def append(self, name: str, x, y, policy=None):
+        chunks = []
+        with self._lock:
+            buffer = self._series.get(name)
+            if buffer is None:
+                if self._flush_size is None:
+                    self._initialize()
+                _policy = (
+                    ScalarPolicy.from_json(policy)
+                    if policy is not None
+                    else ScalarPolicy.of_series(name, self._policies)
+                )
+                buffer = self._series[name] = _ScalarSeriesBuffer(self._flush_size, _policy)
+                buffer.policy_src = policy
+            elif policy is not None and policy != buffer.policy_src:  # policy changed
+                chunks.append(buffer.take(final=True))
+                buffer = self._series[name] = _ScalarSeriesBuffer(
+                    self._flush_size, ScalarPolicy.from_json(policy)
+                )
+                buffer.policy_src = policy
+            if buffer.int_x and not buffer.accepts_int_x(x):
+                buffer.float_x()
+            i = buffer.size
+            buffer.xs[i] = x
+            buffer.ys[i] = y
+            buffer.timestamps[i] = time.time()
+            buffer.size = i + 1
+            if buffer.is_full:
+                chunks.append(buffer.take())
+        for chunk in chunks:
+            self._send(name, chunk)
+
+    def flush(self, final=False):
+        """send all the buffered scalars
+
+        Args:
+            final (bool, optional): whether to reduce incomplete groups as well. Defaults to False.
+        """
+        with self._lock:
+            chunks = [
+                (name, buffer.take(final=final))
+                for name, buffer in self._series.items()
+                if buffer.size
+            ]
+        for name, chunk in chunks:
+            self._send(name, chunk)
+
+
+scalarBuffer = ScalarBuffer()
+atexit.register(scalarBuffer.flush, final=True)
+connection.on_child_exit(functools.partial(scalarBuffer.flush, final=True))
+if hasattr(os, "register_at_fork"):  # not on windows
+    os.register_at_fork(after_in_child=scalarBuffer._after_fork_in_child)
+
+
+def add_scalar(
+    name: str,
+    x: Union[int, float],
+    y: Union[int, float],
+    policy: Union[ScalarPolicy, dict] = None,
+):
+    """send a scalar to frontend display. scalars are buffered and sent in chunks, see 'scalar' in client config.
 
     Args:
         name (str): name of the image, used in frontend display
         x (Union[int, float]): x
         y (Union[int, float]): y
+        policy (Union[ScalarPolicy, dict], optional): how to reduce points of this series before sending, overrides the policy in config. dict keys are the same as in config: 'maxRate', 'reduceEvery', 'reduceBy' and 'lttb'. Defaults to None(use config).
     """
-    # send
-    connection.ws_send(event_type=EVENT_TYPE_NAME_SCALAR, series=name, payload={"x": x, "y": y})
+    scalarBuffer.append(name, x, y, policy=policy)
 
 
 # ===================== HYPERPARAM things ===================== #
@@ -39,6 +39,27 @@ _DEFAULT_WORKSPACE_CONFIG = {
         "mute": True,
         "mode": "detached",
         "uploadInterval": 1,
+        "flushInterval": 0.02,  # seconds to coalesce websocket messages into one batch frame
+        "flushSize": 256,  # max number of websocket messages in one batch frame
+        "wireFormat": "json",  # 'json' or 'compact'(binary), compact is used if server supports
+        "scalar": {
+            "flushSize": 256,  # max number of points of a series buffered before sending
+            "flushInterval": 0.5,  # seconds between sending buffered points
+            "policy": {},  # { series name or pattern : { maxRate, reduceEvery, reduceBy, lttb } }
+        },
+        "image": {
+            "workers": 2,  # threads encoding and uploading images
+            "queueSize": 16,  # max images waiting to be uploaded
+            "overflow": "block",  # when queue is full: 'block', 'drop-oldest' or 'drop-newest'
+            "format": "png",  # image codec, 'png', 'jpeg' or 'webp'
+            "quality": 90,  # 0-100, quality of 'jpeg' and 'webp'
+            "pngCompression": 3,  # 0-9, compression level of 'png'
+            "maxEdge": 0,  # downscale images whose longer edge is larger than this, 0 for no limit
+        },
+        "progress": {
+            "maxRate": 2,  # max progress updates sent per second
+            "smoothing": 0.3,  # 0-1, weight of the latest rate in the smoothed rate
+        },
         "shell": {"enable": True, "daemon": True},
     },
 }
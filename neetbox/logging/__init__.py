@@ -1,5 +1,5 @@
 from ._formatting import LogStyle, RawLog
 from ._logger import DEFAULT_LOGGER as logger
-from ._logger import Logger, LogLevel
+from ._logger import Lazy, Logger, LogLevel
 
-__all__ = ["logger", "Logger", "LogLevel", "LogStyle", "RawLog"]
+__all__ = ["logger", "Lazy", "Logger", "LogLevel", "LogStyle", "RawLog"]
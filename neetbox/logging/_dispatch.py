@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+#
+# Author: GavinGong aka VisualDust
+# Github: github.com/visualDust
+# Date:   20240120
+
+import atexit
+from collections import deque
+from threading import Condition, Event, Thread
+
+from neetbox.utils.framing import get_caller_identity_traceback
+
+from ._formatting import RawLog
+
+
+class LogDispatcher:
+    """Run log writers in a background thread. Loggers only append logs to a queue, the dispatcher thread takes logs out in batches and runs writers on them. When the queue is full, new logs are dropped and counted.
+
+    Args:
+        queue_size (int, optional): max logs waiting in queue. Defaults to 8192.
+        batch_size (int, optional): max logs taken out of queue at once. Defaults to 256.
+        reporter (Logger, optional): the logger whose writers write reports of dropped logs, the same one no matter which loggers the dropped logs come from. Defaults to None(not reported).
+    """
+
+    THREAD_NAME = "neetbox-log-dispatcher"  # writers may buffer logs written in this thread
+
+    def __init__(self, queue_size: int = 8192, batch_size: int = 256, reporter=None) -> None:
+        # (logger, log, skip_writers_names). append and popleft are thread safe
+        self._query = deque()
+        self._queue_size = queue_size
+        self._batch_size = batch_size
+        self._reporter = reporter
+        self._ready = Event()
+        self._cond = Condition()  # notified when a batch is done
+        self._busy = False
+        self._num_dropped = 0
+        self._num_dropped_reported = 0
+        self._stopped = False
+        self._thread = Thread(target=self._dispatch_loop, name=self.THREAD_NAME, daemon=True)
+        self._thread.start()
+        atexit.register(self.flush, timeout=5)
+
+    @property
+    def num_dropped(self):
+        return self._num_dropped
+
+    def put(self, logger, log: RawLog, skip_writers_names):
+        if len(self._query) >= self._queue_size:
+            self._num_dropped += 1
+            return
+        self._query.append((logger, log, skip_writers_names))
+        self._ready.set()
+
+    def _dispatch_loop(self):
+        while True:
+            self._ready.wait()
+            self._ready.clear()
+            while self._query:
+                self._busy = True
+                loggers = set()
+                for _ in range(min(len(self._query), self._batch_size)):
+                    logger, log, skip_writers_names = self._query.popleft()
+                    logger._write(log, skip_writers_names)
+                    loggers.add(logger)
+                if self._report_dropped():
+                    loggers.add(self._reporter)
+                for logger in loggers:  # let writers write out the batch
+                    logger._flush_writers()
+                with self._cond:
+                    self._busy = False
+                    self._cond.notify_all()
+            if self._stopped:
+                return
+
+    def _report_dropped(self) -> bool:
+        num_dropped = self._num_dropped - self._num_dropped_reported
+        if num_dropped and self._reporter is not None:
+            self._num_dropped_reported += num_dropped
+            log = RawLog(
+                message=f"{num_dropped} logs dropped because log queue is full",
+                caller_identity=get_caller_identity_traceback(stack_offset=1),
+                caller_identity_alias="LOG DISPATCHER",
+                series="warning",
+            )
+            self._reporter._write(log, [])
+            return True
+        return False
+
+    def flush(self, timeout: float = None):
+        """wait until all the logs in queue are written
+
+        Args:
+            timeout (float, optional): max seconds to wait. Defaults to None(wait forever).
+
+        Returns:
+            bool: whether all the logs are written
+        """
+        self._ready.set()
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._query and not self._busy, timeout=timeout)
+
+    def stop(self, timeout: float = None):
+        """write logs left in queue and stop the dispatcher thread"""
+        self._stopped = True
+        self.flush(timeout=timeout)
+        self._ready.set()
+        atexit.unregister(self.flush)
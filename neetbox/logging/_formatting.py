@@ -6,12 +6,57 @@
 
 from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Optional
+from enum import Enum
+from typing import Optional, Union
 
 from neetbox._protocol import *
 from neetbox.utils.framing import TracebackIdentity
 
 
+class LogLevel(Enum):
+    ALL = 4
+    DEBUG = 3
+    INFO = 2
+    WARNING = 1
+    ERROR = 0
+
+    def __lt__(self, other):
+        return self.value < other.value
+
+    def __le__(self, other):
+        return self.value <= other.value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+    def __ne__(self, other):
+        return self.value != other.value
+
+    def __gt__(self, other):
+        return self.value > other.value
+
+    def __ge__(self, other):
+        return self.value >= other.value
+
+    def __hash__(self):
+        return hash(self.value)
+
+    @classmethod
+    def parse(cls, level: Union["LogLevel", str, int]) -> "LogLevel":
+        if type(level) is str:
+            level = {
+                "ALL": LogLevel.ALL,
+                "DEBUG": LogLevel.DEBUG,
+                "INFO": LogLevel.INFO,
+                "WARNING": LogLevel.WARNING,
+                "ERROR": LogLevel.ERROR,
+            }[level]
+        if type(level) is int:
+            assert level >= 0 and level <= 4
+            level = LogLevel(level)
+        return level
+
+
 @dataclass
 class LogStyle:
     datetime_format: Optional[str] = r"%Y-%m-%dT%H:%M:%S.%f"
@@ -23,9 +68,10 @@ class RawLog:
     message: str
     caller_identity: TracebackIdentity
     caller_identity_alias: Optional[str] = None
-    timestamp: datetime = datetime.now()
+    timestamp: datetime = field(default_factory=datetime.now)
     series: Optional[str] = None
     style: LogStyle = field(default_factory=LogStyle)  # fix python 3.11 dataclass issue
+    level: LogLevel = LogLevel.INFO
 
     @property
     def timestamp_formatted(self):
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+#
+# Author: GavinGong aka VisualDust
+# Github: github.com/visualDust
+# Date:   20240120
+
+import heapq
+from collections import deque
+from threading import Lock
+from time import monotonic
+from typing import Callable, Hashable, List, Optional
+
+
+class RepeatLimiter:
+    """Suppress repeated things. Each key is let through at most max_repeats times in any window seconds, more repeats are suppressed and counted. The count is reported when the key is let through again, or when the window the suppression started in has passed, which is checked on hits of any key.
+
+    Args:
+        max_repeats (int, optional): max repeats of a key let through in a window. Defaults to 5.
+        window (float, optional): length of the sliding window in seconds. Defaults to 10.0.
+    """
+
+    def __init__(self, max_repeats: int = 5, window: float = 10.0) -> None:
+        self.max_repeats = max_repeats
+        self.window = window
+        self._lock = Lock()
+        # key : [monotonic times of repeats let through, num suppressed, report of the last suppressed]
+        self._key2state = {}
+        self._due = []  # heap of (time to report suppressed repeats, key)
+        self._next_prune = monotonic() + window
+
+    def hit(self, key: Hashable, make_report: Callable[[], Callable[[int], None]] = None):
+        """count a repeat of key
+
+        Args:
+            key (Hashable): the key
+            make_report (Callable[[], Callable[[int], None]], optional): called only if the repeat is suppressed, makes the callback reporting the number of suppressed repeats. Defaults to None.
+
+        Returns:
+            Tuple[bool, List[Callable]]: whether to let the repeat through, and reports to run now(callbacks taking no args)
+        """
+        now = monotonic()
+        with self._lock:
+            if now >= self._next_prune:
+                self._prune_locked(now)
+            state = self._key2state.get(key)
+            if state is None:
+                state = self._key2state[key] = [deque(), 0, None]
+            passed = state[0]
+            while passed and passed[0] <= now - self.window:  # slide the window
+                passed.popleft()
+            reports = self._pop_due_locked(now) if self._due and self._due[0][0] <= now else []
+            if len(passed) < self.max_repeats:
+                passed.append(now)
+                if state[1]:  # report suppressed repeats before the one let through
+                    reports.append(self._pop_report_locked(state))
+                return True, reports
+            if not state[1]:
+                heapq.heappush(self._due, (now + self.window, key))
+            state[1] += 1
+            state[2] = make_report() if make_report is not None else None
+            return False, reports
+
+    def pop_all(self) -> List[Callable]:
+        """take reports of all the suppressed repeats not reported yet, as callbacks taking no args"""
+        with self._lock:
+            return self._pop_due_locked(None)
+
+    def _pop_report_locked(self, state):
+        num_suppressed, report = state[1], state[2]
+        state[1], state[2] = 0, None
+        return lambda: report(num_suppressed) if report is not None else None
+
+    def _pop_due_locked(self, now: Optional[float]) -> List[Callable]:
+        reports = []
+        while self._due and (now is None or self._due[0][0] <= now):
+            _, key = heapq.heappop(self._due)
+            state = self._key2state.get(key)
+            if state is not None and state[1]:
+                reports.append(self._pop_report_locked(state))
+        return reports
+
+    def _prune_locked(self, now: float):
+        """forget keys not let through in the last window and with nothing to report, so that states of one-off keys do not pile up"""
+        self._key2state = {
+            key: state
+            for key, state in self._key2state.items()
+            if state[1] or (state[0] and state[0][-1] > now - self.window)
+        }
+        self._next_prune = now + self.window
@@ -4,50 +4,54 @@
 # Github: github.com/visualDust
 # Date:   20230315
 
+import atexit
 import functools
 import os
 from datetime import date
-from enum import Enum
 from typing import Callable, Optional, Union
 
 from neetbox.utils import Registry
 from neetbox.utils.framing import get_caller_identity_traceback
 
-from ._formatting import LogStyle, RawLog
+from ._dispatch import LogDispatcher
+from ._formatting import LogLevel, LogStyle, RawLog
+from ._limiter import RepeatLimiter
 from .writers import FileLogWriter
 
 LogWriters = Registry("LOG_WRITERS")
 
+# values of levels, compared in log calls
+_DEBUG = LogLevel.DEBUG.value
+_INFO = LogLevel.INFO.value
+_WARNING = LogLevel.WARNING.value
+_ERROR = LogLevel.ERROR.value
 
-class LogLevel(Enum):
-    ALL = 4
-    DEBUG = 3
-    INFO = 2
-    WARNING = 1
-    ERROR = 0
 
-    def __lt__(self, other):
-        return self.value < other.value
+class Lazy:
+    """content of a log made only if some writer takes the log, such as logger.debug(Lazy(model.summary)). other content is logged as it is, callable or not.
 
-    def __le__(self, other):
-        return self.value <= other.value
+    Args:
+        func (Callable): called with args and kwargs to get the thing to log
+    """
 
-    def __eq__(self, other):
-        return self.value == other.value
+    __slots__ = ("func", "args", "kwargs")
 
-    def __ne__(self, other):
-        return self.value != other.value
+    def __init__(self, func: Callable, *args, **kwargs) -> None:
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
 
-    def __gt__(self, other):
-        return self.value > other.value
-
-    def __ge__(self, other):
-        return self.value >= other.value
+    def __call__(self):
+        return self.func(*self.args, **self.kwargs)
 
 
 class Logger:
     # global static
     _IDENTITY2LOGGER = {}
+    _DISPATCHER: Optional[LogDispatcher] = None  # run writers in background if set
+    _WRITER2LEVEL = {}  # writer name : value of minimum log level
+    # suppress logs repeated from the same line with the same message, see set_repeat_limit
+    _LIMITER: Optional[RepeatLimiter] = None
 
     def __init__(
         self,
@@ -67,7 +71,7 @@ class Logger:
 
         self.name_alias = name_alias
         self._default_style = style
-        self._log_level = log_level
+        self.log_level = log_level
         self.private_writers = {}
         self.skipped_writers_names = skip_writers_names
 
@@ -92,18 +96,87 @@ class Logger:
 
     @log_level.setter
     def log_level(self, level: Union[LogLevel, str]):
-        if type(level) is str:
-            level = {
-                "ALL": LogLevel.ALL,
-                "DEBUG": LogLevel.DEBUG,
-                "INFO": LogLevel.INFO,
-                "WARNING": LogLevel.WARNING,
-                "ERROR": LogLevel.ERROR,
-            }[level]
-        if type(level) is int:
-            assert level >= 0 and level <= 3
-            level = LogLevel(level)
-        self._log_level = level
+        self._log_level = LogLevel.parse(level)
+        self._log_level_value = self._log_level.value  # compared on each log call
+
+    @classmethod
+    def set_writer_level(cls, name: str, level: Union[LogLevel, str, None]):
+        """set the minimum level of logs a writer receives, for all the loggers.
+
+        Args:
+            name (str): name of the writer, such as 'stdout', 'ws' or 'file'
+            level (Union[LogLevel, str, None]): logs less important than this are not written by the writer. None to remove the limit.
+        """
+        if level is None:
+            cls._WRITER2LEVEL.pop(name, None)
+        else:
+            cls._WRITER2LEVEL[name] = LogLevel.parse(level).value
+
+    @classmethod
+    def set_async(cls, enable: bool = True, queue_size: int = 8192, batch_size: int = 256):
+        """run log writers of all the loggers in a background thread, so that logging does not wait for terminal, file or network. logs left in queue are written at exit. the number of logs dropped when the queue is full is reported through writers of the default logger.
+
+        Args:
+            enable (bool, optional): True to run writers in background, False to run them in logging thread again. Defaults to True.
+            queue_size (int, optional): max logs waiting to be written, more logs are dropped. Defaults to 8192.
+            batch_size (int, optional): max logs written at once. Defaults to 256.
+
+        Returns:
+            Optional[LogDispatcher]: the dispatcher if enabled
+        """
+        dispatcher, cls._DISPATCHER = cls._DISPATCHER, None
+        if dispatcher is not None:
+            dispatcher.stop()
+        if enable:
+            cls._DISPATCHER = LogDispatcher(
+                queue_size=queue_size, batch_size=batch_size, reporter=DEFAULT_LOGGER
+            )
+        return cls._DISPATCHER
+
+    @classmethod
+    def _after_fork_in_child(cls):
+        """the dispatcher thread is gone in a forked child and locks may be left held by threads of the parent, start over"""
+        dispatcher = cls._DISPATCHER
+        if dispatcher is not None:  # logs queued before fork are written by the parent
+            atexit.unregister(dispatcher.flush)
+            cls._DISPATCHER = LogDispatcher(
+                dispatcher._queue_size, dispatcher._batch_size, reporter=dispatcher._reporter
+            )
+        limiter = cls._LIMITER
+        if limiter is not None:
+            cls._LIMITER = RepeatLimiter(max_repeats=limiter.max_repeats, window=limiter.window)
+
+    @classmethod
+    def set_repeat_limit(cls, max_repeats: Optional[int] = 5, window: float = 10.0):
+        """limit logs repeated from the same line with the same message(the format string if logged with args), for all the loggers. not limited by default. at most max_repeats of them are written in any window seconds, the suppressed ones are summarized as a '(repeated N more times)' log later.
+
+        Args:
+            max_repeats (Optional[int], optional): max repeats written in a window, None to disable the limit. Defaults to 5.
+            window (float, optional): length of the sliding window in seconds. Defaults to 10.0.
+        """
+        limiter, cls._LIMITER = cls._LIMITER, None
+        if limiter is not None:
+            for report in limiter.pop_all():
+                report()
+        if max_repeats is not None:
+            cls._LIMITER = RepeatLimiter(max_repeats=max_repeats, window=window)
+
+    @classmethod
+    def flush(cls, timeout: float = None):
+        """write summaries of suppressed repeated logs(see set_repeat_limit), and wait until logs are written if writers run in background(see set_async)
+
+        Args:
+            timeout (float, optional): max seconds to wait. Defaults to None(wait forever).
+
+        Returns:
+            bool: whether all the logs are written
+        """
+        limiter = cls._LIMITER
+        if limiter is not None:
+            for report in limiter.pop_all():
+                report()
+        dispatcher = cls._DISPATCHER
+        return dispatcher.flush(timeout=timeout) if dispatcher is not None else True
 
     def writer(self, name: str):
         def _add_private_writer(name, writer_func: Callable):
@@ -112,7 +185,7 @@ class Logger:
             self.private_writers[name] = writer_func
             return writer_func
 
-        return functools.partial(_add_private_writer, name=name)
+        return functools.partial(_add_private_writer, name)
 
     def skip_writer_name(self, name: str):
         self.skipped_writers_names.append(name)
@@ -123,20 +196,89 @@ class Logger:
         series: Optional[str] = None,
         skip_writers_names: list[str] = [],
         stack_offset=2,
+        args: tuple = None,
+        level: LogLevel = LogLevel.INFO,
     ):
+        """write a log no matter the log level of logger. message is made of content joined by space.
+
+        Args:
+            content: things to log. Lazy content is made only if some writer takes the log.
+            series (Optional[str], optional): series of the log, such as 'info' and 'warning'. Defaults to None.
+            skip_writers_names (list[str], optional): names of writers to skip. Defaults to [].
+            stack_offset (int, optional): how many frames to go up to find the caller. Defaults to 2.
+            args (tuple, optional): if given, the first content is a %-style format string formatted with args. Defaults to None.
+            level (LogLevel, optional): level of the log, used by writers with minimum levels. Defaults to LogLevel.INFO.
+        """
+        if Logger._WRITER2LEVEL and not self._has_writer_for(level, skip_writers_names):
+            return self  # every writer drops it, nothing is made
         # converting passed message args into a single string
         message = ""
-        for msg in content:
+        template = None  # format string, repeats are told apart by it instead of the message
+        for i, msg in enumerate(content):
+            if isinstance(msg, Lazy):
+                msg = msg()
+            if i == 0 and args is not None:
+                template = msg
+                msg = str(msg) % args
             message += str(msg) + " "
+        caller_identity = get_caller_identity_traceback(stack_offset=stack_offset)
 
+        limiter = Logger._LIMITER
+        if limiter is not None:
+            key = (caller_identity.filepath, caller_identity.lineno, series, template or message)
+            make_report = lambda: functools.partial(
+                self._write_repeated, message, caller_identity, series, level, skip_writers_names
+            )
+            passed, reports = limiter.hit(key, make_report)
+            for report in reports:
+                report()
+            if not passed:
+                return self
+
+        self._emit(
+            RawLog(
+                message=message,
+                caller_identity=caller_identity,
+                caller_identity_alias=self.name_alias,
+                series=series,
+                style=self._default_style,
+                level=level,
+            ),
+            skip_writers_names,
+        )
+        return self
+
+    def _has_writer_for(self, level: LogLevel, skip_writers_names: list[str]) -> bool:
+        """whether any writer not skipped takes logs of level"""
+        writer2level, value = Logger._WRITER2LEVEL, level.value
+        skipped = self.skipped_writers_names + skip_writers_names
+        for writer_name in [*LogWriters.keys(), *self.private_writers]:
+            if writer_name not in skipped and writer2level.get(writer_name, value) >= value:
+                return True
+        return False
+
+    def _write_repeated(
+        self, message, caller_identity, series, level, skip_writers_names, num_repeated
+    ):
+        """write the summary of suppressed repeated logs"""
         log = RawLog(
-            message=message,
-            caller_identity=get_caller_identity_traceback(stack_offset=stack_offset),
+            message=f"{message}(repeated {num_repeated} more times)",
+            caller_identity=caller_identity,
             caller_identity_alias=self.name_alias,
             series=series,
             style=self._default_style,
+            level=level,
         )
+        self._emit(log, skip_writers_names)
 
+    def _emit(self, log: RawLog, skip_writers_names: list[str]):
+        dispatcher = Logger._DISPATCHER
+        if dispatcher is not None:  # writers run in dispatcher thread
+            dispatcher.put(self, log, skip_writers_names)
+        else:
+            self._write(log, skip_writers_names)
+
+    def _write(self, log: RawLog, skip_writers_names: list[str] = []):
         writers = []
         for writer_name, writer_func in LogWriters.items():  # collect global writers
             if writer_name not in self.skipped_writers_names + skip_writers_names:
@@ -146,28 +288,54 @@ class Logger:
             if writer_name not in self.skipped_writers_names + skip_writers_names:
                 writers.append((writer_name, writer_func))
 
+        writer2level = Logger._WRITER2LEVEL
         for writer_name, writer_func in writers:
+            if writer_name in writer2level and log.level.value > writer2level[writer_name]:
+                continue  # less important than the writer wants
             try:
                 writer_func(log)
             except Exception as e:
-                print(f"log writer {writer_name} fialed: {e}, original message:")
-                print(log)
-
-        return self
+                self._report_writer_failure(writer_name, e, log)
+
+    @staticmethod
+    def _report_writer_failure(writer_name: str, error: Exception, log: RawLog):
+        limiter = Logger._LIMITER
+        if limiter is not None:  # a broken writer fails on every log, do not flood the terminal
+            make_report = lambda: lambda n: print(f"log writer {writer_name} failed {n} more times")
+            passed, reports = limiter.hit((writer_name, type(error)), make_report)
+            for report in reports:
+                report()
+            if not passed:
+                return
+        print(f"log writer {writer_name} fialed: {error}, original message:")
+        print(log)
+
+    def _flush_writers(self):
+        for writer_name, writer_func in LogWriters.items() + list(self.private_writers.items()):
+            flush = getattr(writer_func, "flush", None)
+            if flush is not None:
+                try:
+                    flush()
+                except Exception as e:
+                    print(f"log writer {writer_name} failed to flush: {e}")
 
     def ok(
         self,
         *content,
         skip_writers_names: list[str] = [],
         stack_offset=2,
+        args: tuple = None,
     ):
-        if self._log_level >= LogLevel.INFO:
-            self.log(
-                *content,
-                series=f"ok",
-                skip_writers_names=skip_writers_names,
-                stack_offset=stack_offset + 1,
-            )
+        if self._log_level_value < _INFO:  # disabled, nothing is made
+            return self
+        self.log(
+            *content,
+            series=f"ok",
+            skip_writers_names=skip_writers_names,
+            stack_offset=stack_offset + 1,
+            args=args,
+            level=LogLevel.INFO,
+        )
         return self
 
     def debug(
@@ -175,14 +343,18 @@ class Logger:
         *content,
         skip_writers_names: list[str] = [],
         stack_offset=2,
+        args: tuple = None,
     ):
-        if self._log_level >= LogLevel.INFO:
-            self.log(
-                *content,
-                series=f"debug",
-                skip_writers_names=skip_writers_names,
-                stack_offset=stack_offset + 1,
-            )
+        if self._log_level_value < _DEBUG:  # disabled, nothing is made
+            return self
+        self.log(
+            *content,
+            series=f"debug",
+            skip_writers_names=skip_writers_names,
+            stack_offset=stack_offset + 1,
+            args=args,
+            level=LogLevel.DEBUG,
+        )
         return self
 
     def info(
@@ -190,14 +362,18 @@ class Logger:
         *content,
         skip_writers_names: list[str] = [],
         stack_offset=2,
+        args: tuple = None,
     ):
-        if self._log_level >= LogLevel.INFO:
-            self.log(
-                *content,
-                series=f"info",
-                skip_writers_names=skip_writers_names,
-                stack_offset=stack_offset + 1,
-            )
+        if self._log_level_value < _INFO:  # disabled, nothing is made
+            return self
+        self.log(
+            *content,
+            series=f"info",
+            skip_writers_names=skip_writers_names,
+            stack_offset=stack_offset + 1,
+            args=args,
+            level=LogLevel.INFO,
+        )
         return self
 
     def warn(
@@ -205,14 +381,18 @@ class Logger:
         *content,
         skip_writers_names: list[str] = [],
         stack_offset=2,
+        args: tuple = None,
     ):
-        if self._log_level >= LogLevel.INFO:
-            self.log(
-                *content,
-                series=f"warning",
-                skip_writers_names=skip_writers_names,
-                stack_offset=stack_offset + 1,
-            )
+        if self._log_level_value < _WARNING:  # disabled, nothing is made
+            return self
+        self.log(
+            *content,
+            series=f"warning",
+            skip_writers_names=skip_writers_names,
+            stack_offset=stack_offset + 1,
+            args=args,
+            level=LogLevel.WARNING,
+        )
         return self
 
     def err(
@@ -222,12 +402,13 @@ class Logger:
         stack_offset=2,
         reraise=False,
     ):
-        if self._log_level >= LogLevel.ERROR:
+        if self._log_level_value >= _ERROR:
             self.log(
                 str(err),
                 series=f"error",
                 skip_writers_names=skip_writers_names,
                 stack_offset=stack_offset + 1,
+                level=LogLevel.ERROR,
             )
         if reraise:
             if not isinstance(err, Exception):
@@ -270,7 +451,14 @@ class Logger:
 
         return with_logging
 
-    def set_log_dir(self, path, dedicated_file=False):
+    def set_log_dir(self, path, dedicated_file=False, **file_writer_options):
+        """write logs of this logger into a file in path. the file is named by date, and rotated by size and time, see FileLogWriter.
+
+        Args:
+            path (str): the directory
+            dedicated_file (bool, optional): whether to put logger name into file name. Defaults to False.
+            file_writer_options: options of FileLogWriter, such as max_bytes, rotate_interval and compress.
+        """
         if os.path.isfile(path):
             raise FileExistsError("Target path is not a directory.")
         if not os.path.exists(path):
@@ -281,9 +469,12 @@ class Logger:
         filename = ""
         filename += self.name_alias or "" if dedicated_file else ""
         filename += str(date.today()) + ".log"
-        file_writer = FileLogWriter(os.path.join(path, filename))
+        file_writer = FileLogWriter(os.path.join(path, filename), **file_writer_options)
         self.private_writers["file"] = file_writer.write
         return self
 
 
 DEFAULT_LOGGER = Logger(None)
+atexit.register(Logger.flush, timeout=5)  # write summaries of suppressed repeated logs
+if hasattr(os, "register_at_fork"):  # not on windows
+    os.register_at_fork(after_in_child=Logger._after_fork_in_child)
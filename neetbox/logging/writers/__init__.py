@@ -1,2 +1,3 @@
 from ._file import *
+from ._json import *
 from ._stdout import *
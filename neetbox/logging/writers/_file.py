@@ -4,33 +4,153 @@
 # Github: github.com/visualDust
 # Date:   20240111
 
+import atexit
+import bisect
+import glob
+import gzip
+import multiprocessing.util
 import os
+import shutil
+import struct
+import time
+from datetime import datetime
+from threading import Event, Lock, Thread
+from typing import Union
 
 from .._formatting import RawLog
 
 
+def _compress_segment(path: str):
+    """gzip a rotated log segment into path.gz and remove the original"""
+    try:
+        with open(path, "rb") as src, gzip.open(f"{path}.gz.tmp", "wb") as dst:
+            shutil.copyfileobj(src, dst, 1 << 20)
+        os.replace(f"{path}.gz.tmp", f"{path}.gz")
+        os.remove(path)
+    except Exception as e:
+        print(f"failed to compress log file {path}: {e}")
+
+
 class FileLogWriter:
+    """Write logs into a file. Lines are buffered and written in chunks, when the buffer is full or every flush_interval seconds. The file is rotated when it grows larger than max_bytes or is older than rotate_interval seconds, rotated segments are gzipped in background.
+
+    Next to each log file there is a sidecar index file(path + '.idx') of (timestamp, byte offset) records, one for the beginning of each chunk written at least index_every bytes after the last indexed one. Use FileLogWriter.open_since to jump to logs of a given time without reading the whole file.
+    """
+
     # class level static
     PATH2WRITER = {}
+    INDEX_RECORD = struct.Struct("<dQ")  # timestamp in seconds, byte offset
 
     # instance level
     file_writer = None
 
-    def __new__(cls, path):
+    def __new__(
+        cls,
+        path,
+        max_bytes: int = 100 * 1024 * 1024,
+        rotate_interval: float = 24 * 60 * 60,
+        compress: bool = True,
+        flush_interval: float = 1.0,
+        buffer_size: int = 64 * 1024,
+        index_every: int = 64 * 1024,
+    ):
+        """
+        Args:
+            path (str): path of the log file. logs are appended if it exists.
+            max_bytes (int, optional): rotate when file is larger than this, 0 for no limit. Defaults to 100MiB.
+            rotate_interval (float, optional): rotate when file is older than this in seconds, 0 for no limit. Defaults to 1 day.
+            compress (bool, optional): whether to gzip rotated segments. Defaults to True.
+            flush_interval (float, optional): max seconds a log stays in buffer. Defaults to 1.0.
+            buffer_size (int, optional): flush when buffered bytes exceed this. Defaults to 64KiB.
+            index_every (int, optional): min bytes between indexed offsets. Defaults to 64KiB.
+        """
         path = os.path.abspath(path)
         if os.path.isdir(path):
             raise Exception("Target path is not a file.")
         dirname = os.path.dirname(path) if len(os.path.dirname(path)) != 0 else "."
         if not os.path.exists(dirname):
             os.makedirs(dirname)
+        options = {
+            "max_bytes": max_bytes,
+            "rotate_interval": rotate_interval,
+            "compress": compress,
+            "flush_interval": flush_interval,
+            "buffer_size": buffer_size,
+            "index_every": index_every,
+        }
         if path in FileLogWriter.PATH2WRITER:
-            return FileLogWriter.PATH2WRITER[path]
+            writer = FileLogWriter.PATH2WRITER[path]
+            if type(writer) is not cls or writer._options != options:
+                raise ValueError(
+                    f"{path} is already written by a {type(writer).__name__} with options {writer._options}, got a {cls.__name__} with options {options}"
+                )
+            return writer
         new_instance = super().__new__(cls)
-        new_instance.file_writer = open(path, "a", encoding="utf-8", buffering=1)
+        new_instance.path = path
+        new_instance._options = options
+        new_instance.index_path = f"{path}.idx"
+        new_instance.max_bytes = max_bytes
+        new_instance.rotate_interval = rotate_interval
+        new_instance.compress = compress
+        new_instance.buffer_size = buffer_size
+        new_instance.index_every = index_every
+        new_instance._lock = Lock()
+        new_instance._buffer = []  # encoded lines
+        new_instance._buffered_bytes = 0
+        new_instance._buffer_timestamp = None  # timestamp of the first buffered log
+        new_instance._open()
+        new_instance._closed = Event()
+        new_instance._start_flush_thread()
+        # forked multiprocessing children exit without running atexit
+        multiprocessing.util.register_after_fork(new_instance, FileLogWriter._flush_at_child_exit)
         FileLogWriter.PATH2WRITER[path] = new_instance
         return new_instance
 
-    def write(self, log: RawLog):
+    def _start_flush_thread(self):
+        Thread(
+            target=self._flush_loop, args=(self._options["flush_interval"],), daemon=True
+        ).start()
+
+    @staticmethod
+    def _flush_at_child_exit(writer: "FileLogWriter"):
+        multiprocessing.util.Finalize(writer, writer.flush, exitpriority=10)
+
+    @classmethod
+    def _before_fork(cls):
+        """write out buffers and hold the locks, so that the child neither writes lines of the parent again nor inherits a lock held by another thread"""
+        for writer in list(cls.PATH2WRITER.values()):
+            writer._lock.acquire()
+            try:
+                writer._flush_locked()
+            except Exception as e:
+                print(f"failed to flush log file {writer.path} before fork: {e}")
+
+    @classmethod
+    def _after_fork_in_parent(cls):
+        for writer in list(cls.PATH2WRITER.values()):
+            writer._lock.release()
+
+    @classmethod
+    def _after_fork_in_child(cls):
+        """the flush thread is gone in the child, start over with a new lock and an empty buffer"""
+        for writer in list(cls.PATH2WRITER.values()):
+            writer._lock = Lock()
+            writer._buffer = []
+            writer._buffered_bytes = 0
+            if not writer._closed.is_set():
+                writer._start_flush_thread()
+
+    def _open(self):
+        self.file_writer = open(self.path, "ab")
+        self._offset = self.file_writer.tell()
+        self._last_indexed_offset = None
+        self._index_writer = open(self.index_path, "ab")
+        self._opened_at = time.time()
+        if self._index_writer.tell() >= self.INDEX_RECORD.size:  # appending, age from first log
+            with open(self.index_path, "rb") as f:
+                self._opened_at = self.INDEX_RECORD.unpack(f.read(self.INDEX_RECORD.size))[0]
+
+    def _format(self, log: RawLog) -> bytes:
         line = " ".join(
             [
                 log.timestamp.strftime(r"%Y-%m-%dT%H:%M:%S.%f"),
@@ -39,4 +159,131 @@ class FileLogWriter:
                 str(log.message),
             ]
         )
-        self.file_writer.write(line + "\n")
+        return (line + "\n").encode("utf-8")
+
+    def _track_locked(self, log: RawLog):
+        """called for each log before it is buffered, collects what the index needs"""
+        if not self._buffer:
+            self._buffer_timestamp = log.timestamp.timestamp()
+
+    def _index_locked(self):
+        """called before the buffered chunk is written at self._offset"""
+        if (
+            self._last_indexed_offset is None
+            or self._offset - self._last_indexed_offset >= self.index_every
+        ):
+            self._index_writer.write(self.INDEX_RECORD.pack(self._buffer_timestamp, self._offset))
+            self._index_writer.flush()
+            self._last_indexed_offset = self._offset
+
+    def write(self, log: RawLog):
+        line = self._format(log)
+        with self._lock:
+            self._track_locked(log)
+            self._buffer.append(line)
+            self._buffered_bytes += len(line)
+            if self._buffered_bytes >= self.buffer_size:
+                self._flush_locked()
+
+    def _flush_locked(self):
+        if not self._buffer or self.file_writer is None:
+            return
+        if self._offset and (
+            (self.max_bytes and self._offset >= self.max_bytes)
+            or (self.rotate_interval and time.time() - self._opened_at >= self.rotate_interval)
+        ):
+            self._rotate_locked()
+        self._index_locked()
+        chunk = b"".join(self._buffer)
+        self.file_writer.write(chunk)
+        self.file_writer.flush()
+        self._offset += len(chunk)
+        self._buffer.clear()
+        self._buffered_bytes = 0
+
+    def _rotate_locked(self):
+        self.file_writer.close()
+        self._index_writer.close()
+        stem, ext = os.path.splitext(self.path)
+        suffix = datetime.now().strftime("%Y%m%d-%H%M%S-%f")  # sorted by time
+        rotated, i = f"{stem}.{suffix}{ext}", 0
+        while os.path.exists(rotated) or os.path.exists(f"{rotated}.gz"):
+            i += 1
+            rotated = f"{stem}.{suffix}-{i}{ext}"
+        os.replace(self.path, rotated)
+        os.replace(self.index_path, f"{rotated}.idx")
+        if self.compress:  # not a daemon, so that compressing finishes before exit
+            Thread(target=_compress_segment, args=(rotated,)).start()
+        self._open()
+
+    def _flush_loop(self, flush_interval):
+        while not self._closed.wait(flush_interval):
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def close(self):
+        self._closed.set()
+        with self._lock:
+            self._flush_locked()
+            self.file_writer.close()
+            self._index_writer.close()
+            self.file_writer = None
+        FileLogWriter.PATH2WRITER.pop(self.path, None)
+
+    @classmethod
+    def segments_of(cls, path: str):
+        """paths of rotated segments of a log file in time order, followed by the log file itself if it exists"""
+        path = os.path.abspath(path)
+        stem, ext = os.path.splitext(path)
+        segments = {}
+        for segment in glob.glob(f"{glob.escape(stem)}.*{ext}") + glob.glob(
+            f"{glob.escape(stem)}.*{ext}.gz"
+        ):
+            segments.setdefault(segment[:-3] if segment.endswith(".gz") else segment, segment)
+        segments.pop(path, None)  # a segment being compressed is read from the original
+        paths = [segments[name] for name in sorted(segments)]
+        return paths + [path] if os.path.exists(path) else paths
+
+    @classmethod
+    def open_since(cls, path: str, since: Union[datetime, float]):
+        """open a log file or a gzipped segment for reading in binary mode, positioned at an indexed chunk at or before the first log since the given time. lines before the wanted time may be read at the beginning.
+
+        Args:
+            path (str): path of log file or gzipped segment
+            since (Union[datetime, float]): the time, datetime or timestamp in seconds
+
+        Returns:
+            BinaryIO: the opened file
+        """
+        if isinstance(since, datetime):
+            since = since.timestamp()
+        index_path = f"{path[:-3] if path.endswith('.gz') else path}.idx"
+        offset = 0
+        if os.path.exists(index_path):
+            with open(index_path, "rb") as f:
+                data = f.read()
+            data = data[: len(data) - len(data) % cls.INDEX_RECORD.size]  # drop partial record
+            records = list(cls.INDEX_RECORD.iter_unpack(data))
+            # chunk before the first chunk starting after since may have logs since the time
+            i = bisect.bisect_right([timestamp for timestamp, _ in records], since) - 1
+            offset = records[i][1] if i >= 0 else 0
+        file = gzip.open(path, "rb") if path.endswith(".gz") else open(path, "rb")
+        file.seek(offset)
+        return file
+
+
+def _flush_file_writers_on_exit():
+    for writer in list(FileLogWriter.PATH2WRITER.values()):
+        writer.flush()
+
+
+atexit.register(_flush_file_writers_on_exit)
+if hasattr(os, "register_at_fork"):  # not on windows
+    os.register_at_fork(
+        before=FileLogWriter._before_fork,
+        after_in_parent=FileLogWriter._after_fork_in_parent,
+        after_in_child=FileLogWriter._after_fork_in_child,
+    )
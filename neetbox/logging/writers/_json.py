@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+#
+# Author: GavinGong aka VisualDust
+# Github: github.com/visualDust
+# Date:   20240120
+
+import gzip
+import json
+import os
+import struct
+import zlib
+from datetime import datetime
+from typing import Iterator, List, Optional, Union
+
+from neetbox._protocol import *
+
+from .._formatting import RawLog
+from ._file import FileLogWriter
+from ._stdout import LogWriters
+
+_SERIES2BIT = {}
+
+
+def _series_bit(series: Optional[str]) -> int:
+    """bit of series in the 64 bits series mask of an index record. different series may share a bit, which only makes a few more chunks read"""
+    bit = _SERIES2BIT.get(series)
+    if bit is None:
+        bit = _SERIES2BIT[series] = 1 << (zlib.crc32((series or "").encode("utf-8")) & 63)
+    return bit
+
+
+class JsonLogWriter(FileLogWriter):
+    """Write logs into a json lines file, one json object of series, caller identity, timestamp and message per line. Buffering and rotating works the same as FileLogWriter.
+
+    Every written chunk has a record in the sidecar index file(path + '.idx'): min and max timestamp of logs in the chunk, byte offset of the chunk and a 64 bits mask of series in the chunk. JsonLogWriter.read uses it to skip chunks out of the time range or without the wanted series, so that queries like 'errors between T1 and T2' do not scan the whole file.
+    """
+
+    INDEX_RECORD = struct.Struct("<ddQQ")  # min timestamp, max timestamp, byte offset, series mask
+
+    def _format(self, log: RawLog) -> bytes:
+        identity = log.caller_identity
+        line = {
+            TIMESTAMP_KEY: log.timestamp.strftime(DATETIME_FORMAT),
+            SERIES_KEY: log.series,
+            CALLER_ID_KEY: log.caller_identity_alias or identity.format(r"%m > %c > %f"),
+            "caller": {
+                "module": identity.module_name,
+                "class": identity.class_name,
+                "func": identity.func_name,
+                "file": identity.filepath,
+                "line": identity.lineno,
+            },
+            MESSAGE_KEY: log.message,
+        }
+        return (json.dumps(line, ensure_ascii=False, default=str) + "\n").encode("utf-8")
+
+    def _track_locked(self, log: RawLog):
+        timestamp = log.timestamp.timestamp()
+        if not self._buffer:
+            self._chunk_min_timestamp = self._chunk_max_timestamp = timestamp
+            self._chunk_series_mask = 0
+        elif timestamp < self._chunk_min_timestamp:  # logs from threads may come out of order
+            self._chunk_min_timestamp = timestamp
+        elif timestamp > self._chunk_max_timestamp:
+            self._chunk_max_timestamp = timestamp
+        self._chunk_series_mask |= _series_bit(log.series)
+
+    def _index_locked(self):
+        self._index_writer.write(
+            self.INDEX_RECORD.pack(
+                self._chunk_min_timestamp,
+                self._chunk_max_timestamp,
+                self._offset,
+                self._chunk_series_mask,
+            )
+        )
+        self._index_writer.flush()
+
+    @classmethod
+    def _chunks_of(cls, path: str):
+        """(min timestamp, max timestamp, offset, series mask, end offset) of indexed chunks of a file"""
+        index_path = f"{path[:-3] if path.endswith('.gz') else path}.idx"
+        if not os.path.exists(index_path):  # no index, read the whole file as a chunk
+            return [(float("-inf"), float("inf"), 0, ~0, None)]
+        with open(index_path, "rb") as f:
+            data = f.read()
+        data = data[: len(data) - len(data) % cls.INDEX_RECORD.size]  # drop partial record
+        records = list(cls.INDEX_RECORD.iter_unpack(data))
+        ends = [offset for _, _, offset, _ in records[1:]] + [None]  # the last chunk ends at eof
+        return [record + (end,) for record, end in zip(records, ends)]
+
+    @classmethod
+    def open_since(cls, path: str, since: Union[datetime, float]):
+        if isinstance(since, datetime):
+            since = since.timestamp()
+        offsets = [
+            offset
+            for _, max_timestamp, offset, _, _ in cls._chunks_of(path)
+            if max_timestamp >= since
+        ]
+        file = gzip.open(path, "rb") if path.endswith(".gz") else open(path, "rb")
+        file.seek(offsets[0] if offsets else 0)
+        return file
+
+    @classmethod
+    def read(
+        cls,
+        path: str,
+        since: Union[datetime, float, None] = None,
+        until: Union[datetime, float, None] = None,
+        series: Union[str, List[str], None] = None,
+    ) -> Iterator[dict]:
+        """read logs of a json lines log file or a gzipped segment. chunks are picked by the index, see FileLogWriter.segments_of for the rotated segments of a log file.
+
+        Args:
+            path (str): path of log file or gzipped segment
+            since (Union[datetime, float, None], optional): read logs at or after the time, datetime or timestamp in seconds. Defaults to None.
+            until (Union[datetime, float, None], optional): read logs at or before the time, datetime or timestamp in seconds. Defaults to None.
+            series (Union[str, List[str], None], optional): read logs of the series only. Defaults to None(all series).
+
+        Yields:
+            dict: log json, with keys timestamp, series, whom, caller and message
+        """
+        since = datetime.fromtimestamp(since) if isinstance(since, (int, float)) else since
+        until = datetime.fromtimestamp(until) if isinstance(until, (int, float)) else until
+        series = [series] if isinstance(series, str) else series
+        series_mask = ~0
+        if series is not None:
+            series_mask = 0
+            for name in series:
+                series_mask |= _series_bit(name)
+        since_timestamp = since.timestamp() if since else float("-inf")
+        until_timestamp = until.timestamp() if until else float("inf")
+        # timestamps in lines are formatted in fixed width, so they can be compared as strings
+        since_text = since.strftime(DATETIME_FORMAT) if since else None
+        until_text = until.strftime(DATETIME_FORMAT) if until else None
+        with gzip.open(path, "rb") if path.endswith(".gz") else open(path, "rb") as f:
+            for min_timestamp, max_timestamp, offset, mask, end in cls._chunks_of(path):
+                if (
+                    max_timestamp < since_timestamp
+                    or min_timestamp > until_timestamp
+                    or not mask & series_mask
+                ):
+                    continue
+                f.seek(offset)
+                chunk = f.read(end - offset) if end is not None else f.read()
+                for line in chunk.splitlines():
+                    try:
+                        log = json.loads(line)
+                    except ValueError:  # partly written line
+                        continue
+                    timestamp = log.get(TIMESTAMP_KEY, "")
+                    if (since_text and timestamp < since_text) or (
+                        until_text and timestamp > until_text
+                    ):
+                        continue
+                    if series is not None and log.get(SERIES_KEY) not in series:
+                        continue
+                    yield log
+
+
+def set_json_log_file(path: str, **file_writer_options) -> JsonLogWriter:
+    """write logs of all loggers into a json lines file, as the global log writer 'json'
+
+    Args:
+        path (str): path of the json lines file
+        file_writer_options: options of FileLogWriter, such as max_bytes, rotate_interval and compress.
+
+    Returns:
+        JsonLogWriter: the writer
+    """
+    writer = JsonLogWriter(path, **file_writer_options)
+    LogWriters.register(name="json", overwrite=True)(writer.write)
+    return writer
@@ -4,53 +4,174 @@
 # Github: github.com/visualDust
 # Date:   20240111
 
+import os
+import shutil
+import sys
 from random import random
-
-from rich.console import Console
-from rich.table import Table
-from rich.text import Text
+from threading import Lock, current_thread
 
 from neetbox.utils import Registry
-from neetbox.utils.mvc import Singleton
 
+from .._dispatch import LogDispatcher
 from .._formatting import RawLog
 
 LogWriters = Registry("LOG_WRITERS")
 
 
-console = Console()
 whom2color = {}
 
 supported_colors = ["red", "green", "blue", "cyan", "yellow", "magenta"]
 supported_text_styles = ["bold", "italic", "blink", "dim"]
 
+_ANSI_COLORS = {
+    "red": "31",
+    "green": "32",
+    "yellow": "33",
+    "blue": "34",
+    "magenta": "35",
+    "cyan": "36",
+    "white": "37",
+}
+_SERIES2COLOR = {
+    "ok": "green",
+    "debug": "cyan",
+    "info": "white",
+    "warning": "yellow",
+    "mention": "yellow",
+    "error": "red",
+}
+_RESET = "\x1b[0m"
+
+
+class StdoutLogWriter:
+    """Write logs to stdout. Modes:
+    - auto: 'ansi' if stdout is a terminal, otherwise 'plain'
+    - ansi: colored, the series and time are aligned to the right of terminal
+    - plain: no color, for stdout redirected to files or pipes
+    - rich: rendered by rich, prettier but much slower. falls back to auto if rich is not installed
+
+    Logs are written at once, except in the log dispatcher thread(see Logger.set_async), where logs of a batch are written together on flush.
+    """
+
+    MODES = ("auto", "ansi", "plain", "rich")
+
+    def __init__(self, mode: str = "auto") -> None:
+        self.mode = mode
+        self._pending = []
+        self._lock = Lock()
+        self._whom2prefix = {}  # whom : rendered ansi prefix
+        self._series2suffix = {}  # series : rendered ansi series tag
+        self._console = None  # rich console
+
+    @property
+    def mode(self):
+        return self._mode
+
+    @mode.setter
+    def mode(self, mode: str):
+        if mode not in self.MODES:
+            raise ValueError(f"stdout log mode should be one of {self.MODES} but got '{mode}'")
+        self._mode = mode
+
+    def __call__(self, log: RawLog):
+        with self._lock:
+            self._pending.append(log)
+        if current_thread().name != LogDispatcher.THREAD_NAME:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            logs, self._pending = self._pending, []
+        if not logs:
+            return
+        mode = self._mode
+        if mode == "rich":
+            try:
+                import rich.console
+            except ImportError:  # rich is optional
+                mode = "auto"
+        if mode == "auto":
+            isatty = getattr(sys.stdout, "isatty", None)
+            mode = "ansi" if isatty and isatty() and "NO_COLOR" not in os.environ else "plain"
+        if mode == "rich":
+            for log in logs:
+                self._print_rich(log)
+            return
+        if mode == "ansi":
+            width = shutil.get_terminal_size().columns
+            text = "".join([self._render_ansi(log, width) for log in logs])
+        else:
+            text = "".join([self._render_plain(log) for log in logs])
+        sys.stdout.write(text)
+        sys.stdout.flush()
+
+    def _whom_color(self, whom: str):
+        if whom not in whom2color:
+            whom2color[whom] = supported_colors[int(random() * len(supported_colors))]
+        return whom2color[whom]
+
+    def _render_plain(self, log: RawLog):
+        whom = log.caller_identity_alias or log.caller_identity_formatted
+        series = f" [{log.series}]" if log.series else ""
+        return f"{whom} > {log.message}{series} {log.timestamp.strftime(r'%H:%M:%S')}\n"
+
+    def _render_ansi(self, log: RawLog, width: int):
+        whom = log.caller_identity_alias or log.caller_identity_formatted
+        prefix = self._whom2prefix.get(whom)
+        if prefix is None:
+            color = _ANSI_COLORS[self._whom_color(whom)]
+            prefix = self._whom2prefix[
+                whom
+            ] = f"\x1b[{color}m{whom}{_RESET}\x1b[2;{color}m > {_RESET}"
+        suffix = self._series2suffix.get(log.series)
+        if suffix is None:
+            color = _ANSI_COLORS.get(_SERIES2COLOR.get(log.series))
+            tag = f"[{log.series}]" if log.series in _SERIES2COLOR else log.series or ""
+            suffix = self._series2suffix[log.series] = (
+                (f"\x1b[{color}m{tag}{_RESET} " if color else f"{tag} ") if tag else ""
+            )
+        series_len = len(f"[{log.series}]" if log.series in _SERIES2COLOR else log.series or "")
+        time_text = log.timestamp.strftime(r"%H:%M:%S")
+        # pad to put series and time at the right end of terminal if they fit in one line
+        left_len = len(whom) + 3 + len(log.message)
+        right_len = (series_len + 1 if series_len else 0) + len(time_text)
+        padding = width - left_len - right_len
+        padding = padding if padding > 0 and "\n" not in log.message else 1
+        return f"{prefix}{log.message}{' ' * padding}{suffix}\x1b[2m{time_text}{_RESET}\n"
+
+    def _print_rich(self, log: RawLog):
+        from rich.console import Console
+        from rich.table import Table
+        from rich.text import Text
+
+        if self._console is None:
+            self._console = Console()
+        series = (
+            {
+                "ok": Text("[ok]", style="green"),
+                "debug": Text("[debug]", style="cyan"),
+                "info": Text("[info]", style="white"),
+                "warning": Text("[warning]", style="yellow"),
+                "mention": Text("[mention]", style="yellow"),
+                "error": Text("[error]", style="red"),
+            }.get(log.series, Text(log.series))
+            if log.series
+            else Text("")
+        )
+        table = Table(show_header=False, box=None, expand=True)
+        table.add_column(justify="left")
+        table.add_column(justify="right")
+        whom = log.caller_identity_alias or log.caller_identity_formatted
+        color = self._whom_color(whom)
+        whom_text = Text(whom, color)
+        split_text = Text(" > ", style="dim " + color)
+        message_text = Text(log.message, style="default")
+        time_text = Text(log.timestamp.strftime(r"%H:%M:%S"), style="default dim")
+        table.add_row(
+            whom_text + split_text + message_text, series + " " + time_text if series else time_text
+        )
+        self._console.print(table)
+
 
-@LogWriters.register(name="stdout")
-def log_write_stdout(log: RawLog):
-    series = (
-        {
-            "ok": Text("[ok]", style="green"),
-            "debug": Text("[debug]", style="cyan"),
-            "info": Text("[info]", style="white"),
-            "warning": Text("[warning]", style="yellow"),
-            "mention": Text("[mention]", style="yellow"),
-            "error": Text("[error]", style="red"),
-        }.get(log.series, Text(log.series))
-        if log.series
-        else Text("")
-    )
-    table = Table(show_header=False, box=None, expand=True)
-    table.add_column(justify="left")
-    table.add_column(justify="right")
-    whom = log.caller_identity_alias or log.caller_identity_formatted
-    if whom not in whom2color:
-        whom2color[whom] = supported_colors[int(random() * len(supported_colors))]
-    color = whom2color[whom]
-    whom_text = Text(whom, color)
-    split_text = Text(" > ", style="dim " + color)
-    message_text = Text(log.message, style="default")
-    time_text = Text(log.timestamp.strftime(r"%H:%M:%S"), style="default dim")
-    table.add_row(
-        whom_text + split_text + message_text, series + " " + time_text if series else time_text
-    )
-    console.print(table)
+stdoutLogWriter = StdoutLogWriter()
+LogWriters.register(name="stdout")(stdoutLogWriter)
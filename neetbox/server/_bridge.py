@@ -4,6 +4,8 @@
 # Github: github.com/visualDust
 # Date:   20231204
 
+import asyncio
+import json
 from typing import Dict, List
 
 from neetbox._protocol import *
@@ -38,7 +40,8 @@ class Bridge:
     status: dict
     cli_ws_dict: dict  # { run_id : ws_client}
     web_ws_list: dict  # since web do not have run id, use list instead of dict
-    historyDB: ProjectDB
+    _historyDB: ProjectDB  # opened on first use, see historyDB
+    _run_id2status: dict  # { run_id : { series : status } }, cache of status in history db
 
     def __new__(cls, project_id: str, **kwargs) -> None:
         """Create Bridge of project id, return the old one if already exist
@@ -55,7 +58,10 @@ class Bridge:
                 []
             )  # frontend ws sids. client data should be able to be shown on multiple frontend
             flag_auto_load_db = kwargs["auto_load_db"] if "auto_load_db" in kwargs else True
-            new_bridge.historyDB = ProjectDB.get_db_of_id(project_id) if flag_auto_load_db else None
+            new_bridge._historyDB = (
+                ProjectDB.get_db_of_id(project_id) if flag_auto_load_db else None
+            )
+            new_bridge._run_id2status = None  # loaded on first read
             cls._id2bridge[project_id] = new_bridge
             logger.info(f"created new Bridge for project id '{project_id}'")
         return cls._id2bridge[project_id]
@@ -67,6 +73,24 @@ class Bridge:
             del self.historyDB  # delete history db
         logger.info(f"bridge of project id {self.project_id} deleted.")
 
+    @property
+    def historyDB(self) -> ProjectDB:
+        """history db of project, opened on first use if the bridge is loaded from project catalog"""
+        if self._historyDB is None:
+            self._historyDB = ProjectDB.get_db_of_id(self.project_id)
+        return self._historyDB
+
+    @historyDB.setter
+    def historyDB(self, db: ProjectDB):
+        self._historyDB = db
+
+    @historyDB.deleter
+    def historyDB(self):
+        self._historyDB = None
+
+    def is_history_loaded(self):
+        return self._historyDB is not None
+
     @classmethod
     def items(cls):
         return cls._id2bridge.items()
@@ -90,17 +114,19 @@ class Bridge:
     def from_db(cls, db: ProjectDB) -> "Bridge":
         project_id = db.fetch_db_project_id()
         bridge = Bridge(project_id, auto_load_db=False)
-        if bridge.historyDB is not None:
+        if bridge.is_history_loaded():
             logger.warn(f"overwriting db of '{project_id}'")
         bridge.historyDB = db
+        bridge._run_id2status = None
         return bridge
 
     @classmethod
     def load_histories(cls):
-        db_list = ProjectDB.get_db_list()
-        logger.log(f"found {len(db_list)} history db.")
-        for _, history_db in db_list:
-            cls.from_db(history_db)
+        """create bridges of projects in project catalog. history dbs are opened on first use."""
+        records = ProjectDB.get_catalog()
+        logger.log(f"found {len(records)} history db.")
+        for project_id in records:
+            Bridge(project_id, auto_load_db=False)
 
     async def ws_send_to_frontends(self, message: EventMsg):
         for ws_client in self.web_ws_list:
@@ -119,11 +145,29 @@ class Bridge:
             logger.err(e)
         return
 
-    def set_status(self, run_id: str, series: str, value: dict):
-        self.historyDB.set_status(run_id=run_id, series=series, json_data=value)
+    def _status_cache(self):
+        if self._run_id2status is None:  # read all status from history db once
+            self._run_id2status = self.historyDB.get_status()
+        return self._run_id2status
+
+    def batch_writes(self):
+        """a context in which writes to history db are committed in one transaction, see ProjectDB.batch_submits. do not await in it, writes are queued when it exits."""
+        return self.historyDB.batch_submits()
+
+    def set_status(self, run_id: str, series: str, value: dict) -> asyncio.Future:
+        """set status in status cache at once and in history db by its writer thread, returns an awaitable of the row id"""
+        json_data = json.dumps(value)
+        # cache what is written, later changes to value go to neither
+        self._status_cache().setdefault(run_id, {})[series] = json.loads(json_data)
+        return asyncio.wrap_future(
+            self.historyDB.submit(
+                self.historyDB.set_status, run_id=run_id, series=series, json_data=json_data
+            )
+        )
 
     def get_status(self, run_id: str = None, series: str = None):
-        status = self.historyDB.get_status(run_id=run_id, series=series)
+        """get status from status cache. returned dicts are in the cache, copy them before making changes."""
+        status = self._status_cache()
         if run_id:
             status = status.get(run_id, {})
         if series:
@@ -138,6 +182,11 @@ class Bridge:
     def get_series_of(self, table_name, run_id=None):
         return self.historyDB.get_series_of_table(table_name=table_name, run_id=run_id)
 
+    def delete_run_id(self, run_id: str) -> asyncio.Future:
+        """delete run id and all its history by the writer thread of history db"""
+        self._status_cache().pop(run_id, None)
+        return asyncio.wrap_future(self.historyDB.submit(self.historyDB.delete_run_id, run_id))
+
     def get_run_ids(self):
         info_run_ids = self.historyDB.get_run_ids()
         for info_run_id in info_run_ids:
@@ -146,20 +195,47 @@ class Bridge:
 
     def save_json_to_history(
         self, table_name, json_data, series=None, run_id=None, timestamp=None, num_row_limit=-1
-    ):
-        lastrowid = Bridge.of_id(self.project_id).historyDB.write_json(
-            table_name=table_name,
-            json_data=json_data,
-            series=series,
-            run_id=run_id,
-            timestamp=timestamp,
-            num_row_limit=num_row_limit,
+    ) -> asyncio.Future:
+        """write json to history db by its writer thread(see ProjectDB.submit), returns an awaitable of the row id. writes are committed in the order they are submitted."""
+        historyDB = Bridge.of_id(self.project_id).historyDB
+        return asyncio.wrap_future(
+            historyDB.submit(
+                historyDB.write_json,
+                table_name=table_name,
+                json_data=json_data,
+                series=series,
+                run_id=run_id,
+                timestamp=timestamp,
+                num_row_limit=num_row_limit,
+            )
+        )
+
+    def save_json_many_to_history(
+        self, table_name, json_datas, timestamps, series=None, run_id=None, num_row_limit=-1
+    ) -> asyncio.Future:
+        """write jsons to history db by its writer thread, returns an awaitable of the row ids"""
+        historyDB = Bridge.of_id(self.project_id).historyDB
+        return asyncio.wrap_future(
+            historyDB.submit(
+                historyDB.write_json_many,
+                table_name=table_name,
+                json_datas=json_datas,
+                timestamps=timestamps,
+                series=series,
+                run_id=run_id,
+                num_row_limit=num_row_limit,
+            )
         )
-        return lastrowid
 
     def read_json_from_history(self, table_name, condition):
         return self.historyDB.read_json(table_name=table_name, condition=condition)
 
+    def read_json_stream_from_history(self, table_name, condition):
+        return self.historyDB.read_json_stream(table_name=table_name, condition=condition)
+
+    def search_log_in_history(self, text, **kwargs):
+        return self.historyDB.search_log(text, **kwargs)
+
     def save_blob_to_history(
         self,
         table_name,
@@ -169,17 +245,21 @@ class Bridge:
         run_id=None,
         timestamp=None,
         num_row_limit=-1,
-    ):
-        lastrowid = Bridge.of_id(self.project_id).historyDB.write_blob(
-            table_name=table_name,
-            meta_data=meta_data,
-            blob_data=blob_data,
-            series=series,
-            run_id=run_id,
-            timestamp=timestamp,
-            num_row_limit=num_row_limit,
+    ) -> asyncio.Future:
+        """write blob to history db by its writer thread, returns an awaitable of the row id"""
+        historyDB = Bridge.of_id(self.project_id).historyDB
+        return asyncio.wrap_future(
+            historyDB.submit(
+                historyDB.write_blob,
+                table_name=table_name,
+                meta_data=meta_data,
+                blob_data=blob_data,
+                series=series,
+                run_id=run_id,
+                timestamp=timestamp,
+                num_row_limit=num_row_limit,
+            )
         )
-        return lastrowid
 
     def read_blob_from_history(self, table_name, condition, meta_only: bool):
         return self.historyDB.read_blob(table_name, condition=condition, meta_only=meta_only)
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+#
+# Author: GavinGong aka VisualDust
+# Github: github.com/visualDust
+# Date:   20240120
+
+import json
+import sqlite3
+from threading import Lock
+from typing import Dict
+
+from neetbox._protocol import *
+
+CATALOG_TABLE_NAME = "project"
+PATH_COLUMN_NAME = "path"
+SIZE_COLUMN_NAME = "size"
+LAST_RUN_TIMESTAMP_COLUMN_NAME = "lastRunTimestamp"
+NUM_RUNS_COLUMN_NAME = "numRuns"
+RUN_IDS_COLUMN_NAME = "runIds"
+_COLUMN_NAMES = (
+    PROJECT_ID_KEY,
+    NAME_KEY,
+    PATH_COLUMN_NAME,
+    SIZE_COLUMN_NAME,
+    LAST_RUN_TIMESTAMP_COLUMN_NAME,
+    NUM_RUNS_COLUMN_NAME,
+    RUN_IDS_COLUMN_NAME,
+)
+
+
+class ProjectCatalog:
+    """A small db recording project id, name, file path, size, timestamp of the last run and number of runs of each project history db, so that projects can be listed without opening their dbs. Project dbs keep their records up to date when they write run ids or names, see ProjectDB._update_catalog.
+
+    Args:
+        path (str): path of the catalog db file
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("pragma journal_mode=wal")
+        self._connection.execute("PRAGMA synchronous = NORMAL")
+        self._connection.execute(
+            f"CREATE TABLE IF NOT EXISTS {CATALOG_TABLE_NAME} ( {PROJECT_ID_KEY} TEXT PRIMARY KEY, {NAME_KEY} TEXT, {PATH_COLUMN_NAME} TEXT NOT NULL, {SIZE_COLUMN_NAME} INTEGER, {LAST_RUN_TIMESTAMP_COLUMN_NAME} TEXT, {NUM_RUNS_COLUMN_NAME} INTEGER NOT NULL DEFAULT 0, {RUN_IDS_COLUMN_NAME} TEXT );"
+        )
+        columns = [
+            row[1] for row in self._connection.execute(f"PRAGMA table_info({CATALOG_TABLE_NAME})")
+        ]
+        if RUN_IDS_COLUMN_NAME not in columns:  # catalog made by an older version
+            self._connection.execute(
+                f"ALTER TABLE {CATALOG_TABLE_NAME} ADD COLUMN {RUN_IDS_COLUMN_NAME} TEXT"
+            )
+
+    def record(
+        self,
+        project_id: str,
+        path: str,
+        size: int = None,
+        last_run_timestamp: str = None,
+        num_runs: int = 0,
+        name: str = None,
+        run_ids: list = None,
+    ):
+        """add or update the record of a project. the recorded name is kept if name is None. run_ids are infos of run ids, see ProjectDB.get_run_ids."""
+        sql_query = f"INSERT INTO {CATALOG_TABLE_NAME}({', '.join(_COLUMN_NAMES)}) VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT({PROJECT_ID_KEY}) DO UPDATE SET {NAME_KEY} = COALESCE(excluded.{NAME_KEY}, {NAME_KEY}), {PATH_COLUMN_NAME} = excluded.{PATH_COLUMN_NAME}, {SIZE_COLUMN_NAME} = excluded.{SIZE_COLUMN_NAME}, {LAST_RUN_TIMESTAMP_COLUMN_NAME} = excluded.{LAST_RUN_TIMESTAMP_COLUMN_NAME}, {NUM_RUNS_COLUMN_NAME} = excluded.{NUM_RUNS_COLUMN_NAME}, {RUN_IDS_COLUMN_NAME} = excluded.{RUN_IDS_COLUMN_NAME}"
+        with self._lock:
+            self._connection.execute(
+                sql_query,
+                (
+                    project_id,
+                    name,
+                    path,
+                    size,
+                    last_run_timestamp,
+                    num_runs,
+                    json.dumps(run_ids or []),
+                ),
+            )
+
+    def remove(self, project_id: str):
+        with self._lock:
+            self._connection.execute(
+                f"DELETE FROM {CATALOG_TABLE_NAME} WHERE {PROJECT_ID_KEY} = ?", (project_id,)
+            )
+
+    def path_of(self, project_id: str):
+        """path of the project db, None if not recorded"""
+        with self._lock:
+            result = self._connection.execute(
+                f"SELECT {PATH_COLUMN_NAME} FROM {CATALOG_TABLE_NAME} WHERE {PROJECT_ID_KEY} = ?",
+                (project_id,),
+            ).fetchone()
+        return result[0] if result else None
+
+    def items(self) -> Dict[str, dict]:
+        """records of all projects
+
+        Returns:
+            Dict[str, dict]: project id : record, with keys projectId, name, path, size, lastRunTimestamp, numRuns and runIds
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                f"SELECT {', '.join(_COLUMN_NAMES)} FROM {CATALOG_TABLE_NAME}"
+            ).fetchall()
+        records = {row[0]: dict(zip(_COLUMN_NAMES, row)) for row in rows}
+        for record in records.values():  # None if recorded by an older version
+            if record[RUN_IDS_COLUMN_NAME] is not None:
+                record[RUN_IDS_COLUMN_NAME] = json.loads(record[RUN_IDS_COLUMN_NAME])
+        return records
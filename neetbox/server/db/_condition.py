@@ -31,6 +31,7 @@ class QueryCondition:
         run_id: Union[str, int] = None,
         limit: int = None,
         order: Dict[str, DbQuerySortType] = {},
+        after_id: int = None,
     ) -> None:
         self.id_range = id if isinstance(id, tuple) else (id, None)
         self.timestamp_range = timestamp if isinstance(timestamp, tuple) else (timestamp, None)
@@ -38,6 +39,10 @@ class QueryCondition:
         self.run_id = run_id
         self.limit = limit
         self.order = {order[0], order[1]} if isinstance(order, tuple) else order
+        # keyset pagination by id, rows after the row of this id in order of id
+        if after_id is not None and self.order and set(self.order) != {ID_COLUMN_NAME}:
+            raise ValueError(f"pages go by id, can not order by {list(self.order)} with afterId")
+        self.after_id = after_id
 
     @classmethod
     def from_json(cls, json_data):
@@ -52,7 +57,8 @@ class QueryCondition:
             "order" : [
                 {"column name" : "ASC/DESC"},
                 ...
-            ]
+            ],
+            "afterId" : int, # id of the last row of previous page, order should be empty or by id only
         }
         """
         # try load id range
@@ -97,6 +103,11 @@ class QueryCondition:
         if "order" in json_data:
             order = json_data["order"]
             assert isinstance(order, dict)
+        # try load keyset pagination cursor
+        after_id = None
+        if "afterId" in json_data:
+            after_id = json_data["afterId"]
+            assert type(after_id) is int
         return QueryCondition(
             id=id_range,
             timestamp=timestamp_range,
@@ -104,6 +115,7 @@ class QueryCondition:
             run_id=run_id,
             limit=limit,
             order=order,
+            after_id=after_id,
         )
 
     def dumpt(self):
@@ -140,6 +152,15 @@ class QueryCondition:
         if self.run_id:
             _run_id_cond_str = f"{RUN_ID_COLUMN_NAME} = ?"
             query_cond_vars.append(self.run_id)
+        # === keyset pagination condition ===
+        _after_id_cond_str = ""
+        if self.after_id is not None:  # rows after it in order of id, descending if so ordered
+            _id_sort = (self.order or {}).get(ID_COLUMN_NAME)
+            _descending = (
+                _id_sort.value if isinstance(_id_sort, DbQuerySortType) else str(_id_sort)
+            ).upper() == DbQuerySortType.DESC.value
+            _after_id_cond_str = f"{ID_COLUMN_NAME} {'<' if _descending else '>'} ?"
+            query_cond_vars.append(self.after_id)
         # === ORDER BY ===
         _order_cond = f"ORDER BY " if self.order else ""
         if self.order:
@@ -148,11 +169,19 @@ class QueryCondition:
                     f"{_col_name} {_sort.value if isinstance(_sort,DbQuerySortType) else _sort}, "
                 )
             _order_cond = _order_cond[:-2]  # remove last ','
+        elif self.after_id is not None:  # pages follow the order of id
+            _order_cond = f"ORDER BY {ID_COLUMN_NAME}"
         # === LIMIT ===
         _limit_cond_str = f"LIMIT {self.limit}" if self.limit else ""
         # === concat conditions ===
         query_condition_strs = []
-        for cond in [_id_cond_str, _timestamp_cond_str, _series_cond_str, _run_id_cond_str]:
+        for cond in [
+            _id_cond_str,
+            _timestamp_cond_str,
+            _series_cond_str,
+            _run_id_cond_str,
+            _after_id_cond_str,
+        ]:
             if cond:
                 query_condition_strs.append(cond)
         query_condition_strs = " AND ".join(query_condition_strs)
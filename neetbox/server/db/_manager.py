@@ -33,7 +33,7 @@ def clear_dbc_on_exit():
         for _, dbc in conn_dict.items():
             logger.info(f"=> closing {dbc}")
             try:
-                dbc.connection.close()
+                dbc.close()
             except Exception as e:
                 logger.err(RuntimeError(f"failed to close db connection {dbc}, {e}"))
 
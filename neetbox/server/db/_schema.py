@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+#
+# Author: GavinGong aka VisualDust
+# Github: github.com/visualDust
+# Date:   20240120
+
+import sqlite3
+from typing import Dict, FrozenSet, Set
+
+
+class SchemaCatalog:
+    """Tables(with their columns) and indexes of a sqlite db as of when it was loaded. A catalog is never changed after loaded, load a new one after schema changes and replace the old one, so that threads reading it see either the old or the new.
+
+    Args:
+        tables (Dict[str, FrozenSet[str]], optional): table name : column names. Defaults to None.
+        indexes (Set[str], optional): index names. Defaults to None.
+    """
+
+    def __init__(self, tables: Dict[str, FrozenSet[str]] = None, indexes: Set[str] = None) -> None:
+        self.tables = tables or {}
+        self.indexes = indexes or set()
+
+    @classmethod
+    def load(cls, connection: sqlite3.Connection) -> "SchemaCatalog":
+        tables, indexes = {}, set()
+        for _type, name in connection.execute("SELECT type, name FROM sqlite_master").fetchall():
+            if _type == "table":
+                columns = connection.execute(f'PRAGMA table_info("{name}")').fetchall()
+                tables[name] = frozenset(column[1] for column in columns)
+            elif _type == "index":
+                indexes.add(name)
+        return cls(tables=tables, indexes=indexes)
+
+    def has_table(self, table_name: str) -> bool:
+        return table_name in self.tables
+
+    def has_index(self, index_name: str) -> bool:
+        return index_name in self.indexes
+
+    def columns_of(self, table_name: str) -> FrozenSet[str]:
+        return self.tables.get(table_name, frozenset())
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+#
+# Author: GavinGong aka VisualDust
+# Github: github.com/visualDust
+# Date:   20240120
+
+import queue
+import sqlite3
+from concurrent.futures import Future
+from threading import Lock, Thread, current_thread
+from time import monotonic
+from typing import Callable, List
+
+_SAVEPOINT = "neetbox_write"
+
+
+class GroupCommitWriter:
+    """Run writes of a sqlite db one by one in a thread of its own, on a connection of its own. Writes queued while the previous group is being committed are committed together in one transaction, so that the cost of a commit(and its sync) is shared by all of them. Each write runs in a savepoint, a failed write is rolled back without affecting others in the group.
+
+    Args:
+        connect (Callable[[], sqlite3.Connection]): makes the connection of the writer thread, should be in autocommit mode
+        max_writes (int, optional): max writes committed in one transaction. Defaults to 1000.
+        max_delay (float, optional): seconds to wait for more writes before committing a group. Defaults to 0(commit what is queued at once).
+        on_commit (Callable[[], None], optional): called in the writer thread after a group is committed. Defaults to None.
+        on_rollback (Callable[[], None], optional): called in the writer thread after a write or a group is rolled back, to drop state cached from the rolled back writes. Defaults to None.
+    """
+
+    THREAD_NAME = "neetbox-db-writer"
+
+    def __init__(
+        self,
+        connect: Callable[[], sqlite3.Connection],
+        max_writes: int = 1000,
+        max_delay: float = 0.0,
+        on_commit: Callable[[], None] = None,
+        on_rollback: Callable[[], None] = None,
+    ) -> None:
+        self._connect = connect
+        self._on_commit = on_commit
+        self._on_rollback = on_rollback
+        self.max_writes = max_writes
+        self.max_delay = max_delay
+        self.connection = None
+        self._queue = queue.SimpleQueue()
+        self._lock = Lock()
+        self._thread = None
+
+    def in_writer_thread(self) -> bool:
+        return self._thread is not None and current_thread() is self._thread
+
+    def submit(self, write: Callable) -> Future:
+        """queue a write
+
+        Args:
+            write (Callable): called with no args in the writer thread
+
+        Returns:
+            Future: result of the write, set after the transaction it is in has been committed
+        """
+        return self.submit_many([write])[0]
+
+    def submit_many(self, writes: List[Callable], futures: List[Future] = None) -> List[Future]:
+        """queue writes which are committed in the same transaction, each in a savepoint of its own
+
+        Args:
+            writes (List[Callable]): called with no args in the writer thread, one by one
+            futures (List[Future], optional): futures to set results of the writes to. Defaults to None(new futures).
+
+        Returns:
+            List[Future]: results of the writes
+        """
+        futures = futures or [Future() for _ in writes]
+        with self._lock:
+            if self._thread is None:  # start writer thread on the first write
+                self.connection = self._connect()
+                self._thread = Thread(target=self._write_loop, name=self.THREAD_NAME, daemon=True)
+                self._thread.start()
+            self._queue.put(list(zip(writes, futures)))
+        return futures
+
+    def close(self, timeout: float = None):
+        """commit queued writes, stop the writer thread and close its connection. the writer starts again on the next submit."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+            if thread is None:
+                return
+            self._queue.put(None)  # writes queued before are handled first
+        thread.join(timeout)
+        if not thread.is_alive():
+            self.connection.close()
+            self.connection = None
+
+    def _write_loop(self):
+        connection = self.connection
+        while True:
+            writes = self._queue.get()
+            stop = writes is None
+            writes = writes or []
+            deadline = monotonic() + self.max_delay
+            while not stop and len(writes) < self.max_writes:
+                timeout = deadline - monotonic()
+                try:
+                    queued = (
+                        self._queue.get(timeout=timeout)
+                        if timeout > 0
+                        else self._queue.get_nowait()
+                    )
+                except queue.Empty:
+                    break
+                stop = queued is None
+                writes += queued or []  # writes submitted together are never split
+            if writes:
+                self._commit(connection, writes)
+            if stop:
+                return
+
+    def _call_hook(self, hook):
+        if hook is not None:
+            try:
+                hook()
+            except Exception as e:
+                print(f"failed to run hook {hook} of db writer: {e}")
+
+    def _commit(self, connection: sqlite3.Connection, writes: list):
+        outcomes = []  # (result, exception) of each write, None if cancelled
+        try:
+            connection.execute("BEGIN")
+            for write, future in writes:
+                if not future.set_running_or_notify_cancel():
+                    outcomes.append(None)
+                    continue
+                connection.execute(f"SAVEPOINT {_SAVEPOINT}")
+                try:
+                    outcome = (write(), None)
+                except Exception as e:
+                    connection.execute(f"ROLLBACK TO {_SAVEPOINT}")
+                    self._call_hook(self._on_rollback)
+                    outcome = (None, e)
+                connection.execute(f"RELEASE {_SAVEPOINT}")
+                outcomes.append(outcome)
+            connection.execute("COMMIT")
+            self._call_hook(self._on_commit)
+        except Exception as e:  # failed to begin or commit, none of the writes are kept
+            if connection.in_transaction:
+                connection.execute("ROLLBACK")
+            self._call_hook(self._on_rollback)
+            outcomes = [(None, e) if outcome else None for outcome in outcomes]
+            outcomes += [(None, e)] * (len(writes) - len(outcomes))
+        for (_, future), outcome in zip(writes, outcomes):
+            if outcome is None or future.cancelled():
+                continue
+            result, exception = outcome
+            if exception is None:
+                future.set_result(result)
+            else:
+                future.set_exception(exception)
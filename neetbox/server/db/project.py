@@ -5,36 +5,53 @@
 # Date:   20231201
 
 import collections
+import functools
+import hashlib
 import json
 import os
+import pathlib
 import sqlite3
+import weakref
+from concurrent.futures import Future
+from contextlib import contextmanager
 from datetime import datetime
 from threading import Lock
-from typing import Union
+from typing import Optional, Union
 
 from neetbox._protocol import *
 from neetbox.config._global import get as get_global_config
 from neetbox.logging import Logger
-from neetbox.utils import ResourceLoader
 from neetbox.utils.localstorage import get_file_size_in_bytes
 
+from ._catalog import PATH_COLUMN_NAME, ProjectCatalog
 from ._condition import *
 from ._manager import manager
+from ._schema import SchemaCatalog
+from ._writer import GroupCommitWriter
 
 logger = Logger("PROJECT DB", skip_writers_names=["ws"])
 DB_PROJECT_FILE_FOLDER = f"{get_global_config('vault')}/server/history"
 DB_PROJECT_FILE_TYPE_NAME = "projectdb"
+DB_PROJECT_CATALOG_PATH = f"{get_global_config('vault')}/server/projects.catalogdb"
+_DDL_PREFIXES = ("CREATE", "ALTER ", "DROP T", "DROP I", "DROP V")  # first 6 chars
 
 
 class ProjectDB:
     # static things
     _path2dbc = {}
+    _log_search_supported: Optional[bool] = None  # None until checked, see log_search_supported
 
     # not static. instance level vars
     project_id: str  # of which project id
     file_path: str  # where is the db file
-    connection: sqlite3.Connection  # the db connection
-    _inited_tables: collections.defaultdict
+    _connection: sqlite3.Connection  # the db connection
+    _writer: GroupCommitWriter  # writes submitted by submit
+    _batched: Optional[list]  # (write, future) submitted in batch_submits, None if not in it
+    _inited_tables: collections.defaultdict  # tables of which create statements have been run
+    _schema: SchemaCatalog  # committed schema, read instead of querying sqlite_master
+    _run_id2id: dict  # run id : id of run id, cache of run id table
+    _num_rows: dict  # (table name, id of run id, series) : num rows, see _limit_num_row_lazily
+    _id2run_id: dict  # id of run id : run id
 
     def __new__(cls, project_id: str = None, path: str = None, **kwargs) -> "ProjectDB":
         if path is None and project_id is None:
@@ -48,10 +65,20 @@ class ProjectDB:
         new_dbc = super().__new__(cls, **kwargs)
         # connect to sqlite
         new_dbc.file_path = path
-        new_dbc.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
-        new_dbc.connection.execute("pragma journal_mode=wal")  # set journal mode WAL
-        new_dbc.connection.execute("PRAGMA foreign_keys = ON")  # enable foreign keys features
+        new_dbc._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        new_dbc._connection.execute("pragma journal_mode=wal")  # set journal mode WAL
+        new_dbc._connection.execute("PRAGMA foreign_keys = ON")  # enable foreign keys features
+        new_dbc._writer = GroupCommitWriter(
+            functools.partial(cls._connect_writer, path),
+            on_commit=new_dbc._after_commit,
+            on_rollback=new_dbc._after_rollback,
+        )
+        new_dbc._batched = None
         new_dbc._inited_tables = collections.defaultdict(lambda: False)
+        new_dbc._num_rows = {}
+        new_dbc._schema = SchemaCatalog.load(new_dbc._connection)
+        new_dbc._schema_changed = False
+        new_dbc._load_run_ids()
         # check neetbox version
         _db_file_project_id = new_dbc.fetch_db_project_id(project_id)
         project_id = project_id or _db_file_project_id
@@ -64,12 +91,92 @@ class ProjectDB:
             logger.warn(
                 f"History file version not match: reading from version {_db_file_version} with neetbox version {NEETBOX_VERSION}"
             )
+        new_dbc._migrate_blob_tables()
         cls._path2dbc[path] = new_dbc
         manager.current[project_id] = new_dbc
         new_dbc.project_id = project_id
+        if catalog.path_of(project_id) is None:  # history file not in catalog yet
+            new_dbc._update_catalog(name=new_dbc._name_from_status())
         logger.ok(f"History file(version={_db_file_version}) for project id '{project_id}' loaded.")
         return new_dbc
 
+    def _name_from_status(self):
+        """project name in config status of the latest run which has one"""
+        status = self.get_status(series="config")
+        for id_of_run_id in sorted(self._id2run_id, reverse=True):
+            config = status.get(self._id2run_id[id_of_run_id], {}).get("config", {})
+            if NAME_KEY in config:
+                return config[NAME_KEY]
+        return None
+
+    def _update_catalog(self, name: str = None):
+        """record size, timestamp of the last run and run ids of this db in the project catalog, and the project name if given"""
+        num_runs, last_run_timestamp = len(self._run_id2id), None
+        if num_runs:
+            sql_query = f"SELECT max({TIMESTAMP_COLUMN_NAME}) FROM {RUN_IDS_TABLE_NAME}"
+            (last_run_timestamp,), _ = self._query(sql_query, fetch=DbQueryFetchType.ONE)
+        size = self.local_storage_size_in_bytes
+        catalog.record(
+            self.project_id,
+            os.path.abspath(self.file_path),
+            size=size if isinstance(size, int) else None,
+            last_run_timestamp=last_run_timestamp,
+            num_runs=num_runs,
+            name=name,
+            run_ids=self.get_run_ids(),
+        )
+
+    @staticmethod
+    def _connect_writer(path):
+        connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        connection.execute("PRAGMA foreign_keys = ON")
+        # commits in wal mode are not synced, checkpoints are. a power loss may lose the last commits but never corrupts the db
+        connection.execute("PRAGMA synchronous = NORMAL")
+        return connection
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        """the db connection, or the connection of the writer thread when called from writes submitted by submit"""
+        if self._writer.in_writer_thread():
+            return self._writer.connection
+        return self._connection
+
+    def submit(self, write, *args, **kwargs) -> Future:
+        """run a write method of this db(such as write_json, write_blob and set_status) in the writer thread of this db. writes submitted around the same time are committed in one transaction, so that the caller(the event loop of server, for example) neither blocks on the write nor pays a commit for each row.
+
+        Args:
+            write (Callable): the method, called with args and kwargs
+
+        Returns:
+            Future: return value of the method, set after it has been committed
+        """
+        write = functools.partial(write, *args, **kwargs)
+        if self._batched is None:
+            return self._writer.submit(write)
+        future = Future()
+        self._batched.append((write, future))
+        return future
+
+    @contextmanager
+    def batch_submits(self):
+        """queue writes submitted in this block together when it exits, so that they are committed in one transaction however fast the writer thread is. submit from one thread only in the block. nested calls join the outer block."""
+        if self._batched is not None:
+            yield self
+            return
+        self._batched = []
+        try:
+            yield self
+        finally:
+            batched, self._batched = self._batched, None
+            if batched:
+                self._writer.submit_many(*map(list, zip(*batched)))
+
+    def close(self):
+        """commit submitted writes and close connections of db"""
+        self._writer.close()
+        self._update_catalog()  # size after writes
+        self._connection.close()
+
     @property
     def local_storage_size_in_bytes(self):
         try:
@@ -87,9 +194,9 @@ class ProjectDB:
         del manager.current[self.project_id]
         del ProjectDB._path2dbc[self.file_path]
         logger.info(f"deleting history DB for project id {self.project_id}...")
-        if self.connection:
+        if self._connection:
             try:
-                self.connection.close()
+                self.close()
             except Exception as e:
                 logger.err(
                     RuntimeError(
@@ -109,6 +216,7 @@ class ProjectDB:
                 ),
                 reraise=True,
             )
+        catalog.remove(self.project_id)
         logger.info(f"History db for project id {self.project_id} has been deleted.")
 
     @classmethod
@@ -119,7 +227,7 @@ class ProjectDB:
     def of_project_id(cls, project_id):
         if project_id in manager.current:
             return manager.current[project_id]
-        return ProjectDB(project_id)
+        return ProjectDB(project_id, path=catalog.path_of(project_id))
 
     def _execute(self, query, *args, fetch: DbQueryFetchType = DbQueryFetchType.ALL, **kwargs):
         cur = self.connection.cursor()
@@ -129,6 +237,10 @@ class ProjectDB:
             logger.err(f"failed to execute query cause '{e}'")
             logger.info(f"{query}, {args}")
             logger.err(e, reraise=True)
+        if query.lstrip()[:6].upper() in _DDL_PREFIXES:
+            self._schema_changed = True
+            if not self.connection.in_transaction:  # committed at once in autocommit mode
+                self._after_commit()
         if fetch:
             if fetch == DbQueryFetchType.ALL:
                 result = result.fetchall()
@@ -141,15 +253,40 @@ class ProjectDB:
     def _query(self, query, *args, fetch: DbQueryFetchType = DbQueryFetchType.ALL, **kwargs):
         return self._execute(query, *args, fetch=fetch, **kwargs)
 
+    @contextmanager
+    def transaction(self):
+        """run writes in a single transaction. the connection is in autocommit mode, so without this every write is committed(and synced) on its own. nested calls join the outer transaction."""
+        if self.connection.in_transaction:
+            yield self
+            return
+        self.connection.execute("BEGIN")
+        try:
+            yield self
+        except Exception:
+            self.connection.execute("ROLLBACK")
+            self._after_rollback()
+            raise
+        self.connection.execute("COMMIT")
+        self._after_commit()
+
+    def _after_commit(self):
+        """reload schema catalog if schema has been changed by the committed transaction"""
+        if self._schema_changed:
+            self._schema_changed = False
+            self._schema = SchemaCatalog.load(self.connection)
+
+    def _after_rollback(self):
+        """forget what rolled back writes have done. tables are created again on the next write if their creation is rolled back, and run ids are reloaded."""
+        self._inited_tables.clear()
+        self._num_rows = {}
+        self._load_run_ids()
+        self._update_catalog()
+
     def table_exist(self, table_name):
-        sql_query = f"SELECT name FROM sqlite_master WHERE type='table' AND name='{table_name}';"
-        result, _ = self._query(sql_query, fetch=DbQueryFetchType.ALL)
-        return result != []
+        return self._schema.has_table(table_name)
 
     def get_table_names(self):
-        sql_query = "SELECT name FROM sqlite_master;"
-        table_names, _ = self._query(sql_query, fetch=DbQueryFetchType.ALL)
-        return table_names
+        return [(name,) for name in [*self._schema.tables, *self._schema.indexes]]
 
     def fetch_db_version(self, default=None):
         if not self._inited_tables[VERSION_TABLE_NAME]:  # create if there is no version table
@@ -185,13 +322,21 @@ class ProjectDB:
             return default
         return _projectid[0]
 
+    def _load_run_ids(self):
+        """(re)load the cache of run id table. the cache is updated by writes of run id table, and reloaded after rollbacks."""
+        run_id2id = {}
+        # the schema catalog may not have the table yet if it is created in the current transaction
+        sql_query = f"SELECT count(*) FROM sqlite_master WHERE type='table' AND name=?"
+        (num_tables,), _ = self._query(sql_query, RUN_IDS_TABLE_NAME, fetch=DbQueryFetchType.ONE)
+        if num_tables:
+            sql_query = f"SELECT {RUN_ID_COLUMN_NAME}, {ID_COLUMN_NAME} FROM {RUN_IDS_TABLE_NAME}"
+            result, _ = self._query(sql_query, fetch=DbQueryFetchType.ALL)
+            run_id2id = dict(result)
+        # replace instead of update, readers in other threads see either the old or the new
+        self._run_id2id, self._id2run_id = run_id2id, {v: k for k, v in run_id2id.items()}
+
     def get_id_of_run_id(self, run_id: str):
-        try:
-            sql_query = f"SELECT {ID_COLUMN_NAME} FROM {RUN_IDS_TABLE_NAME} WHERE {RUN_ID_COLUMN_NAME} == '{run_id}'"
-            _id, _ = self._query(sql_query, fetch=DbQueryFetchType.ONE)
-            return _id[0]
-        except:
-            return None
+        return self._run_id2id.get(run_id)
 
     _run_id_fetch_lock = Lock()
 
@@ -200,13 +345,18 @@ class ProjectDB:
             sql_query = f"CREATE TABLE IF NOT EXISTS {RUN_IDS_TABLE_NAME} ( {ID_COLUMN_NAME} INTEGER PRIMARY KEY AUTOINCREMENT, {RUN_ID_COLUMN_NAME} TEXT NON NULL, {TIMESTAMP_COLUMN_NAME} TEXT NON NULL, {METADATA_COLUMN_NAME} TEXT, CONSTRAINT run_id_unique UNIQUE ({RUN_ID_COLUMN_NAME}));"
             self._execute(sql_query)
             self._inited_tables[RUN_IDS_TABLE_NAME] = True
+        id_of_run_id = self._run_id2id.get(run_id)
+        if id_of_run_id is not None:
+            return id_of_run_id
         with self._run_id_fetch_lock:
-            id_of_run_id = self.get_id_of_run_id(run_id)
+            id_of_run_id = self._run_id2id.get(run_id)
             if id_of_run_id is None:
                 timestamp = timestamp or datetime.now().strftime(DATETIME_FORMAT)
                 sql_query = f"INSERT INTO {RUN_IDS_TABLE_NAME}({RUN_ID_COLUMN_NAME}, {TIMESTAMP_COLUMN_NAME})   VALUES (?, ?)"
-                _, lastrowid = self._execute(sql_query, run_id, timestamp)
-                return lastrowid
+                _, id_of_run_id = self._execute(sql_query, run_id, timestamp)
+                self._id2run_id[id_of_run_id] = run_id
+                self._run_id2id[run_id] = id_of_run_id
+                self._update_catalog()
         return id_of_run_id
 
     def fetch_metadata_of_run_id(self, run_id: str, metadata: Union[dict, str] = None):
@@ -217,6 +367,7 @@ class ProjectDB:
             metadata = json.dumps(metadata) if isinstance(metadata, dict) else metadata
             sql_query = f"UPDATE {RUN_IDS_TABLE_NAME} SET {METADATA_COLUMN_NAME} = ? WHERE {ID_COLUMN_NAME} = ?"
             _, _ = self._execute(sql_query, metadata, id_of_run_id)
+            self._update_catalog()
         # get name
         sql_query = f"SELECT {METADATA_COLUMN_NAME} FROM {RUN_IDS_TABLE_NAME} WHERE {ID_COLUMN_NAME} == {id_of_run_id}"
         (metadata,), _ = self._query(sql_query, fetch=DbQueryFetchType.ONE)
@@ -226,12 +377,7 @@ class ProjectDB:
         return metadata
 
     def get_run_id_of_id(self, id_of_run_id):
-        try:
-            sql_query = f"SELECT {RUN_ID_COLUMN_NAME} FROM {RUN_IDS_TABLE_NAME} WHERE {ID_COLUMN_NAME} == {id_of_run_id}"
-            run_id, _ = self._query(sql_query, fetch=DbQueryFetchType.ONE)
-            return run_id[0]
-        except:
-            return None
+        return self._id2run_id.get(id_of_run_id)
 
     def get_run_ids(self):
         if not self.table_exist(RUN_IDS_TABLE_NAME):
@@ -251,6 +397,12 @@ class ProjectDB:
     def delete_run_id(self, run_id: str):
         sql_query = f"DELETE FROM {RUN_IDS_TABLE_NAME} where {RUN_ID_COLUMN_NAME} = ?"
         _, _ = self._execute(sql_query, run_id)
+        id_of_run_id = self._run_id2id.pop(run_id, None)
+        self._id2run_id.pop(id_of_run_id, None)
+        for key in list(self._num_rows):  # rows are deleted by cascade
+            if key[1] == id_of_run_id:
+                self._num_rows.pop(key, None)
+        self._update_catalog()
 
     def get_series_of_table(self, table_name, run_id=None):
         if not self.table_exist(table_name):
@@ -264,22 +416,83 @@ class ProjectDB:
         result, _ = self._query(sql_query, *args, fetch=DbQueryFetchType.ALL)
         return [result for (result,) in result]
 
+    def _delete_rows_over_limit(
+        self, table_name: str, run_id: int, num_row_limit: int, series=None
+    ):
+        """delete the oldest rows of run id(and of series if given) so that num_row_limit rows are left, returns num rows deleted"""
+        series_cond_str, args = "", [run_id]
+        if series is not None:
+            series_cond_str, args = f" AND {SERIES_COLUMN_NAME} = ?", [run_id, series]
+        sql_query = f"SELECT {ID_COLUMN_NAME} FROM {table_name} WHERE {RUN_ID_COLUMN_NAME} = ?{series_cond_str} ORDER BY {ID_COLUMN_NAME} DESC LIMIT 1 OFFSET ?"  # id of the oldest row to keep
+        min_id_to_keep, _ = self._query(
+            sql_query, *args, num_row_limit - 1, fetch=DbQueryFetchType.ONE
+        )
+        if min_id_to_keep is None:  # not exceeded
+            return 0
+        sql_query = f"DELETE FROM {table_name} WHERE {ID_COLUMN_NAME} < ? AND {RUN_ID_COLUMN_NAME} = ?{series_cond_str}"
+        cursor, _ = self._execute(sql_query, min_id_to_keep[0], *args, fetch=None)
+        return cursor.rowcount
+
     def do_limit_num_row_for(
-        self, table_name: str, run_id: str, num_row_limit: int, series: str = None
+        self, table_name: str, run_id: int, num_row_limit: int, series: str = None
     ):
-        if num_row_limit <= 0:  # no limit or random not triggered
+        """delete the oldest rows of run id in table so that at most num_row_limit rows are left
+
+        Args:
+            table_name (str): table name
+            run_id (int): id of run id
+            num_row_limit (int): max rows to keep, no limit if not positive
+            series (str, optional): limit rows of the series only. Defaults to None(rows of all series).
+        """
+        if num_row_limit <= 0:  # no limit
             return
-        sql_query = f"SELECT count(*) from {table_name} WHERE {RUN_ID_COLUMN_NAME} = {run_id}"  # count rows for run id in specific table
-        if series is not None:
-            sql_query += f" AND {SERIES_COLUMN_NAME} = '{series}'"
-        num_rows, _ = self._query(sql_query, fetch=DbQueryFetchType.ONE)
-        if num_rows[0] > num_row_limit:  # num rows exceeded limit
-            sql_query = f"SELECT {ID_COLUMN_NAME} from {table_name} WHERE {RUN_ID_COLUMN_NAME} = {run_id} ORDER BY {ID_COLUMN_NAME} DESC LIMIT 1 OFFSET {num_row_limit - 1}"  # get max id to delete of row for specific run id
-            max_id_to_del, _ = self._query(sql_query, fetch=DbQueryFetchType.ONE)
-            sql_query = f"DELETE FROM {table_name} WHERE {ID_COLUMN_NAME} < {max_id_to_del[0]} AND {RUN_ID_COLUMN_NAME} = {run_id}"
+        self._delete_rows_over_limit(table_name, run_id, num_row_limit, series)
+        for key in list(self._num_rows):  # count again on next limited write
+            if key[:2] == (table_name, run_id):
+                self._num_rows.pop(key, None)
+
+    def _limit_num_row_lazily(
+        self, table_name: str, run_id: int, num_row_limit: int, series: str, num_added: int
+    ):
+        """limit rows like do_limit_num_row_for after num_added rows of series are written, but without counting rows on every write. rows are counted once and then tracked in memory, and the oldest rows are deleted in batches, once there are more than 10% rows over the limit."""
+        # limit of rows of all series, for rows without series
+        whole_run_key = (table_name, run_id, None)
+        if series is not None and whole_run_key in self._num_rows:
+            self._num_rows[whole_run_key] += num_added
+        if num_row_limit <= 0:  # no limit
+            return
+        key = (table_name, run_id, series)
+        num_rows = self._num_rows.get(key)
+        if num_rows is None:  # not counted yet, rows just written included
+            series_cond_str, args = "", [run_id]
             if series is not None:
-                sql_query += f" AND {SERIES_COLUMN_NAME} = '{series}'"
-            self._query(sql_query)  # delete rows with smaller id and specific run id
+                series_cond_str, args = f" AND {SERIES_COLUMN_NAME} = ?", [run_id, series]
+            sql_query = (
+                f"SELECT count(*) FROM {table_name} WHERE {RUN_ID_COLUMN_NAME} = ?{series_cond_str}"
+            )
+            (num_rows,), _ = self._query(sql_query, *args, fetch=DbQueryFetchType.ONE)
+        else:
+            num_rows += num_added
+        if num_rows > num_row_limit + max(1, num_row_limit // 10):
+            num_deleted = self._delete_rows_over_limit(table_name, run_id, num_row_limit, series)
+            num_rows -= num_deleted
+            if series is not None and whole_run_key in self._num_rows:
+                self._num_rows[whole_run_key] -= num_deleted
+            elif series is None:  # rows of any series may be deleted, count them again
+                for _key in list(self._num_rows):
+                    if _key[:2] == (table_name, run_id) and _key[2] is not None:
+                        self._num_rows.pop(_key, None)
+        self._num_rows[key] = num_rows
+
+    def _init_json_table(self, table_name: str):
+        if not self._inited_tables[table_name]:  # create if there is no version table
+            sql_query = f"CREATE TABLE IF NOT EXISTS {table_name} ( {ID_COLUMN_NAME} INTEGER PRIMARY KEY AUTOINCREMENT, {TIMESTAMP_COLUMN_NAME} TEXT NON NULL, {SERIES_COLUMN_NAME} TEXT, {RUN_ID_COLUMN_NAME} INTEGER, {JSON_COLUMN_NAME} TEXT NON NULL, FOREIGN KEY({RUN_ID_COLUMN_NAME}) REFERENCES {RUN_IDS_TABLE_NAME}({ID_COLUMN_NAME}) ON DELETE CASCADE);"
+            self._execute(sql_query)
+            sql_query = f"CREATE INDEX IF NOT EXISTS series_and_runid_index ON {table_name} ({SERIES_COLUMN_NAME}, {RUN_ID_COLUMN_NAME})"
+            self._execute(sql_query)
+            self._inited_tables[table_name] = True
+            if table_name == LOG_TABLE_NAME:
+                self._init_log_search()
 
     def write_json(
         self,
@@ -294,28 +507,73 @@ class ProjectDB:
             json_data = json.loads(json_data)
         if run_id:
             run_id = self.fetch_id_of_run_id(run_id, timestamp=timestamp)
-        if not self._inited_tables[table_name]:  # create if there is no version table
-            sql_query = f"CREATE TABLE IF NOT EXISTS {table_name} ( {ID_COLUMN_NAME} INTEGER PRIMARY KEY AUTOINCREMENT, {TIMESTAMP_COLUMN_NAME} TEXT NON NULL, {SERIES_COLUMN_NAME} TEXT, {RUN_ID_COLUMN_NAME} INTEGER, {JSON_COLUMN_NAME} TEXT NON NULL, FOREIGN KEY({RUN_ID_COLUMN_NAME}) REFERENCES {RUN_IDS_TABLE_NAME}({ID_COLUMN_NAME}) ON DELETE CASCADE);"
-            self._execute(sql_query)
-            sql_query = f"CREATE INDEX IF NOT EXISTS series_and_runid_index ON {table_name} ({SERIES_COLUMN_NAME}, {RUN_ID_COLUMN_NAME})"
-            self._execute(sql_query)
-            self._inited_tables[table_name] = True
+        self._init_json_table(table_name)
 
         sql_query = f"INSERT INTO {table_name}({TIMESTAMP_COLUMN_NAME}, {SERIES_COLUMN_NAME}, {RUN_ID_COLUMN_NAME}, {JSON_COLUMN_NAME}) VALUES (?, ?, ?, ?)"
         if isinstance(json_data, dict):
             json_data = json.dumps(json_data)
-        _, lastrowid = self._execute(sql_query, timestamp, series, run_id, json_data)
-        self.do_limit_num_row_for(
-            table_name=table_name, run_id=run_id, num_row_limit=num_row_limit, series=series
-        )
+        with self.transaction():
+            _, lastrowid = self._execute(sql_query, timestamp, series, run_id, json_data)
+            if table_name == LOG_TABLE_NAME and self.log_search_supported():
+                self._index_log_rows(lastrowid, lastrowid)
+            self._limit_num_row_lazily(table_name, run_id, num_row_limit, series, num_added=1)
         return lastrowid
 
+    def write_json_many(
+        self,
+        table_name: str,
+        json_datas: list,
+        timestamps: list,
+        series: str = None,
+        run_id: str = None,
+        num_row_limit=-1,
+    ):
+        """insert rows of the same run id in one transaction with a single executemany
+
+        Args:
+            table_name (str): table to insert into
+            json_datas (list): json(dict or str) of each row
+            timestamps (list): timestamp of each row
+            series (Union[str, list], optional): series of the rows, or a list of series of each row. Defaults to None.
+            run_id (str, optional): run id of the rows. Defaults to None.
+            num_row_limit (int, optional): max rows to keep for each series. Defaults to -1(no limit).
+
+        Returns:
+            list: ids of the inserted rows
+        """
+        if not json_datas:
+            return []
+        with self.transaction():
+            if run_id:
+                run_id = self.fetch_id_of_run_id(run_id, timestamp=timestamps[0])
+            self._init_json_table(table_name)
+            sql_query = f"INSERT INTO {table_name}({TIMESTAMP_COLUMN_NAME}, {SERIES_COLUMN_NAME}, {RUN_ID_COLUMN_NAME}, {JSON_COLUMN_NAME}) VALUES (?, ?, ?, ?)"
+            series_of_rows = series if isinstance(series, list) else [series] * len(json_datas)
+            rows = [
+                (
+                    timestamp,
+                    _series,
+                    run_id,
+                    json_data if isinstance(json_data, str) else json.dumps(json_data),
+                )
+                for json_data, timestamp, _series in zip(json_datas, timestamps, series_of_rows)
+            ]
+            cur = self.connection.cursor()
+            cur.executemany(sql_query, rows)
+            # rows are inserted by one statement in one transaction, so their ids are consecutive
+            (lastrowid,), _ = self._query("SELECT last_insert_rowid()", fetch=DbQueryFetchType.ONE)
+            if table_name == LOG_TABLE_NAME and self.log_search_supported():
+                self._index_log_rows(lastrowid - len(rows) + 1, lastrowid)
+            for _series, num_added in collections.Counter(series_of_rows).items():
+                self._limit_num_row_lazily(table_name, run_id, num_row_limit, _series, num_added)
+        return list(range(lastrowid - len(rows) + 1, lastrowid + 1))
+
     def read_json(self, table_name: str, condition: QueryCondition = None):
         if not self.table_exist(table_name):
             return []
         if condition and isinstance(condition.run_id, str):
             condition.run_id = self.get_id_of_run_id(condition.run_id)  # convert run id
-        cond_str, cond_vars = condition.dumpt() if condition else ""
+        cond_str, cond_vars = condition.dumpt() if condition else ("", [])
         sql_query = f"SELECT {', '.join((ID_COLUMN_NAME, TIMESTAMP_COLUMN_NAME,SERIES_COLUMN_NAME, JSON_COLUMN_NAME))} FROM {table_name} {cond_str}"
         result, _ = self._query(sql_query, *cond_vars, fetch=DbQueryFetchType.ALL)
         result = [
@@ -329,6 +587,187 @@ class ProjectDB:
         ]
         return result
 
+    @classmethod
+    def log_search_supported(cls) -> bool:
+        """whether the sqlite library is built with fts5 and json1, which the full text index of logs needs. logs are written without the index if not."""
+        if cls._log_search_supported is None:
+            connection = sqlite3.connect(":memory:")
+            try:
+                connection.execute("CREATE VIRTUAL TABLE search_probe USING fts5(text)")
+                connection.execute("""SELECT json_extract('{"text": ""}', '$.text')""")
+                cls._log_search_supported = True
+            except sqlite3.OperationalError as e:
+                logger.warn(f"full text search of logs is disabled: {e}")
+                cls._log_search_supported = False
+            finally:
+                connection.close()
+        return cls._log_search_supported
+
+    def _init_log_search(self):
+        """create the full text index of log messages and callers. the index reads text from a view of the log table instead of keeping a copy. inserted rows are indexed by _index_log_rows in the inserting transaction, and a trigger removes rows from the index no matter the row is deleted directly, by row limit or by cascade from run ids."""
+        if self._inited_tables[LOG_SEARCH_TABLE_NAME] or not self.log_search_supported():
+            return
+        message_of = lambda row: f"json_extract({row}.{JSON_COLUMN_NAME}, '$.{MESSAGE_KEY}')"
+        whom_of = lambda row: f"json_extract({row}.{JSON_COLUMN_NAME}, '$.{CALLER_ID_KEY}')"
+        with self.transaction():
+            existed = self.table_exist(LOG_SEARCH_TABLE_NAME)
+            sql_query = f"CREATE VIEW IF NOT EXISTS {LOG_SEARCH_CONTENT_NAME} AS SELECT {ID_COLUMN_NAME}, {message_of(LOG_TABLE_NAME)} AS message, {whom_of(LOG_TABLE_NAME)} AS whom FROM {LOG_TABLE_NAME}"
+            self._execute(sql_query)
+            sql_query = f"CREATE VIRTUAL TABLE IF NOT EXISTS {LOG_SEARCH_TABLE_NAME} USING fts5(message, whom, content='{LOG_SEARCH_CONTENT_NAME}', content_rowid='{ID_COLUMN_NAME}')"
+            self._execute(sql_query)
+            sql_query = f"CREATE TRIGGER IF NOT EXISTS {LOG_TABLE_NAME}_search_delete AFTER DELETE ON {LOG_TABLE_NAME} BEGIN INSERT INTO {LOG_SEARCH_TABLE_NAME}({LOG_SEARCH_TABLE_NAME}, rowid, message, whom) VALUES ('delete', OLD.{ID_COLUMN_NAME}, {message_of('OLD')}, {whom_of('OLD')}); END;"
+            self._execute(sql_query)
+            if not existed:  # index logs written before the index
+                sql_query = f"INSERT INTO {LOG_SEARCH_TABLE_NAME}({LOG_SEARCH_TABLE_NAME}) VALUES ('rebuild')"
+                self._execute(sql_query)
+        self._inited_tables[LOG_SEARCH_TABLE_NAME] = True
+
+    def _index_log_rows(self, first_id: int, last_id: int):
+        """add log rows of ids in [first_id, last_id] to the full text index. done in one statement per write instead of an insert trigger, since fts5 flushes its pending index data at the end of every trigger."""
+        sql_query = f"INSERT INTO {LOG_SEARCH_TABLE_NAME}(rowid, message, whom) SELECT {ID_COLUMN_NAME}, message, whom FROM {LOG_SEARCH_CONTENT_NAME} WHERE {ID_COLUMN_NAME} BETWEEN ? AND ?"
+        self._execute(sql_query, first_id, last_id)
+
+    def search_log(
+        self,
+        text: str,
+        run_id: str = None,
+        series: str = None,
+        limit: int = 50,
+        cursor: str = None,
+        order: str = "rank",
+        raw: bool = False,
+        highlight=("<mark>", "</mark>"),
+    ):
+        """search logs by message and caller with the full text index
+
+        Args:
+            text (str): words to search, logs containing all of them are found. see raw for fts5 query syntax.
+            run_id (str, optional): search logs of the run only. Defaults to None.
+            series (str, optional): search logs of the series only. Defaults to None.
+            limit (int, optional): max number of results. Defaults to 50.
+            cursor (str, optional): cursor returned with the previous page, to get the next page. Defaults to None.
+            order (str, optional): 'rank' for best match first, 'recent' for latest log first. Defaults to "rank".
+            raw (bool, optional): whether text is a fts5 query, such as 'error AND NOT cuda*'. Defaults to False.
+            highlight (tuple, optional): marks put around matched words in snippets. Defaults to ("<mark>", "</mark>").
+
+        Returns:
+            Tuple[list, Optional[str]]: results, and cursor of the next page(None if no more)
+
+        Raises:
+            NotImplementedError: if sqlite is built without fts5 or json1
+        """
+        if not self.log_search_supported():
+            raise NotImplementedError("sqlite of server is built without fts5 or json1")
+        if order not in ("rank", "recent"):
+            raise ValueError(f"order should be 'rank' or 'recent' but got '{order}'")
+        if not raw:  # quote each word, so that punctuations in exceptions are not read as syntax
+            text = " ".join('"' + word.replace('"', '""') + '"' for word in text.split())
+        if not text:
+            raise ValueError("nothing to search")
+        if not self.table_exist(LOG_TABLE_NAME):
+            return [], None
+        self._init_log_search()
+        conditions, args = [f"{LOG_SEARCH_TABLE_NAME} MATCH ?"], [text]
+        if run_id is not None:
+            conditions.append(f"{LOG_TABLE_NAME}.{RUN_ID_COLUMN_NAME} = ?")
+            args.append(self.get_id_of_run_id(run_id))
+        if series is not None:
+            conditions.append(f"{LOG_TABLE_NAME}.{SERIES_COLUMN_NAME} = ?")
+            args.append(series)
+        # keyset pagination, continue after the last result of the previous page
+        rank_column, id_column = (
+            f"{LOG_SEARCH_TABLE_NAME}.rank",
+            f"{LOG_TABLE_NAME}.{ID_COLUMN_NAME}",
+        )
+        if order == "rank":
+            if cursor:
+                last_rank, last_id = cursor.rsplit(":", 1)
+                conditions.append(f"({rank_column} > ? OR ({rank_column} = ? AND {id_column} > ?))")
+                args += [float(last_rank), float(last_rank), int(last_id)]
+            order_by = f"{rank_column}, {id_column}"
+        else:
+            # by rowid of the index, which fts5 walks backwards without sorting all the matches
+            if cursor:
+                conditions.append(f"{LOG_SEARCH_TABLE_NAME}.rowid < ?")
+                args.append(int(cursor))
+            order_by = f"{LOG_SEARCH_TABLE_NAME}.rowid DESC"
+        sql_query = f"SELECT {id_column}, {LOG_TABLE_NAME}.{TIMESTAMP_COLUMN_NAME}, {LOG_TABLE_NAME}.{SERIES_COLUMN_NAME}, {RUN_IDS_TABLE_NAME}.{RUN_ID_COLUMN_NAME}, {LOG_TABLE_NAME}.{JSON_COLUMN_NAME}, snippet({LOG_SEARCH_TABLE_NAME}, 0, ?, ?, '...', 16), {rank_column} FROM {LOG_SEARCH_TABLE_NAME} JOIN {LOG_TABLE_NAME} ON {id_column} = {LOG_SEARCH_TABLE_NAME}.rowid LEFT JOIN {RUN_IDS_TABLE_NAME} ON {RUN_IDS_TABLE_NAME}.{ID_COLUMN_NAME} = {LOG_TABLE_NAME}.{RUN_ID_COLUMN_NAME} WHERE {' AND '.join(conditions)} ORDER BY {order_by} LIMIT ?"
+        result, _ = self._query(sql_query, *highlight, *args, limit, fetch=DbQueryFetchType.ALL)
+        results = [
+            {
+                ID_COLUMN_NAME: _id,
+                TIMESTAMP_COLUMN_NAME: timestamp,
+                SERIES_COLUMN_NAME: _series,
+                RUN_ID_COLUMN_NAME: _run_id,
+                JSON_COLUMN_NAME: json.loads(metadata) if metadata else None,
+                "snippet": snippet,
+                "rank": _rank,
+            }
+            for _id, timestamp, _series, _run_id, metadata, snippet, _rank in result
+        ]
+        next_cursor = None
+        if len(results) == limit:
+            last = results[-1]
+            next_cursor = (
+                f"{last['rank']!r}:{last[ID_COLUMN_NAME]}"
+                if order == "rank"
+                else str(last[ID_COLUMN_NAME])
+            )
+        return results, next_cursor
+
+    def read_json_stream(
+        self, table_name: str, condition: QueryCondition = None, batch_size: int = 512
+    ):
+        """read rows like read_json, as text chunks of a json array. rows are fetched batch by batch from a read only connection of their own, and json column text goes out as is without parsing, so memory use does not grow with the number of rows.
+
+        Args:
+            table_name (str): table to read
+            condition (QueryCondition, optional): query condition. Defaults to None.
+            batch_size (int, optional): rows fetched at once. Defaults to 512.
+
+        Returns:
+            Iterator[str]: chunks of the json array
+        """
+        if not self.table_exist(table_name):
+            return iter(["[]"])
+        if condition and isinstance(condition.run_id, str):
+            condition.run_id = self.get_id_of_run_id(condition.run_id)  # convert run id
+        cond_str, cond_vars = condition.dumpt() if condition else ("", [])
+        sql_query = f"SELECT {', '.join((ID_COLUMN_NAME, TIMESTAMP_COLUMN_NAME,SERIES_COLUMN_NAME, JSON_COLUMN_NAME))} FROM {table_name} {cond_str}"
+        # a connection of its own, the stream is read in threads while the db is being written
+        connection = sqlite3.connect(
+            f"{pathlib.Path(self.file_path).absolute().as_uri()}?mode=ro",
+            uri=True,
+            check_same_thread=False,
+        )
+        try:
+            cursor = connection.execute(sql_query, cond_vars)
+        except Exception:
+            connection.close()
+            raise
+        dumps = json.dumps
+
+        def _stream():
+            try:
+                head = "["
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    yield head + ",".join(
+                        f'{{"{ID_COLUMN_NAME}":{w},"{TIMESTAMP_COLUMN_NAME}":{dumps(x)},"{SERIES_COLUMN_NAME}":{dumps(y)},"{JSON_COLUMN_NAME}":{z or "null"}}}'
+                        for w, x, y, z in rows
+                    )
+                    head = ","
+                yield "[]" if head == "[" else "]"
+            finally:  # finished, failed or closed
+                close()
+
+        stream = _stream()
+        # a stream dropped before it is started never runs the finally above
+        close = weakref.finalize(stream, connection.close)
+        return stream
+
     def set_status(self, run_id: str, series: str, json_data):
         if not (isinstance(json_data, str) or isinstance(json_data, dict)):
             raise
@@ -341,9 +780,14 @@ class ProjectDB:
             self._execute(sql_query)
             self._inited_tables[STATUS_TABLE_NAME] = True
         sql_query = f"INSERT OR REPLACE INTO {STATUS_TABLE_NAME}({RUN_ID_COLUMN_NAME},{SERIES_COLUMN_NAME}, {JSON_COLUMN_NAME}) VALUES (?, ?, ?)"
+        name = (
+            json_data.get(NAME_KEY) if series == "config" and isinstance(json_data, dict) else None
+        )
         if isinstance(json_data, dict):
             json_data = json.dumps(json_data)
         _, lastrowid = self._execute(sql_query, run_id, series, json_data)
+        if name is not None:  # project name, shown in project list
+            self._update_catalog(name=name)
         return lastrowid
 
     def get_status(self, run_id: str = None, series: str = None):
@@ -363,6 +807,41 @@ class ProjectDB:
             result[run_id][series_name] = json.loads(value)
         return result
 
+    def _init_blob_table(self, table_name: str):
+        """create blob table and the content addressed blob store. rows of blob tables reference blobs in the store by blob id, and triggers keep the reference count of blobs, so that blobs are deleted with their last referencing row, no matter the row is deleted directly, by row limit or by cascade from run ids."""
+        if self._inited_tables[table_name]:
+            return
+        if not self._inited_tables[BLOB_TABLE_NAME]:
+            sql_query = f"CREATE TABLE IF NOT EXISTS {BLOB_TABLE_NAME} ( {ID_COLUMN_NAME} INTEGER PRIMARY KEY AUTOINCREMENT, {BLOB_HASH_COLUMN_NAME} BLOB NOT NULL UNIQUE, {BLOB_REF_COUNT_COLUMN_NAME} INTEGER NOT NULL DEFAULT 0, {BLOB_COLUMN_NAME} BLOB NOT NULL );"
+            self._execute(sql_query)
+            self._inited_tables[BLOB_TABLE_NAME] = True
+        # blob column is kept for rows written before blob store, new rows leave it NULL
+        sql_query = f"CREATE TABLE IF NOT EXISTS {table_name} ( {ID_COLUMN_NAME} INTEGER PRIMARY KEY AUTOINCREMENT, {TIMESTAMP_COLUMN_NAME} TEXT NON NULL, {SERIES_COLUMN_NAME} TEXT, {RUN_ID_COLUMN_NAME} INTEGER, {METADATA_COLUMN_NAME} TEXT, {BLOB_COLUMN_NAME} BLOB, {BLOB_ID_COLUMN_NAME} INTEGER, FOREIGN KEY({RUN_ID_COLUMN_NAME}) REFERENCES {RUN_IDS_TABLE_NAME}({ID_COLUMN_NAME}) ON DELETE CASCADE);"
+        self._execute(sql_query)
+        sql_query = f"CREATE INDEX IF NOT EXISTS series_and_runid_index ON {table_name} ({SERIES_COLUMN_NAME}, {RUN_ID_COLUMN_NAME})"
+        self._execute(sql_query)
+        if self.table_exist(table_name) and BLOB_ID_COLUMN_NAME not in self._schema.columns_of(
+            table_name
+        ):  # table of older version
+            sql_query = f"ALTER TABLE {table_name} ADD COLUMN {BLOB_ID_COLUMN_NAME} INTEGER"
+            self._execute(sql_query)
+        sql_query = f"CREATE TRIGGER IF NOT EXISTS {table_name}_blob_ref AFTER INSERT ON {table_name} WHEN NEW.{BLOB_ID_COLUMN_NAME} IS NOT NULL BEGIN UPDATE {BLOB_TABLE_NAME} SET {BLOB_REF_COUNT_COLUMN_NAME} = {BLOB_REF_COUNT_COLUMN_NAME} + 1 WHERE {ID_COLUMN_NAME} = NEW.{BLOB_ID_COLUMN_NAME}; END;"
+        self._execute(sql_query)
+        sql_query = f"CREATE TRIGGER IF NOT EXISTS {table_name}_blob_unref AFTER DELETE ON {table_name} WHEN OLD.{BLOB_ID_COLUMN_NAME} IS NOT NULL BEGIN UPDATE {BLOB_TABLE_NAME} SET {BLOB_REF_COUNT_COLUMN_NAME} = {BLOB_REF_COUNT_COLUMN_NAME} - 1 WHERE {ID_COLUMN_NAME} = OLD.{BLOB_ID_COLUMN_NAME}; DELETE FROM {BLOB_TABLE_NAME} WHERE {ID_COLUMN_NAME} = OLD.{BLOB_ID_COLUMN_NAME} AND {BLOB_REF_COUNT_COLUMN_NAME} <= 0; END;"
+        self._execute(sql_query)
+        self._inited_tables[table_name] = True
+
+    def _migrate_blob_tables(self):
+        """move blob tables of older version(without blob id column) to blob store, so that reads never change schema"""
+        for table_name, columns in self._schema.tables.items():
+            if (
+                table_name != BLOB_TABLE_NAME
+                and BLOB_COLUMN_NAME in columns
+                and BLOB_ID_COLUMN_NAME not in columns
+            ):
+                with self.transaction():
+                    self._init_blob_table(table_name)
+
     def write_blob(
         self,
         table_name: str,
@@ -373,27 +852,26 @@ class ProjectDB:
         timestamp: str = None,
         num_row_limit=-1,
     ):
+        """write a row referencing blob data. identical blob data is stored only once in blob store."""
         meta_data = meta_data or {}
         meta_data = meta_data if isinstance(meta_data, dict) else json.loads(meta_data)
-        if run_id:
-            run_id = self.fetch_id_of_run_id(run_id, timestamp=timestamp)
-        if isinstance(blob_data, bytes):
-            blob_data = bytearray(blob_data)
         if isinstance(meta_data, dict):
             meta_data = json.dumps(meta_data)
-
-        if not self._inited_tables[table_name]:  # create if not exist
-            sql_query = f"CREATE TABLE IF NOT EXISTS {table_name} ( {ID_COLUMN_NAME} INTEGER PRIMARY KEY AUTOINCREMENT, {TIMESTAMP_COLUMN_NAME} TEXT NON NULL, {SERIES_COLUMN_NAME} TEXT, {RUN_ID_COLUMN_NAME} INTEGER, {METADATA_COLUMN_NAME} TEXT, {BLOB_COLUMN_NAME} BLOB NON NULL, FOREIGN KEY({RUN_ID_COLUMN_NAME}) REFERENCES {RUN_IDS_TABLE_NAME}({ID_COLUMN_NAME}) ON DELETE CASCADE);"
-            self._execute(sql_query)
-            sql_query = f"CREATE INDEX IF NOT EXISTS series_and_runid_index ON {table_name} ({SERIES_COLUMN_NAME}, {RUN_ID_COLUMN_NAME})"
-            self._execute(sql_query)
-            self._inited_tables[table_name] = True
-
-        sql_query = f"INSERT INTO {table_name}({TIMESTAMP_COLUMN_NAME}, {SERIES_COLUMN_NAME}, {RUN_ID_COLUMN_NAME}, {METADATA_COLUMN_NAME}, {BLOB_COLUMN_NAME}) VALUES (?, ?, ?, ?, ?)"
-        _, lastrowid = self._execute(sql_query, timestamp, series, run_id, meta_data, blob_data)
-        self.do_limit_num_row_for(
-            table_name=table_name, run_id=run_id, num_row_limit=num_row_limit, series=series
-        )
+        blob_hash = hashlib.blake2b(blob_data, digest_size=16).digest()
+        with self.transaction():
+            if run_id:
+                run_id = self.fetch_id_of_run_id(run_id, timestamp=timestamp)
+            self._init_blob_table(table_name)
+            # blob data is not written again if the hash exists
+            sql_query = f"INSERT OR IGNORE INTO {BLOB_TABLE_NAME}({BLOB_HASH_COLUMN_NAME}, {BLOB_COLUMN_NAME}) VALUES (?, ?)"
+            self._execute(sql_query, blob_hash, blob_data)
+            sql_query = (
+                f"SELECT {ID_COLUMN_NAME} FROM {BLOB_TABLE_NAME} WHERE {BLOB_HASH_COLUMN_NAME} = ?"
+            )
+            (blob_id,), _ = self._query(sql_query, blob_hash, fetch=DbQueryFetchType.ONE)
+            sql_query = f"INSERT INTO {table_name}({TIMESTAMP_COLUMN_NAME}, {SERIES_COLUMN_NAME}, {RUN_ID_COLUMN_NAME}, {METADATA_COLUMN_NAME}, {BLOB_ID_COLUMN_NAME}) VALUES (?, ?, ?, ?, ?)"
+            _, lastrowid = self._execute(sql_query, timestamp, series, run_id, meta_data, blob_id)
+            self._limit_num_row_lazily(table_name, run_id, num_row_limit, series, num_added=1)
         return lastrowid
 
     def read_blob(self, table_name: str, condition: QueryCondition = None, meta_only=False):
@@ -401,8 +879,10 @@ class ProjectDB:
             return []
         if condition and isinstance(condition.run_id, str):
             condition.run_id = self.get_id_of_run_id(condition.run_id)  # convert run id
-        cond_str, cond_vars = condition.dumpt() if condition else ""
-        sql_query = f"SELECT {', '.join((ID_COLUMN_NAME,TIMESTAMP_COLUMN_NAME, METADATA_COLUMN_NAME, *((BLOB_COLUMN_NAME,) if not meta_only else ())))} FROM {table_name} {cond_str}"
+        cond_str, cond_vars = condition.dumpt() if condition else ("", [])
+        # rows written before blob store keep their blob data inline
+        blob_column = f"COALESCE({BLOB_COLUMN_NAME}, (SELECT {BLOB_TABLE_NAME}.{BLOB_COLUMN_NAME} FROM {BLOB_TABLE_NAME} WHERE {BLOB_TABLE_NAME}.{ID_COLUMN_NAME} = {table_name}.{BLOB_ID_COLUMN_NAME}))"
+        sql_query = f"SELECT {', '.join((ID_COLUMN_NAME,TIMESTAMP_COLUMN_NAME, METADATA_COLUMN_NAME, *((blob_column,) if not meta_only else ())))} FROM {table_name} {cond_str}"
         result, _ = self._query(sql_query, *cond_vars, fetch=DbQueryFetchType.ALL)
         return result
 
@@ -414,19 +894,38 @@ class ProjectDB:
         return conn
 
     @classmethod
-    def get_db_list(cls):
-        history_file_loader = ResourceLoader(
-            folder=DB_PROJECT_FILE_FOLDER, file_types=[DB_PROJECT_FILE_TYPE_NAME], force_rescan=True
-        )
-        history_file_list = history_file_loader.get_file_list()
-        for path in history_file_list:
-            cls.load_db_of_path(path=path)
-        return manager.current.items()
+    def get_catalog(cls, rescan: bool = True):
+        """read records of projects from the project catalog, without opening project dbs
+
+        Args:
+            rescan (bool, optional): check the history file folder for files added or removed by others. files not in the catalog are opened once to be recorded. Defaults to True.
+
+        Returns:
+            Dict[str, dict]: project id : record, see ProjectCatalog.items
+        """
+        records = catalog.items()
+        if not rescan:
+            return records
+        changed = False
+        for project_id, record in records.items():
+            if not os.path.isfile(record[PATH_COLUMN_NAME]):  # removed
+                catalog.remove(project_id)
+                changed = True
+        known_paths = {record[PATH_COLUMN_NAME] for record in records.values()}
+        for entry in os.scandir(DB_PROJECT_FILE_FOLDER):
+            path = os.path.abspath(entry.path)
+            if entry.name.endswith(f".{DB_PROJECT_FILE_TYPE_NAME}") and path not in known_paths:
+                try:
+                    cls.load_db_of_path(path=path)  # recorded when opened
+                except Exception as e:
+                    logger.err(f"failed to load history file {path}: {e}")
+                changed = True
+        return catalog.items() if changed else records
 
     @classmethod
-    def get_db_of_id(cls, project_id, rescan: bool = True):
+    def get_db_of_id(cls, project_id, rescan: bool = False):
         if rescan:
-            cls.get_db_list()  # scan for possible file changes
+            cls.get_catalog()  # scan for possible file changes
         conn = ProjectDB.of_project_id(project_id=project_id)
         return conn
 
@@ -439,3 +938,4 @@ if not os.path.exists(DB_PROJECT_FILE_FOLDER):
 # check if is dir
 assert os.path.isdir(DB_PROJECT_FILE_FOLDER), f"{DB_PROJECT_FILE_FOLDER} is not a directory."
 logger.info(f"using history file folder: {DB_PROJECT_FILE_FOLDER}")
+catalog = ProjectCatalog(DB_PROJECT_CATALOG_PATH)
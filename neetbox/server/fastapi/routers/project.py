@@ -4,15 +4,34 @@
 # Github: github.com/visualDust
 # Date:   20240109
 
+import collections
+import gzip
+import hashlib
+import io
+import sqlite3
+from threading import Lock
 from typing import Optional, Union
 
-from fastapi import APIRouter, Body, File, Form, HTTPException, Response, UploadFile
+from fastapi import (
+    APIRouter,
+    Body,
+    File,
+    Form,
+    HTTPException,
+    Query,
+    Response,
+    UploadFile,
+)
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 
 from neetbox._protocol import *
 from neetbox.logging import Logger, LogLevel
+from neetbox.utils.localstorage import get_file_size_in_bytes
 
 from ..._bridge import Bridge
 from ...db import QueryCondition
+from ...db.project import ProjectDB
 
 logger = Logger("FASTAPI", skip_writers_names=["ws"])
 logger.log_level = LogLevel.DEBUG
@@ -22,7 +41,31 @@ router = APIRouter()
 
 @router.get(f"/list")
 async def get_status_of_all_proejcts():
-    return [_project_status_from_bridge(bridge) for _, bridge in Bridge.items()]
+    """list projects from project catalog without opening their history dbs. run ids of projects of which history dbs are not opened are the ones recorded in the catalog."""
+    records = ProjectDB.get_catalog(rescan=False)
+    projects = []
+    for project_id, bridge in Bridge.items():
+        record = records.get(project_id, {})
+        try:  # size of file changes on every write, the recorded one may be old
+            storage = get_file_size_in_bytes(record["path"])
+        except Exception:
+            storage = record.get("size")
+        if bridge.is_history_loaded() or record.get("runIds") is None:
+            run_ids = bridge.get_run_ids()
+        else:  # no client has connected since loaded, none of its runs is online
+            run_ids = [dict(info, online=False) for info in record["runIds"]]
+        projects.append(
+            {
+                PROJECT_ID_KEY: project_id,
+                "storage": storage,
+                "online": bridge.is_online(),
+                NAME_KEY: record.get(NAME_KEY),
+                "lastRunTimestamp": record.get("lastRunTimestamp"),
+                "numRuns": record.get("numRuns", 0),
+                "runids": run_ids,
+            }
+        )
+    return projects
 
 
 @router.get(f"/{{project_id}}")
@@ -60,10 +103,14 @@ def get_history_json_of(project_id: str, table_name: str, condition=Union[dict,
             condition = QueryCondition.from_json(condition)
     except Exception as e:  # if failed to parse
         error_message = f"failed to parse condition from {type(condition)}{condition} :{e}"
-        logger.debug(error_message, series="400")
+        logger.debug(error_message)
         raise HTTPException(status_code=400, detail={ERROR_KEY: error_message})
-    return Bridge.of_id(project_id).read_json_from_history(
-        table_name=table_name, condition=condition
+    # streamed, so that large histories are not held in memory. the body is the same json array
+    return StreamingResponse(
+        Bridge.of_id(project_id).read_json_stream_from_history(
+            table_name=table_name, condition=condition
+        ),
+        media_type="application/json",
     )
 
 
@@ -76,6 +123,88 @@ async def get_history_log_of(project_id: str, condition: str):
     )
 
 
+@router.get(f"/{{project_id}}/log/search")
+async def search_history_log_of(
+    project_id: str,
+    q: str,
+    run_id: Optional[str] = Query(None, alias=RUN_ID_KEY),
+    series: Optional[str] = None,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    order: str = "rank",
+    raw: bool = False,
+):
+    """search logs by words in message and caller, see ProjectDB.search_log. pass the returned cursor to get the next page."""
+    if not Bridge.has(project_id):
+        raise HTTPException(status_code=404, detail={ERROR_KEY: "Project ID not found"})
+    try:
+        results, next_cursor = Bridge.of_id(project_id).search_log_in_history(
+            q,
+            run_id=run_id,
+            series=series,
+            limit=min(max(limit, 1), 1000),
+            cursor=cursor,
+            order=order,
+            raw=raw,
+        )
+    except NotImplementedError as e:  # sqlite of server can not search
+        raise HTTPException(status_code=501, detail={ERROR_KEY: str(e)})
+    except (ValueError, sqlite3.OperationalError) as e:  # bad cursor, order or fts5 query
+        error_message = f"failed to search logs for '{q}': {e}"
+        logger.debug(error_message)
+        raise HTTPException(status_code=400, detail={ERROR_KEY: error_message})
+    return {"results": results, "cursor": next_cursor}
+
+
+def _parse_json_log_lines(file, max_lines: int):
+    """parse next lines of a json lines log file into (payloads, timestamps, series) of log rows"""
+    payloads, timestamps, series = [], [], []
+    for line in file:
+        if not line.strip():
+            continue
+        log = json.loads(line)
+        payloads.append({CALLER_ID_KEY: log.get(CALLER_ID_KEY), MESSAGE_KEY: log.get(MESSAGE_KEY)})
+        timestamps.append(log.get(TIMESTAMP_KEY) or get_timestamp())
+        series.append(log.get(SERIES_KEY))
+        if len(payloads) >= max_lines:
+            break
+    return payloads, timestamps, series
+
+
+@router.post(f"/{{project_id}}/log/import")
+async def import_json_log(
+    project_id: str, file: UploadFile = File(...), run_id: str = Form(..., alias=RUN_ID_KEY)
+):
+    """import logs of a json lines log file(see JsonLogWriter), plain or gzipped, into history of a run"""
+    if not Bridge.has(project_id):
+        raise HTTPException(status_code=404, detail={ERROR_KEY: "project id not found"})
+    bridge = Bridge.of_id(project_id)
+    magic = await file.read(2)
+    await file.seek(0)
+    lines = gzip.open(file.file, "rb") if magic == b"\x1f\x8b" else file.file
+    num_imported = 0
+    while True:  # parse in threads, write in batches by the writer thread of db
+        try:
+            payloads, timestamps, series = await run_in_threadpool(
+                _parse_json_log_lines, lines, 10000
+            )
+        except (ValueError, OSError) as e:
+            error_message = f"failed to parse json log after {num_imported} logs: {e}"
+            logger.debug(error_message)
+            raise HTTPException(status_code=400, detail={ERROR_KEY: error_message})
+        if not payloads:
+            break
+        await bridge.save_json_many_to_history(
+            table_name=LOG_TABLE_NAME,
+            json_datas=payloads,
+            timestamps=timestamps,
+            series=series,
+            run_id=run_id,
+        )
+        num_imported += len(payloads)
+    return {RESULT_KEY: "ok", "imported": num_imported}
+
+
 @router.get(f"/{{project_id}}/hardware")
 async def get_history_hardware_info_of(project_id: str, condition: str):
     return get_history_json_of(
@@ -121,7 +250,7 @@ async def delete_run_id(project_id: str, run_id: str):
     bridge = Bridge.of_id(project_id)
     if bridge.is_online(run_id):  # cannot delete running projects
         raise HTTPException(status_code=400, detail={ERROR_KEY: "can only delete history run id."})
-    bridge.historyDB.delete_run_id(run_id)
+    await bridge.delete_run_id(run_id)
     if 0 == len(bridge.get_run_ids()):  # check if all the run ids are deleted
         del Bridge._id2bridge[project_id]  # delete the empty bridge
     return {RESULT_KEY: "success"}
@@ -133,7 +262,7 @@ async def upload_image(project_id: str, image: UploadFile = File(...), metadata:
         raise HTTPException(status_code=404, detail={ERROR_KEY: "project id not found"})
     message = EventMsg.loads(metadata)
     image_bytes = await image.read()
-    message.id = Bridge.of_id(project_id).save_blob_to_history(
+    message.id = await Bridge.of_id(project_id).save_blob_to_history(
         table_name="image",
         run_id=message.run_id,
         series=message.series,
@@ -147,8 +276,48 @@ async def upload_image(project_id: str, image: UploadFile = File(...), metadata:
     return {RESULT_KEY: "ok", ID_KEY: message.id}
 
 
+def _make_thumbnail(image: bytes, max_edge: int):
+    """downscale encoded image so that its longer edge is no larger than max_edge. returns None if pillow is not installed."""
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    with Image.open(io.BytesIO(image)) as thumbnail:
+        if max(thumbnail.size) <= max_edge:
+            return None
+        thumbnail.thumbnail((max_edge, max_edge))
+        if thumbnail.mode not in ("RGB", "RGBA", "L", "LA"):
+            thumbnail = thumbnail.convert("RGBA")
+        with io.BytesIO() as stream:
+            thumbnail.save(stream, format="WEBP", quality=80)
+            return stream.getvalue()
+
+
+_THUMBNAIL_CACHE_SIZE = 256
+# (blob hash, max edge) : thumbnail, least recently used first
+_thumbnail_cache = collections.OrderedDict()
+_thumbnail_cache_lock = Lock()
+
+
+def _get_thumbnail(image: bytes, max_edge: int):
+    """thumbnail of encoded image made by _make_thumbnail, cached by hash of image(the same hash as in blob store) and max_edge"""
+    key = (hashlib.blake2b(image, digest_size=16).digest(), max_edge)
+    with _thumbnail_cache_lock:
+        if key in _thumbnail_cache:
+            _thumbnail_cache.move_to_end(key)
+            return _thumbnail_cache[key]
+    thumbnail = _make_thumbnail(image, max_edge)
+    with _thumbnail_cache_lock:
+        _thumbnail_cache[key] = thumbnail
+        if len(_thumbnail_cache) > _THUMBNAIL_CACHE_SIZE:
+            _thumbnail_cache.popitem(last=False)
+    return thumbnail
+
+
 @router.get(f"/{{project_id}}/image/{{image_id}}")
-async def get_image_of(project_id: str, image_id: int, meta: Optional[bool] = None):
+async def get_image_of(
+    project_id: str, image_id: int, meta: Optional[bool] = None, thumbnail: Optional[int] = None
+):
     if not Bridge.has(project_id):
         raise HTTPException(status_code=404, detail={ERROR_KEY: "project id not found"})
     # Database logic here
@@ -157,8 +326,16 @@ async def get_image_of(project_id: str, image_id: int, meta: Optional[bool] = No
     )
     if meta:
         return Response(meta_data, media_type="application/json")
-    else:
-        return Response(image, media_type="image/png")
+    if thumbnail and thumbnail > 0:  # fall back to the original image if unable to downscale
+        try:
+            thumbnail_bytes = await run_in_threadpool(_get_thumbnail, image, thumbnail)
+        except Exception as e:
+            logger.warn(f"unable to make thumbnail of image {image_id}: {e}")
+            thumbnail_bytes = None
+        if thumbnail_bytes is not None:
+            return Response(thumbnail_bytes, media_type="image/webp")
+    image_format = json.loads(meta_data or "{}").get("format", "png")
+    return Response(image, media_type=f"image/{image_format}")
 
 
 @router.get(f"/{{project_id}}/image")
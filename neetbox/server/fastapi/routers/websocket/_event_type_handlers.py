@@ -4,13 +4,17 @@
 # Github: github.com/visualDust
 # Date:   20240110
 
+import asyncio
 from collections import defaultdict
+from datetime import datetime
 from typing import Callable
 
 from neetbox._protocol import *
+from neetbox.logging import Logger
 
 from ...._bridge import Bridge
 
+logger = Logger("WS EVENT HANDLER", skip_writers_names=["ws"])
 EVENT_TYPE_HANDLERS = defaultdict(list)
 
 
@@ -22,6 +26,17 @@ def on_event(type_name: str, *args):
     return _on_event
 
 
+def _save_json_to_history(bridge: Bridge, message: EventMsg) -> asyncio.Future:
+    return bridge.save_json_to_history(
+        table_name=message.event_type,
+        json_data=message.payload,
+        series=message.series,
+        run_id=message.run_id,
+        timestamp=message.timestamp,
+        num_row_limit=message.history_len,
+    )
+
+
 async def on_event_type_default_json(
     message: EventMsg,
     forward_to: IdentityType = IdentityType.OTHERS,
@@ -29,14 +44,7 @@ async def on_event_type_default_json(
 ):
     bridge = Bridge.of_id(message.project_id)
     if save_history:
-        message.id = bridge.save_json_to_history(
-            table_name=message.event_type,
-            json_data=message.payload,
-            series=message.series,
-            run_id=message.run_id,
-            timestamp=message.timestamp,
-            num_row_limit=message.history_len,
-        )
+        message.id = await _save_json_to_history(bridge, message)
     if forward_to:
         if forward_to == IdentityType.SELF:
             forward_to = message.who
@@ -50,30 +58,118 @@ async def on_event_type_default_json(
     return  # return after handling log forwardin
 
 
-@on_event(EVENT_TYPE_NAME_STATUS)
-async def on_event_type_status(message: EventMsg):
-    bridge = Bridge.of_id(message.project_id)
-    bridge.set_status(run_id=message.run_id, series=message.series, value=message.payload)
+async def _set_ids(saving: asyncio.Future, messages: list):
+    ids = await saving
+    for _message, id in zip(messages, ids if isinstance(ids, list) else [ids]):
+        _message.id = id
 
 
-@on_event(EVENT_TYPE_NAME_HPARAMS)
-async def on_event_type_hyperparams(message: EventMsg):
-    bridge = Bridge.of_id(message.project_id)
-    current_hyperparams = bridge.get_status(
-        run_id=message.run_id, series=EVENT_TYPE_NAME_HPARAMS
-    )  # get hyper params from status
+def _queue_status(bridge: Bridge, message: EventMsg):
+    return bridge.set_status(run_id=message.run_id, series=message.series, value=message.payload)
+
+
+def _queue_hyperparams(bridge: Bridge, message: EventMsg):
+    current_hyperparams = dict(
+        bridge.get_status(run_id=message.run_id, series=EVENT_TYPE_NAME_HPARAMS)
+    )  # get hyper params from status, copied since it is in the status cache
     if message.series:  # if series of hyperparams specified
         current_hyperparams[message.series] = message.payload
     else:
         for k, v in message.payload.items():
             current_hyperparams[k] = v
-    bridge.set_status(
+    return bridge.set_status(
         run_id=message.run_id, series=EVENT_TYPE_NAME_HPARAMS, value=current_hyperparams
     )
 
 
+def _queue_scalar_chunk(bridge: Bridge, message: EventMsg):
+    """submit a scalar chunk as regular scalars, returns the saving and the scalar messages, of which ids are set once saved"""
+    xs, ys = message.payload["x"], message.payload["y"]
+    timestamps = [
+        get_timestamp(datetime.fromtimestamp(t)) for t in message.payload.get(TIMESTAMP_KEY, [])
+    ] or [message.timestamp] * len(xs)
+    messages = [
+        EventMsg(
+            project_id=message.project_id,
+            run_id=message.run_id,
+            event_type=EVENT_TYPE_NAME_SCALAR,
+            who=message.who,
+            series=message.series,
+            payload={"x": x, "y": y},
+            timestamp=timestamp,
+        )
+        for x, y, timestamp in zip(xs, ys, timestamps)
+    ]
+    saving = bridge.save_json_many_to_history(  # bulk insert as regular scalars
+        table_name=EVENT_TYPE_NAME_SCALAR,
+        json_datas=[_message.payload for _message in messages],
+        timestamps=timestamps,
+        series=message.series,
+        run_id=message.run_id,
+        num_row_limit=message.history_len,
+    )
+    return _set_ids(saving, messages), messages
+
+
+@on_event(EVENT_TYPE_NAME_STATUS)
+async def on_event_type_status(message: EventMsg):
+    await _queue_status(Bridge.of_id(message.project_id), message)
+
+
+@on_event(EVENT_TYPE_NAME_HPARAMS)
+async def on_event_type_hyperparams(message: EventMsg):
+    await _queue_hyperparams(Bridge.of_id(message.project_id), message)
+
+
 @on_event(EVENT_TYPE_NAME_ACTION)
 async def on_event_type_action(message: EventMsg):
     await on_event_type_default_json(
         message=message, forward_to=IdentityType.OTHERS, save_history=False
     )
+
+
+@on_event(EVENT_TYPE_NAME_SCALAR_CHUNK)
+async def on_event_type_scalar_chunk(message: EventMsg):
+    bridge = Bridge.of_id(message.project_id)
+    saving, messages = _queue_scalar_chunk(bridge, message)
+    await saving
+    if messages:
+        await bridge.ws_send_to_frontends(EventMsg.pack(messages))
+
+
+@on_event(EVENT_TYPE_NAME_BATCH)
+async def on_event_type_batch(message: EventMsg):
+    bridge = Bridge.of_id(message.project_id)
+    to_frontends = []  # events from cli are forwarded to frontends in one frame
+    # writes of events from cli, committed in one transaction
+    saving = []
+    others = []  # events handled one by one after the writes are queued
+    with bridge.batch_writes():  # nothing is awaited in it
+        for _message in message.unpack():
+            if _message.project_id != message.project_id or _message.who != message.who:
+                logger.warn(
+                    f"dropping event {_message.event_type} of project '{_message.project_id}' from {_message.who} in a batch of project '{message.project_id}' from {message.who}"
+                )
+                continue
+            if _message.event_type == EVENT_TYPE_NAME_STATUS:
+                saving.append(_queue_status(bridge, _message))
+            elif _message.event_type == EVENT_TYPE_NAME_HPARAMS:
+                saving.append(_queue_hyperparams(bridge, _message))
+            elif _message.event_type == EVENT_TYPE_NAME_SCALAR_CHUNK:
+                _saving, messages = _queue_scalar_chunk(bridge, _message)
+                saving.append(_saving)
+                to_frontends += messages
+            elif _message.event_type in EVENT_TYPE_HANDLERS or _message.who != IdentityType.CLI:
+                others.append(_message)
+            else:
+                saving.append(_set_ids(_save_json_to_history(bridge, _message), [_message]))
+                to_frontends.append(_message)
+    await asyncio.gather(*saving)
+    if to_frontends:
+        await bridge.ws_send_to_frontends(EventMsg.pack(to_frontends))
+    for _message in others:
+        if _message.event_type in EVENT_TYPE_HANDLERS:
+            for handler in EVENT_TYPE_HANDLERS[_message.event_type]:
+                await handler(_message)
+        else:
+            await on_event_type_default_json(message=_message)
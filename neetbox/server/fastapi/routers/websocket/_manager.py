@@ -28,6 +28,7 @@ class WSClient:
     project_id: str
     identity_type: IdentityType
     run_id: str = None
+    codec: CompactCodec = None  # decoder of binary frames if compact wire format negotiated
 
 
 class WSConnectionManager(metaclass=Singleton):
@@ -88,8 +89,17 @@ class WSConnectionManager(metaclass=Singleton):
                 bridge.cli_ws_dict[run_id] = ws_client  # assign cli to bridge
                 self.id2client[id] = ws_client
                 self.ws2client[websocket] = ws_client
+                wire_format = (message.payload or {}).get(WIRE_FORMAT_KEY, WIRE_FORMAT_JSON)
+                if wire_format == WIRE_FORMAT_COMPACT:
+                    ws_client.codec = CompactCodec()
+                else:
+                    wire_format = WIRE_FORMAT_JSON  # fallback to json
                 merge_msg = {
-                    PAYLOAD_KEY: {RESULT_KEY: 200, REASON_KEY: "join success"},
+                    PAYLOAD_KEY: {
+                        RESULT_KEY: 200,
+                        REASON_KEY: "join success",
+                        WIRE_FORMAT_KEY: wire_format,
+                    },
                     WHO_KEY: IdentityType.SERVER,
                 }  # handshake 200
             else:  # run id already exist
@@ -20,9 +20,18 @@ async def websocket_endpoint(websocket: WebSocket):
     ws_client = await manager.handshake(websocket)
     try:
         while True:
-            message = await websocket.receive_text()
+            frame = await websocket.receive()
+            if frame["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(frame.get("code", 1000))
+            message = frame.get("text") if frame.get("bytes") is None else frame["bytes"]
             try:  # parse event message
-                message = EventMsg.loads(message)
+                if isinstance(message, bytes):  # compact binary frame
+                    messages = ws_client.codec.loads(message)
+                    if not messages:
+                        continue
+                    message = messages[0] if len(messages) == 1 else EventMsg.pack(messages)
+                else:
+                    message = EventMsg.loads(message)
             except Exception as e:
                 logger.err(
                     f"Illegal message format from client    {ws_client.id}: {message}, failed to parse cause {e}, dropping..."
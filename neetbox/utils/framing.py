@@ -5,8 +5,9 @@
 # Date:   20230319
 
 import inspect
+import sys
 import types
-from dataclasses import dataclass
+import weakref
 from os import path
 from typing import Union
 
@@ -17,61 +18,106 @@ def get_frame_traceback(stack_offset=1):
     return stack[stack_offset]
 
 
+def _get_frame(stack_offset=1):
+    """get the frame stack_offset levels above the caller without walking the whole stack. returns the outermost frame if the stack is not that deep."""
+    try:
+        return sys._getframe(stack_offset + 1)
+    except ValueError:
+        frame = sys._getframe(1)
+        while frame.f_back is not None:
+            frame = frame.f_back
+        return frame
+
+
 def get_frame_func_name_traceback(stack_offset=1):
-    frame = get_frame_traceback(stack_offset + 1)
-    func = frame.function
+    func = _get_frame(stack_offset).f_code.co_name
     return None if func == "<module>" else func
 
 
 def get_frame_class_traceback(stack_offset=1):
-    frame = get_frame_traceback(stack_offset + 1)
-    _locals = frame[0].f_locals
+    _locals = _get_frame(stack_offset).f_locals
     if "self" in _locals:
         return _locals["self"].__class__
     return None
 
 
 def get_frame_module_traceback(stack_offset=1) -> Union[types.ModuleType, None]:
-    frame = get_frame_traceback(stack_offset + 1)
-    module = inspect.getmodule(frame[0])
+    frame = _get_frame(stack_offset)
+    module = sys.modules.get(frame.f_globals.get("__name__"))
     return module
 
 
 def get_frame_filepath_traceback(stack_offset=1):
-    frame = get_frame_traceback(stack_offset + 1)
-    return frame.filename
+    return _get_frame(stack_offset).f_code.co_filename
+
+
+class _CodeIdentity:
+    """things about a code object which never change, shared by all the frames running it"""
+
+    __slots__ = ("func_name", "module_name", "filepath", "filename", "may_have_self")
+
+    def __init__(self, code: types.CodeType, module_name: str):
+        self.func_name = code.co_name if code.co_name != "<module>" else None
+        self.module_name = module_name
+        self.filepath = path.abspath(code.co_filename)
+        self.filename = path.basename(code.co_filename)
+        # only look into locals of frames which may have 'self'
+        self.may_have_self = "self" in code.co_varnames or "self" in code.co_freevars
+
+
+# entries go away with their code objects, such as code run by exec and code of reloaded modules
+_CODE2IDENTITY = weakref.WeakKeyDictionary()
 
 
-@dataclass
 class TracebackIdentity:
-    frame = None
-    lineno: int = None
-    func_name: str = None
-    locals = None
-    class_obj = None
-    class_name: str = None
-    module = None
-    module_name: str = None
-    filepath: str = None
-    filename: str = None
+    """identity of a frame. only the line number, the class of 'self' and names memoized per code object are kept, so the frame(and its locals) is not kept alive."""
+
+    __slots__ = ("_code_identity", "lineno", "class_obj")
+
+    def __init__(self, code_identity: _CodeIdentity, lineno: int = None, class_obj=None):
+        self._code_identity = code_identity
+        self.lineno = lineno
+        self.class_obj = class_obj
 
     @classmethod
     def parse(cls, frame) -> "TracebackIdentity":
-        stacktrace = TracebackIdentity()
-        stacktrace.frame = frame
-        stacktrace.lineno = frame.lineno
-        stacktrace.func_name = frame.function if frame.function != "<module>" else None
-        stacktrace.locals = frame[0].f_locals
-        if "self" in stacktrace.locals:
-            stacktrace.class_obj = stacktrace.locals["self"].__class__
-            if stacktrace.class_obj:
-                stacktrace.class_name = stacktrace.class_obj.__name__
-        module: Union[types.ModuleType, None] = inspect.getmodule(frame[0])
-        stacktrace.module = module
-        stacktrace.module_name = module.__name__ if module else None
-        stacktrace.filepath = path.abspath(frame.filename)
-        stacktrace.filename = path.basename(frame.filename)
-        return stacktrace
+        if isinstance(frame, inspect.FrameInfo):
+            frame = frame.frame
+        code = frame.f_code
+        code_identity = _CODE2IDENTITY.get(code)
+        if code_identity is None:
+            code_identity = _CODE2IDENTITY[code] = _CodeIdentity(
+                code, frame.f_globals.get("__name__")
+            )
+        class_obj = None
+        if code_identity.may_have_self:
+            _self = frame.f_locals.get("self")
+            class_obj = _self.__class__ if _self is not None else None
+        return TracebackIdentity(code_identity, frame.f_lineno, class_obj)
+
+    @property
+    def func_name(self) -> str:
+        return self._code_identity.func_name
+
+    @property
+    def class_name(self) -> str:
+        return self.class_obj.__name__ if self.class_obj else None
+
+    @property
+    def module_name(self) -> str:
+        return self._code_identity.module_name
+
+    @property
+    def module(self) -> Union[types.ModuleType, None]:
+        return sys.modules.get(self._code_identity.module_name)
+
+    @property
+    def filepath(self) -> str:
+        return self._code_identity.filepath
+
+    @property
+    def filename(self) -> str:
+        return self._code_identity.filename
 
     @property
     def last_describable(self):
@@ -131,5 +177,5 @@ class TracebackIdentity:
 
 
 def get_caller_identity_traceback(stack_offset=1):
-    frame = get_frame_traceback(stack_offset + 1)
+    frame = _get_frame(stack_offset)
     return TracebackIdentity.parse(frame)
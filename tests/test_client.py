@@ -0,0 +1,144 @@
+def test_scalar_downsample():
+    import numpy as np
+
+    from neetbox.client.apis._downsample import (
+        ScalarPolicy,
+        limit_rate,
+        lttb,
+        reduce_every,
+    )
+
+    xs = np.arange(10.0)
+    ys = np.array([3, 1, 2, 5, 4, 0, 9, 8, 7, 6.0])
+    ts = xs / 100
+    _xs, _ys, _ = reduce_every(xs, ys, ts, k=3, by="mean")
+    assert _xs.tolist() == [2, 5, 8, 9] and _ys.tolist() == [2, 3, 8, 6]
+    _xs, _ys, _ = reduce_every(xs, ys, ts, k=3, by="min")
+    assert _xs.tolist() == [1, 5, 8, 9] and _ys.tolist() == [1, 0, 7, 6]
+
+    keep, last_bucket = limit_rate(np.array([0.01, 0.02, 0.11, 0.15, 0.31]), max_rate=10)
+    assert keep.tolist() == [False, True, False, True, True] and last_bucket == 3
+
+    xs = np.arange(1000.0)
+    picked = lttb(xs, np.sin(xs / 50), n_out=50)
+    assert len(picked) == 50 and picked[0] == 0 and picked[-1] == 999
+    assert np.all(np.diff(picked) > 0)
+
+    policy = ScalarPolicy.of_series("train/loss", {"train/*": {"maxRate": 5, "reduceBy": "max"}})
+    assert policy == ScalarPolicy(max_rate=5, reduce_by="max")
+
+
+def test_scalar_int_x(monkeypatch):
+    import numpy as np
+
+    from neetbox.client.apis._scalar import scalarBuffer
+
+    sent = []
+    monkeypatch.setattr(scalarBuffer, "_series", {})
+    monkeypatch.setattr(scalarBuffer, "_flush_size", 2)
+    monkeypatch.setattr(scalarBuffer, "_send", lambda name, chunk: sent.append(chunk))
+    scalarBuffer.append("int-x", 2**53 + 1, 0.5)
+    scalarBuffer.append("int-x", np.int64(2**62), 0.5)  # numpy ints are ints as well
+    scalarBuffer.append("int-x", 1, 0.5)
+    scalarBuffer.append("int-x", 1.5, 0.5)
+    assert sent[0]["x"] == [2**53 + 1, 2**62] and type(sent[0]["x"][0]) is int
+    assert sent[1]["x"] == [1.0, 1.5]
+
+
+def test_image_encode():
+    import cv2
+    import numpy as np
+
+    from neetbox.client.apis._image import _encode_image, convert_to_HWC, make_grid
+
+    images = np.random.rand(5, 3, 4, 6)
+    grid = make_grid(images, ncols=2)
+    assert grid.shape == (3, 12, 12)
+    assert np.array_equal(grid[:, 4:8, 6:12], images[3]) and not grid[:, 8:, 6:].any()
+
+    gray = convert_to_HWC(np.random.rand(2, 8, 8), "NHW")
+    assert gray.shape == (8, 16, 1)
+    decoded = cv2.imdecode(np.frombuffer(_encode_image(gray, "HWC"), np.uint8), -1)
+    assert decoded.shape == (8, 16)  # grayscale
+
+    image = (np.random.rand(3, 64, 128) * 255).astype(np.uint8)
+    for format in ("png", "jpeg", "webp"):
+        encoded = _encode_image(image, "CHW", format=format, quality=50, max_edge=32)
+        assert cv2.imdecode(np.frombuffer(encoded, np.uint8), -1).shape == (16, 32, 3)
+
+
+def test_image_uploader_config(monkeypatch):
+    import pytest
+
+    from neetbox.client.apis import _image
+    from neetbox.client.apis._image import ImageUploader
+
+    config = {"workers": 0, "queueSize": 1, "overflow": "block", "format": "png"}
+    config.update(quality=90, pngCompression=3, maxEdge=None)
+    monkeypatch.setattr(_image, "get_module_level_config", lambda: {"image": config})
+    uploader = object.__new__(ImageUploader)  # not the singleton
+    uploader.__init__()
+    for overflow in ("drop-all", "block"):  # bad policy, then no workers
+        config["overflow"] = overflow
+        for _ in range(2):  # still checked on the next put
+            with pytest.raises(ValueError):
+                uploader.put("image", None)
+    assert uploader._queue_size is None and uploader._overflow is None
+
+
+def test_progress_throttle(monkeypatch):
+    from neetbox.client import progress
+    from neetbox.client._client import connection
+
+    sent = []
+    monkeypatch.setattr(connection, "ws_send", lambda **kwargs: sent.append(kwargs["payload"]))
+    items = list(progress(100000, name="throttled", max_rate=5, traceback=False))
+    assert len(items) == 100000
+    assert 2 <= len(sent) < 100 and sent[-1]["step"] == 100000
+    with progress(range(10), name="break", traceback=False) as p:
+        for i in p:
+            if i == 3:
+                break
+    assert sent[-1]["step"] == 4 and sent[-1]["total"] == 10
+    sent.clear()
+    list(progress(10, name="unlimited", max_rate=0, traceback=False))  # 0 is not the default
+    assert [payload["step"] for payload in sent] == list(range(1, 11))
+
+
+def test_fork_multiplexer():
+    import os
+    import time
+
+    import pytest
+
+    from neetbox.client._fork import ForkMultiplexer, send_frame
+
+    if not hasattr(os, "fork"):
+        pytest.skip("fork is not supported")
+    received = []
+    mux = ForkMultiplexer(received.extend)
+    pids = []
+    for i in range(3):
+        mux.before_fork()
+        pid = os.fork()
+        if pid == 0:  # child
+            upstream = mux.after_fork_in_child()
+            for j in range(100):
+                send_frame(upstream, f"{i}-{j}".encode() * (j + 1))
+            os._exit(0)
+        mux.after_fork_in_parent()
+        pids.append(pid)
+    for pid in pids:
+        os.waitpid(pid, 0)
+    for _ in range(50):
+        if len(received) == 300:
+            break
+        time.sleep(0.1)
+    assert sorted(received) == sorted(
+        f"{i}-{j}".encode() * (j + 1) for i in range(3) for j in range(100)
+    )
+    for _ in range(50):  # ends of exited children are closed
+        if not mux._buffers:
+            break
+        time.sleep(0.1)
+    assert not mux._buffers
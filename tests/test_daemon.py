@@ -19,3 +19,67 @@ def test_neet_action():
     actionManager.eval_call("some_func", params={"a": "3", "b": "4"}, callback=callback_fun)
     print("you should see this line first before callback_fun print")
     time.sleep(0.2)
+
+
+def test_event_msg_batch():
+    from neetbox._protocol import (
+        EVENT_TYPE_NAME_BATCH,
+        EVENT_TYPE_NAME_SCALAR,
+        EventMsg,
+    )
+
+    messages = [
+        EventMsg(
+            project_id="project",
+            run_id="run",
+            event_type=EVENT_TYPE_NAME_SCALAR,
+            series="loss",
+            payload={"x": i, "y": i * 0.5},
+        )
+        for i in range(3)
+    ]
+    batch = EventMsg.loads(EventMsg.pack(messages).dumps())
+    assert batch.event_type == EVENT_TYPE_NAME_BATCH
+    unpacked = batch.unpack()
+    assert [m.payload for m in unpacked] == [m.payload for m in messages]
+    assert all(m.run_id == "run" for m in unpacked)
+    assert messages[0].unpack() == [messages[0]]
+
+
+def test_compact_codec():
+    from neetbox._protocol import CompactCodec, EventMsg, IdentityType
+
+    messages = [
+        EventMsg(
+            project_id="project",
+            run_id="run",
+            event_type="scalar",
+            series="loss",
+            who=IdentityType.CLI,
+            payload={"x": i, "y": i * 0.5},
+        )
+        for i in range(3)
+    ]
+    messages.append(
+        EventMsg(project_id="project", run_id="run", event_type="log", payload={"message": "hi"})
+    )
+    messages.append(
+        EventMsg(
+            project_id="project",
+            run_id="run",
+            event_type="scalarChunk",
+            payload={"x": [1, 2, 3], "y": [0.5, 0.25, 0.125]},
+        )
+    )
+    for payload in [  # columns that would not come back the same if packed
+        {"flags": [True, False], "y": [0.5, 1.0]},
+        {"mixed": [1, 0.5]},
+        {"big": [2**63, 1]},
+    ]:
+        messages.append(
+            EventMsg(project_id="project", run_id="run", event_type="custom", payload=payload)
+        )
+    encoder, decoder = CompactCodec(), CompactCodec()
+    for _ in range(2):  # the second frame references strings defined in the first one
+        decoded = decoder.loads(encoder.dumps(messages))
+        assert [m.json for m in decoded] == [m.json for m in messages]
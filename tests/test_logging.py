@@ -14,11 +14,11 @@ def test_default_logger():
     a()
 
 
-def test_logger_with_specific_identity():
+def test_logger_with_specific_identity(tmp_path):
     from neetbox.logging import Logger, logger
 
     logger = Logger("someone")
-    logger.set_log_dir("./logs")
+    logger.set_log_dir(str(tmp_path))
     logger.log("someone said 1")
 
     def b():
@@ -48,3 +48,286 @@ def test_logger_mention():
 
     print_some_str("???")
     print(print_some_str.__name__)
+
+
+def test_caller_identity():
+    import gc
+    import weakref
+
+    from neetbox.logging import Logger
+
+    logs = []
+    logger = Logger("identity")
+    logger.writer("collect")(writer_func=logs.append)
+
+    class Local:
+        pass
+
+    class C:
+        def c(self):
+            local = Local()
+            logger.log("from c", skip_writers_names=["stdout", "ws"])
+            return weakref.ref(local)
+
+    local_ref = C().c()
+    identity = logs[-1].caller_identity
+    assert identity.format(r"%m/%c/%f") == f"{__name__}/C/c"
+    assert identity.filename == "test_logging.py" and identity.module.__name__ == __name__
+    assert local_ref() is None  # logs do not keep frames alive
+
+    from neetbox.utils.framing import _CODE2IDENTITY, TracebackIdentity
+
+    namespace = {}
+    exec("import sys\ndef f():\n    return sys._getframe()", namespace)
+    TracebackIdentity.parse(namespace["f"]())
+    code_ref = weakref.ref(namespace["f"].__code__)
+    assert code_ref() in _CODE2IDENTITY
+    del namespace
+    gc.collect()
+    assert code_ref() is None  # memo does not keep code of exec alive
+
+
+def test_async_logging():
+    import threading
+    import time
+
+    from neetbox.logging import Logger
+    from neetbox.logging._logger import DEFAULT_LOGGER
+
+    written, reports = [], []
+    gate = threading.Event()
+    logger = Logger("async")
+    DEFAULT_LOGGER.writer("collect")(lambda log: reports.append(log.message))
+
+    @logger.writer("slow")
+    def slow_writer(log):
+        gate.wait()
+        written.append(log.message)
+
+    dispatcher = Logger.set_async(queue_size=10, batch_size=4)
+    try:
+        t0 = time.perf_counter()
+        for i in range(50):
+            logger.log(i, skip_writers_names=["stdout", "ws"])
+        assert time.perf_counter() - t0 < 1  # not blocked by the slow writer
+        gate.set()
+        assert Logger.flush(timeout=5)
+        assert dispatcher.num_dropped > 0
+        # reported by the default logger, not the logger which happens to be in the batch
+        assert reports == [f"{dispatcher.num_dropped} logs dropped because log queue is full"]
+        kept = [int(m) for m in written]
+        assert kept[0] == 0 and kept == sorted(kept) and len(kept) == 50 - dispatcher.num_dropped
+    finally:
+        Logger.set_async(False)
+        logger.private_writers.pop("slow")
+        DEFAULT_LOGGER.private_writers.pop("collect")
+
+
+def test_log_level_gating():
+    from neetbox.logging import Lazy, Logger, LogLevel
+
+    written = []
+    logger = Logger("gating", log_level=LogLevel.INFO)
+    logger.writer("collect")(written.append)
+
+    made = []
+    skip = ["stdout", "ws"]
+    logger.debug(Lazy(made.append, 1), skip_writers_names=skip)
+    logger.info("loss %.2f", args=(0.123,), skip_writers_names=skip)
+    logger.warn(Lazy(lambda: "lazy"), "warning", skip_writers_names=skip)
+    assert not made and [log.message for log in written] == ["loss 0.12 ", "lazy warning "]
+
+    Logger.set_writer_level("collect", "WARNING")
+    try:
+        logger.log_level = LogLevel.DEBUG
+        logger.debug("debug", skip_writers_names=skip)
+        logger.err("error", skip_writers_names=skip)
+        assert [log.series for log in written[2:]] == ["error"]
+        # no writer takes it
+        logger.debug(Lazy(made.append, 1), skip_writers_names=skip)
+        assert not made
+
+        def named():
+            return "named"
+
+        # only Lazy content is called, other callables are logged as they are
+        logger.warn(Lazy(named), named, skip_writers_names=skip)
+        assert written[-1].message == f"named {named} "
+    finally:
+        Logger.set_writer_level("collect", None)
+        logger.private_writers.pop("collect")
+
+
+def test_file_log_writer(tmp_path):
+    import gzip
+    import time
+    from datetime import datetime, timedelta
+
+    from neetbox.logging import Logger
+    from neetbox.logging.writers import FileLogWriter
+
+    logger = Logger("file writer")
+    logger.set_log_dir(str(tmp_path), max_bytes=4096, buffer_size=512, index_every=0)
+    for i in range(200):
+        logger.log(f"line {i:04d}", skip_writers_names=["stdout", "ws"])
+    (writer,) = [w for p, w in FileLogWriter.PATH2WRITER.items() if p.startswith(str(tmp_path))]
+    writer.close()
+    for _ in range(50):  # wait for background compression
+        segments = sorted(str(p) for p in tmp_path.glob("*.log.gz"))
+        pending = list(tmp_path.glob("*.gz.tmp")) + list(tmp_path.glob("*.*.log"))
+        if segments and not pending:
+            break
+        time.sleep(0.1)
+    assert segments and not [p for p in tmp_path.glob("*.*.log")]  # rotated segments are gzipped
+    lines = []
+    for segment in segments + [writer.path]:
+        with gzip.open(segment) if segment.endswith(".gz") else open(segment, "rb") as f:
+            lines += f.read().decode().splitlines()
+    assert [line.split()[-1] for line in lines] == [f"{i:04d}" for i in range(200)]
+
+    since = datetime.now() + timedelta(seconds=1)
+    with FileLogWriter.open_since(writer.path, since) as f:
+        last_chunk = f.read().decode().splitlines()
+    assert 0 < len(last_chunk) < len(lines) and last_chunk[-1].rstrip().endswith("0199")
+
+
+def test_file_log_writer_fork(tmp_path):
+    import multiprocessing
+    import os
+
+    import pytest
+
+    from neetbox.logging import Logger
+    from neetbox.logging.writers import FileLogWriter
+
+    if not hasattr(os, "register_at_fork"):
+        pytest.skip("no fork on this platform")
+    logger = Logger("file writer fork")
+    options = dict(buffer_size=1 << 20, flush_interval=60, index_every=0)
+    logger.set_log_dir(str(tmp_path), **options)
+    logger.log("before fork", skip_writers_names=["stdout", "ws"])
+    child = multiprocessing.get_context("fork").Process(
+        target=lambda: logger.log("from child", skip_writers_names=["stdout", "ws"])
+    )
+    child.start()
+    child.join()
+    (path,) = [p for p in FileLogWriter.PATH2WRITER if p.startswith(str(tmp_path))]
+    writer = FileLogWriter.PATH2WRITER[path]
+    with pytest.raises(ValueError):  # options of an existing writer can not be changed
+        FileLogWriter(path, max_bytes=1)
+    writer.close()
+    with open(path) as f:
+        lines = f.read().splitlines()
+    # lines before fork are written once, lines of the child are written at its exit
+    assert [line.rstrip().split(" ")[-1] for line in lines] == ["fork", "child"]
+
+
+def test_stdout_log_writer(monkeypatch):
+    import io
+    import sys
+
+    import pytest
+
+    from neetbox.logging import RawLog
+    from neetbox.logging.writers import StdoutLogWriter
+    from neetbox.utils.framing import get_caller_identity_traceback
+
+    class Terminal(io.StringIO):
+        def isatty(self):
+            return True
+
+    log = RawLog(
+        message="hello",
+        caller_identity=get_caller_identity_traceback(),
+        caller_identity_alias="stdout test",
+        series="warning",
+    )
+    monkeypatch.delenv("NO_COLOR", raising=False)
+
+    def written(mode, stdout):
+        monkeypatch.setattr(sys, "stdout", stdout)
+        StdoutLogWriter(mode)(log)
+        return stdout.getvalue()
+
+    plain = written("plain", Terminal())
+    assert "\x1b[" not in plain and plain.startswith("stdout test > hello [warning] ")
+    ansi = written("ansi", io.StringIO())
+    assert "\x1b[" in ansi and "hello" in ansi
+    assert "\x1b[" in written("auto", Terminal())  # ansi on terminals
+    assert "\x1b[" not in written("auto", io.StringIO())  # plain if redirected
+    monkeypatch.setenv("NO_COLOR", "1")
+    assert "\x1b[" not in written("auto", Terminal())
+    monkeypatch.delenv("NO_COLOR")
+    assert "hello" in written("rich", io.StringIO())
+    monkeypatch.setitem(sys.modules, "rich.console", None)  # rich is not installed
+    assert "\x1b[" in written("rich", Terminal())  # falls back to auto
+    assert "\x1b[" not in written("rich", io.StringIO())
+    with pytest.raises(ValueError):
+        StdoutLogWriter("colorful")
+
+
+def test_json_log_writer(tmp_path):
+    from datetime import datetime, timedelta
+
+    from neetbox.logging import Logger, RawLog
+    from neetbox.logging.writers import JsonLogWriter, LogWriters, set_json_log_file
+    from neetbox.utils.framing import get_caller_identity_traceback
+
+    path = str(tmp_path / "log.jsonl")
+    writer = set_json_log_file(path, buffer_size=256, compress=False)
+    try:
+        Logger("json writer").info("through the global writer")
+    finally:
+        LogWriters.pop("json")
+    start = datetime(2024, 1, 20, 12)
+    identity = get_caller_identity_traceback()
+    for i in range(300):  # one error every 10 seconds, infos in between
+        writer.write(
+            RawLog(
+                message=f"log {i}",
+                caller_identity=identity,
+                timestamp=start + timedelta(seconds=i),
+                series="error" if i % 10 == 0 else "info",
+            )
+        )
+    writer.close()
+
+    logs = list(JsonLogWriter.read(path))
+    assert len(logs) == 301 and logs[0]["message"].startswith("through the global writer")
+    assert logs[1]["caller"]["func"] == "test_json_log_writer" and logs[1]["whom"]
+    since, until = start + timedelta(seconds=100), start + timedelta(seconds=199)
+    errors = list(JsonLogWriter.read(path, since=since, until=until, series="error"))
+    assert [log["message"] for log in errors] == [f"log {i}" for i in range(100, 200, 10)]
+    # chunks out of the time range are skipped by the index
+    chunks = JsonLogWriter._chunks_of(path)
+    in_range = [c for c in chunks if c[1] >= since.timestamp() and c[0] <= until.timestamp()]
+    assert len(chunks) > 10 and len(in_range) < len(chunks) / 2
+
+
+def test_repeat_limit():
+    import time
+
+    from neetbox.logging import Logger
+
+    logger = Logger("repeat limit")
+    written = []
+    logger.writer("collect")(written.append)
+    for i in range(10):  # not limited by default
+        logger.err("failed", skip_writers_names=["stdout", "ws"])
+    assert len(written) == 10
+    written.clear()
+    Logger.set_repeat_limit(max_repeats=3, window=0.2)
+    try:
+        for i in range(10):
+            logger.info("step %d done", args=(i,), skip_writers_names=["stdout", "ws"])
+            logger.info(f"distinct {i}", skip_writers_names=["stdout", "ws"])
+        assert len(written) == 3 + 10
+        time.sleep(0.3)  # the window passed, the summary goes out with the next log
+        logger.info("another", skip_writers_names=["stdout", "ws"])
+        assert written[-2].message.startswith("step 9 done (repeated 7 more times)")
+        assert written[-1].message.startswith("another")
+        logger.info("step %d done", args=(10,), skip_writers_names=["stdout", "ws"])
+        assert written[-1].message.startswith("step 10 done")  # let through again
+    finally:
+        Logger.set_repeat_limit(None)
+        logger.private_writers.pop("collect")
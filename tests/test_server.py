@@ -0,0 +1,414 @@
+def test_blob_dedup(tmp_path):
+    from neetbox._protocol import BLOB_TABLE_NAME
+    from neetbox.server.db import QueryCondition
+    from neetbox.server.db.project import ProjectDB
+
+    db = ProjectDB(project_id="test-blob-dedup", path=str(tmp_path / "test.projectdb"))
+    try:
+        count_blobs = lambda: db._query(f"SELECT count(*) FROM {BLOB_TABLE_NAME}")[0][0][0]
+        same, other = b"same image" * 100, b"other image"
+        ids = [db.write_blob("image", {}, same, series="a", run_id="run1") for _ in range(3)]
+        db.write_blob("image", {}, same, series="a", run_id="run2")
+        db.write_blob("image", {}, other, series="b", run_id="run2")
+        assert count_blobs() == 2
+        [(_, _, _, data)] = db.read_blob("image", QueryCondition(id=ids[1]))
+        assert data == same
+        # limiting rows of run2 series b drops nothing, run1 loses 2 of 3 rows
+        db.do_limit_num_row_for("image", run_id=db.get_id_of_run_id("run1"), num_row_limit=1)
+        assert len(db.read_blob("image", meta_only=True)) == 3 and count_blobs() == 2
+        db.delete_run_id("run2")  # cascade, 'other' loses its last reference
+        assert count_blobs() == 1
+        db.delete_run_id("run1")
+        assert count_blobs() == 0
+    finally:
+        db.delete_files()
+
+
+def test_blob_table_migration(tmp_path):
+    import sqlite3
+
+    from neetbox.server.db.project import ProjectDB
+
+    path = str(tmp_path / "test.projectdb")
+    with sqlite3.connect(path) as connection:  # blob table of older version, data inline
+        connection.execute(
+            "CREATE TABLE image ( id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp TEXT NON NULL, series TEXT, runid INTEGER, metadata TEXT, data BLOB)"
+        )
+        connection.execute("INSERT INTO image(timestamp, metadata, data) VALUES ('t', '{}', x'01')")
+    connection.close()
+    db = ProjectDB(project_id="test-blob-migration", path=path)  # migrated when opened
+    try:
+        queries = []
+        db._connection.set_trace_callback(queries.append)
+        assert [row[-1] for row in db.read_blob("image")] == [b"\x01"]
+        assert all(query.lstrip().upper().startswith("SELECT") for query in queries)
+        db._connection.set_trace_callback(None)
+        new_id = db.write_blob("image", {}, b"\x02")
+        assert db.read_blob("image")[-1][0] == new_id and db.read_blob("image")[-1][-1] == b"\x02"
+    finally:
+        db._connection.set_trace_callback(None)
+        db.delete_files()
+
+
+def test_write_json_many_of_series(tmp_path):
+    from neetbox.server.db import QueryCondition
+    from neetbox.server.db.project import ProjectDB
+
+    db = ProjectDB(project_id="test-json-many", path=str(tmp_path / "test.projectdb"))
+    try:
+        series = ["info", "error", "info", "info"]
+        ids = db.write_json_many(
+            "log", [{"message": i} for i in range(4)], ["t"] * 4, series=series, run_id="run1"
+        )
+        rows = db.read_json("log", QueryCondition(run_id="run1"))
+        assert [row["id"] for row in rows] == ids
+        assert [row["series"] for row in rows] == series
+        db.write_json_many(
+            "log", [{}] * 3, ["t"] * 3, series="error", run_id="run1", num_row_limit=2
+        )
+        assert db.get_series_of_table("log") and len(db.read_json("log")) == 5  # info 3, error 2
+    finally:
+        db.delete_files()
+
+
+def test_log_search(tmp_path):
+    from neetbox.server.db.project import ProjectDB
+
+    db = ProjectDB(project_id="test-log-search", path=str(tmp_path / "test.projectdb"))
+    try:
+        messages = [f"step {i} loss 0.{i}" for i in range(20)]
+        messages[7] = "KeyError: 'lr' in optimizer"
+        messages[13] = "caught KeyError: 'lr' again, KeyError twice"
+        db.write_json_many(
+            "log", [{"whom": "trainer", "message": m} for m in messages], ["t"] * 20, run_id="run1"
+        )
+        db.write_json("log", {"whom": "evaluator", "message": "KeyError: 'acc'"}, run_id="run2")
+        results, cursor = db.search_log("KeyError: 'lr'")
+        assert [r["metadata"]["message"] for r in results] == [messages[13], messages[7]]
+        assert "<mark>KeyError</mark>" in results[0]["snippet"] and cursor is None
+        # pages of one result
+        pages, cursor = [], None
+        while True:
+            results, cursor = db.search_log("KeyError", limit=1, cursor=cursor)
+            pages += [r["id"] for r in results]
+            if cursor is None:
+                break
+        assert len(pages) == len(set(pages)) == 3
+        assert [r["runId"] for r in db.search_log("KeyError", order="recent")[0]] == [
+            "run2",
+            "run1",
+            "run1",
+        ]
+        assert len(db.search_log("evaluator", run_id="run1")[0]) == 0
+        db.delete_run_id("run2")  # index follows deletes by cascade
+        assert len(db.search_log("KeyError")[0]) == 2
+    finally:
+        db.delete_files()
+
+
+def test_log_without_search(tmp_path, monkeypatch):
+    import pytest
+
+    from neetbox._protocol import LOG_SEARCH_TABLE_NAME
+    from neetbox.server.db.project import ProjectDB
+
+    monkeypatch.setattr(ProjectDB, "_log_search_supported", False)  # sqlite without fts5
+    db = ProjectDB(project_id="test-log-no-search", path=str(tmp_path / "test.projectdb"))
+    try:
+        db.write_json("log", {"message": "still written", "whom": "trainer"}, run_id="run1")
+        db.write_json_many("log", [{"message": "many"}] * 2, ["t"] * 2, run_id="run1")
+        assert len(db.read_json("log")) == 3 and not db.table_exist(LOG_SEARCH_TABLE_NAME)
+        with pytest.raises(NotImplementedError):
+            db.search_log("written")
+    finally:
+        db.delete_files()
+
+
+def test_read_json_stream(tmp_path, monkeypatch):
+    import gc
+    import json
+    import sqlite3
+
+    import pytest
+
+    from neetbox.server.db import QueryCondition
+    from neetbox.server.db.project import ProjectDB
+
+    db = ProjectDB(project_id="test-json-stream", path=str(tmp_path / "test.projectdb"))
+    try:
+        assert "".join(db.read_json_stream("scalar")) == "[]"  # no table yet
+        payloads = [{"value": i, "text": 'a "quoted" 中文'} for i in range(10)]
+        db.write_json_many("scalar", payloads, [f"t{i}" for i in range(10)], run_id="run1")
+        db.write_json("scalar", {}, series="empty", run_id="run1")
+        stream = db.read_json_stream("scalar", QueryCondition(run_id="run1"), batch_size=3)
+        assert json.loads("".join(stream)) == db.read_json("scalar", QueryCondition(run_id="run1"))
+        # keyset pages, ascending and descending by id
+        page = db.read_json("scalar", QueryCondition(limit=4))
+        next_page = db.read_json("scalar", QueryCondition(limit=4, after_id=page[-1]["id"]))
+        assert [row["metadata"]["value"] for row in page + next_page] == list(range(8))
+        condition = QueryCondition.from_json({"afterId": 5, "order": {"id": "DESC"}})
+        assert [row["id"] for row in db.read_json("scalar", condition)] == [4, 3, 2, 1]
+        with pytest.raises(ValueError):  # pages go by id, not by other columns
+            QueryCondition.from_json({"afterId": 5, "order": {"timestamp": "DESC"}})
+        # connections of streams are closed however the streams end
+        connections, connect = [], sqlite3.connect
+        monkeypatch.setattr(
+            sqlite3,
+            "connect",
+            lambda *a, **kw: connections.append(connect(*a, **kw)) or connections[-1],
+        )
+        stream = db.read_json_stream("scalar", batch_size=3)
+        next(stream)
+        stream.close()  # closed before finished
+        stream = db.read_json_stream("scalar")
+        del stream  # never started
+        gc.collect()
+        assert len(connections) == 2
+        for connection in connections:
+            with pytest.raises(sqlite3.ProgrammingError):
+                connection.execute("SELECT 1")
+    finally:
+        db.delete_files()
+
+
+def test_group_commit_writer(tmp_path):
+    from concurrent.futures import ThreadPoolExecutor
+
+    from neetbox.server.db.project import ProjectDB
+
+    db = ProjectDB(project_id="test-group-commit", path=str(tmp_path / "test.projectdb"))
+    try:
+        submit_row = lambda i: db.submit(db.write_json, "scalar", {"x": i}, run_id="run1")
+        with ThreadPoolExecutor(8) as pool:
+            futures = list(pool.map(submit_row, range(200)))
+        failed = db.submit(db.write_json, "scalar", "not json", run_id="run1")
+        futures.append(submit_row(200))
+        ids = [future.result(timeout=10) for future in futures]
+        assert len(set(ids)) == 201
+        assert isinstance(failed.exception(timeout=10), ValueError)
+        # committed rows are seen by the connection of readers
+        rows = db.read_json("scalar")
+        assert sorted(row["metadata"]["x"] for row in rows) == list(range(201))
+        assert db.submit(db.set_status, "run1", "config", {"name": "a"}).result(timeout=10)
+        assert db.get_status("run1") == {"run1": {"config": {"name": "a"}}}
+    finally:
+        db.delete_files()
+
+
+def test_run_id_cache(tmp_path):
+    import pytest
+
+    from neetbox.server.db.project import ProjectDB
+
+    db = ProjectDB(project_id="test-run-id-cache", path=str(tmp_path / "test.projectdb"))
+    try:
+        db.write_json("log", {"message": "a"}, run_id="run1")
+        id1 = db.get_id_of_run_id("run1")
+        assert id1 is not None and db.get_run_id_of_id(id1) == "run1"
+        # a run id inserted by a rolled back write is forgotten
+        with pytest.raises(RuntimeError):
+            with db.transaction():
+                db.fetch_id_of_run_id("run2")
+                raise RuntimeError()
+        assert db.get_id_of_run_id("run2") is None
+        failing = lambda: db.fetch_id_of_run_id("run3") and db.write_json("log", "not json")
+        assert db.submit(failing).exception(timeout=10) is not None
+        assert db.get_id_of_run_id("run3") is None
+        db.set_status("run4", "config", {})
+        assert set(db.get_status()) == {"run4"}
+        db.delete_run_id("run1")
+        assert db.get_id_of_run_id("run1") is None and db.get_run_id_of_id(id1) is None
+        db._run_id2id, db._id2run_id = {}, {}
+        db._load_run_ids()  # as loaded when opened
+        assert db.get_run_id_of_id(db.get_id_of_run_id("run4")) == "run4"
+    finally:
+        db.delete_files()
+
+
+def test_schema_catalog(tmp_path):
+    from neetbox.server.db.project import ProjectDB
+
+    db = ProjectDB(project_id="test-schema-catalog", path=str(tmp_path / "test.projectdb"))
+    try:
+        assert not db.table_exist("scalar") and db.read_json("scalar") == []
+        db.submit(db.write_json, "scalar", {"x": 1}, run_id="run1").result(timeout=10)
+        assert db.table_exist("scalar") and "metadata" in db._schema.columns_of("scalar")
+        # tables created by rolled back writes are created again by the next write
+        failing = lambda: db.write_json("progress", {}, run_id="run1") and 1 / 0
+        assert isinstance(db.submit(failing).exception(timeout=10), ZeroDivisionError)
+        assert not db.table_exist("progress")
+        db.submit(db.write_json, "progress", {}, run_id="run1").result(timeout=10)
+        assert db.table_exist("progress")
+        # reads do not query sqlite_master
+        queries = []
+        db._connection.set_trace_callback(queries.append)
+        db.read_json("scalar"), db.get_run_ids(), db.get_status(), db.get_series_of_table("log")
+        assert queries and not [query for query in queries if "sqlite_master" in query]
+    finally:
+        db._connection.set_trace_callback(None)
+        db.delete_files()
+
+
+def test_limit_num_row(tmp_path):
+    from neetbox.server.db import QueryCondition
+    from neetbox.server.db.project import ProjectDB
+
+    db = ProjectDB(project_id="test-limit-num-row", path=str(tmp_path / "test.projectdb"))
+    try:
+        write = lambda series, limit: db.write_json("scalar", {}, series, "run1", "t", limit)
+        ids_a = [write("a", -1) for _ in range(5)]
+        [write("b", -1) for _ in range(5)]
+        # the oldest rows of series a are deleted, rows of series b newer than them are not counted
+        db.do_limit_num_row_for("scalar", db.get_id_of_run_id("run1"), 2, series="a")
+        rows_of = lambda series: db.read_json("scalar", QueryCondition(series=series))
+        assert [row["id"] for row in rows_of("a")] == ids_a[-2:] and len(rows_of("b")) == 5
+        # rows are counted once, and deleted in batches over the limit
+        queries = []
+        db._connection.set_trace_callback(queries.append)
+        for _ in range(100):
+            write("b", 10)
+            assert len(rows_of("b")) <= 11
+        assert (
+            len(rows_of("b")) >= 10
+            and len([query for query in queries if "count(*)" in query]) == 1
+        )
+        # rows without series are limited in the whole run
+        [write(None, 20) for _ in range(10)]
+        assert len(db.read_json("scalar")) <= 22
+    finally:
+        db._connection.set_trace_callback(None)
+        db.delete_files()
+
+
+def test_bridge_status_cache(tmp_path):
+    import asyncio
+
+    from neetbox.server._bridge import Bridge
+    from neetbox.server.db.project import ProjectDB
+
+    db = ProjectDB(project_id="test-status-cache", path=str(tmp_path / "test.projectdb"))
+    db.set_status("run1", "config", {"name": "old"})
+    bridge = Bridge.from_db(db)
+    try:
+        assert bridge.get_status("run1", "config") == {"name": "old"}  # loaded from db
+
+        async def update():
+            value = {"name": "new"}
+            written = bridge.set_status("run1", "config", value)
+            value["name"] = "changed after set"
+            assert bridge.get_status("run1", "config") == {"name": "new"}  # the same as in db
+            await written
+            await bridge.set_status("run2", "hyperparams", {"lr": 0.1})
+
+        asyncio.run(update())
+        assert db.get_status() == {
+            "run1": {"config": {"name": "new"}},
+            "run2": {"hyperparams": {"lr": 0.1}},
+        }
+        db.get_status = None  # reads are served by the cache
+        assert bridge.get_status("run2") == {"hyperparams": {"lr": 0.1}}
+
+        async def delete():
+            await bridge.delete_run_id("run2")
+
+        asyncio.run(delete())
+        assert bridge.get_status("run2") == {} and db.get_run_ids()[0]["runId"] == "run1"
+    finally:
+        del Bridge._id2bridge["test-status-cache"], bridge
+        db.delete_files()
+
+
+def test_project_catalog(tmp_path):
+    from neetbox.server.db.project import ProjectDB
+
+    db = ProjectDB(project_id="test-project-catalog", path=str(tmp_path / "test.projectdb"))
+    record_of = lambda: ProjectDB.get_catalog(rescan=False).get("test-project-catalog")
+    try:
+        assert record_of()["numRuns"] == 0 and record_of()["path"] == db.file_path
+        db.write_json("log", {"message": "a"}, run_id="run1", timestamp="2024-01-20T00:00:00")
+        db.set_status("run1", "config", {"name": "project name"})
+        db.write_json("log", {"message": "b"}, run_id="run2", timestamp="2024-01-21T00:00:00")
+        record = record_of()
+        assert record["numRuns"] == 2 and record["lastRunTimestamp"] == "2024-01-21T00:00:00"
+        assert record["name"] == "project name" and record["size"] > 0
+        assert [info["runId"] for info in record["runIds"]] == ["run1", "run2"]
+        db.fetch_metadata_of_run_id("run1", {"name": "first"})
+        assert record_of()["runIds"][0]["metadata"] == {"name": "first"}
+        db.delete_run_id("run2")
+        assert record_of()["numRuns"] == 1 and record_of()["name"] == "project name"
+        assert [info["runId"] for info in record_of()["runIds"]] == ["run1"]
+    finally:
+        db.delete_files()
+    assert record_of() is None
+
+
+def test_thumbnail_cache(monkeypatch):
+    import collections
+
+    from neetbox.server.fastapi.routers import project
+
+    made = []
+    monkeypatch.setattr(project, "_thumbnail_cache", collections.OrderedDict())
+    monkeypatch.setattr(project, "_THUMBNAIL_CACHE_SIZE", 2)
+    monkeypatch.setattr(project, "_make_thumbnail", lambda image, max_edge: made.append(1) or image)
+    assert project._get_thumbnail(b"a", 64) == b"a" and project._get_thumbnail(b"a", 64) == b"a"
+    project._get_thumbnail(b"a", 32)  # another size
+    project._get_thumbnail(b"b", 64)  # evicts the least recently used
+    project._get_thumbnail(b"a", 64)
+    assert len(made) == 4 and len(project._thumbnail_cache) == 2
+
+
+def test_batch_event_one_commit(tmp_path):
+    import asyncio
+
+    from neetbox._protocol import (
+        EVENT_TYPE_NAME_HPARAMS,
+        EVENT_TYPE_NAME_SCALAR_CHUNK,
+        EVENT_TYPE_NAME_STATUS,
+        EventMsg,
+        IdentityType,
+    )
+    from neetbox.server._bridge import Bridge
+    from neetbox.server.db.project import ProjectDB
+    from neetbox.server.fastapi.routers.websocket._event_type_handlers import (
+        on_event_type_batch,
+    )
+
+    db = ProjectDB(project_id="test-batch-event", path=str(tmp_path / "test.projectdb"))
+    bridge = Bridge.from_db(db)
+    commit, commits = db._writer._commit, []
+    db._writer._commit = lambda connection, writes: commits.append(len(writes)) or commit(
+        connection, writes
+    )
+    frames = []
+
+    async def ws_send_to_frontends(message):
+        frames.append(message)
+
+    bridge.ws_send_to_frontends = ws_send_to_frontends
+    event = lambda event_type, payload, series=None: EventMsg(
+        project_id="test-batch-event",
+        run_id="run1",
+        event_type=event_type,
+        who=IdentityType.CLI,
+        series=series,
+        payload=payload,
+    )
+    events = [event("log", {"message": f"line {i}"}) for i in range(50)]
+    events += [event(EVENT_TYPE_NAME_SCALAR_CHUNK, {"x": [i], "y": [i]}, "loss") for i in range(50)]
+    events += [event(EVENT_TYPE_NAME_STATUS, {"name": "a"}, "config")]
+    events += [
+        event(EVENT_TYPE_NAME_HPARAMS, {"lr": 0.1}),
+        event(EVENT_TYPE_NAME_HPARAMS, {"bs": 8}),
+    ]
+    try:
+        asyncio.run(on_event_type_batch(EventMsg.pack(events)))
+        assert commits == [103]  # all rows of the batch in one transaction
+        assert len(db.read_json("log")) == 50 and len(db.read_json("scalar")) == 50
+        assert db.get_status("run1")["run1"]["hyperparameters"] == {"lr": 0.1, "bs": 8}
+        assert len(frames) == 1  # scalars of scalar chunks are forwarded with the logs
+        forwarded = frames[0].unpack()
+        assert len(forwarded) == 100 and all(_message.id for _message in forwarded)
+    finally:
+        del Bridge._id2bridge["test-batch-event"], bridge
+        db.delete_files()